@@ -1,16 +1,29 @@
 """
 Database configuration and connection
 """
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from fastapi import Request
+from jose import JWTError, jwt
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+def _create_engine(url: str) -> Engine:
+    return create_engine(
+        url,
+        connect_args={"check_same_thread": False} if "sqlite" in url else {}
+    )
+
 # Database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = _create_engine(settings.DATABASE_URL)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -18,6 +31,145 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for models
 Base = declarative_base()
 
+class QueryCounter:
+    """Records the SQL statements executed while active"""
+    
+    def __init__(self):
+        self.statements = []
+    
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+    
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(bind=None):
+    """Count SQL statements executed on an engine (defaults to the app engine)
+
+    Usage:
+        with count_queries() as counter:
+            client.get("/api/v1/results/user/history")
+        assert counter.count == 2
+    """
+    target = bind if bind is not None else engine
+    counter = QueryCounter()
+    event.listen(target, "before_cursor_execute", counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(target, "before_cursor_execute", counter._on_execute)
+
+class ReplicaRouter:
+    """Routes read-only sessions to healthy replicas in round-robin order"""
+    
+    def __init__(self, urls: List[str], health_check_seconds: int, sticky_seconds: int):
+        self.engines = [_create_engine(url) for url in urls]
+        self.session_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in self.engines
+        ]
+        self.health_check_seconds = health_check_seconds
+        self.sticky_seconds = sticky_seconds
+        self._healthy = [True] * len(self.engines)
+        self._checked_at = [0.0] * len(self.engines)
+        self._next = 0
+        self._recent_writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        
+        for index, replica in enumerate(self.engines):
+            event.listen(replica, "handle_error", self._make_error_handler(index))
+    
+    def _make_error_handler(self, index: int):
+        def on_error(context):
+            if context.is_disconnect:
+                self._mark(index, False)
+        return on_error
+    
+    def _mark(self, index: int, healthy: bool):
+        if self._healthy[index] != healthy:
+            logger.warning(f"Read replica {index} is {'healthy' if healthy else 'unhealthy'}")
+        self._healthy[index] = healthy
+        self._checked_at[index] = time.monotonic()
+    
+    def _check(self, index: int) -> bool:
+        """Ping a replica, at most once per health check interval"""
+        if time.monotonic() - self._checked_at[index] < self.health_check_seconds:
+            return self._healthy[index]
+        try:
+            with self.engines[index].connect() as conn:
+                conn.execute(text("SELECT 1"))
+            self._mark(index, True)
+        except Exception as e:
+            logger.error(f"Read replica {index} health check failed: {e}")
+            self._mark(index, False)
+        return self._healthy[index]
+    
+    def mark_write(self, subject: Optional[str]):
+        """Pin a subject's reads to the primary for the read-your-writes window"""
+        if not subject or not self.engines or self.sticky_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[subject] = now
+            if len(self._recent_writes) > 10000:
+                cutoff = now - self.sticky_seconds
+                self._recent_writes = {
+                    key: written for key, written in self._recent_writes.items() if written > cutoff
+                }
+    
+    def is_sticky(self, subject: Optional[str]) -> bool:
+        """Whether a subject wrote recently enough that replicas may lag behind"""
+        if not subject:
+            return False
+        written = self._recent_writes.get(subject)
+        return written is not None and time.monotonic() - written < self.sticky_seconds
+    
+    def choose(self, subject: Optional[str] = None) -> Optional[int]:
+        """Index of the replica to read from, or None for the primary"""
+        if not self.engines or self.is_sticky(subject):
+            return None
+        
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.engines)
+        
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self._check(index):
+                return index
+        
+        return None
+    
+    def session(self, subject: Optional[str] = None) -> Session:
+        """Open a read-only session on a replica, falling back to the primary"""
+        index = self.choose(subject)
+        return SessionLocal() if index is None else self.session_factories[index]()
+    
+    def read_engine(self) -> Engine:
+        """Engine for bulk reads (e.g. exports) that do not need a session"""
+        index = self.choose()
+        return engine if index is None else self.engines[index]
+
+replica_router = ReplicaRouter(
+    settings.DATABASE_READ_URLS,
+    health_check_seconds=settings.READ_REPLICA_HEALTH_CHECK_SECONDS,
+    sticky_seconds=settings.READ_YOUR_WRITES_SECONDS
+)
+
+def _request_subject(request: Request) -> Optional[str]:
+    """User id from the request's token, for routing only (not verified here)"""
+    token = request.query_params.get("token")
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -25,3 +177,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db(request: Request):
+    """Dependency to get a read-only database session, served by a replica when configured"""
+    db = replica_router.session(_request_subject(request))
+    try:
+        yield db
+    finally:
+        db.close()
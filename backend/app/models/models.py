@@ -1,12 +1,15 @@
 """
 Database models for Mental Health Risk Detection System
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, JSON, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
 import uuid
 
+# model_version of scores from a model bundle that records no version
+UNVERSIONED = "unversioned"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -25,6 +28,26 @@ class User(Base):
     assessments = relationship("Assessment", back_populates="user")
     risk_scores = relationship("RiskScore", back_populates="user")
 
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), index=True)
+    token_hash = Column(String, unique=True, index=True)  # SHA-256 of the opaque token
+    family_id = Column(String, index=True)  # Shared by every token in one rotation chain
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime)
+    revoked_at = Column(DateTime, nullable=True)
+    replaced_by_id = Column(String, nullable=True)
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String, primary_key=True)  # Access token id
+    user_id = Column(String, ForeignKey("users.id"), nullable=True)
+    expires_at = Column(DateTime, index=True)  # Row can be purged after the token expires
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 class Questionnaire(Base):
     __tablename__ = "questionnaires"
     
@@ -53,26 +76,119 @@ class Assessment(Base):
     # Relationships
     user = relationship("User", back_populates="assessments")
     questionnaire = relationship("Questionnaire", back_populates="assessments")
-    risk_score = relationship("RiskScore", uselist=False, back_populates="assessment")
+    # The current version of the assessment's risk score; re-scoring keeps superseded ones
+    risk_score = relationship(
+        "RiskScore",
+        uselist=False,
+        primaryjoin="and_(Assessment.id == RiskScore.assessment_id, RiskScore.superseded_at.is_(None))",
+        viewonly=True
+    )
+    
+    @property
+    def questionnaire_name(self):
+        return self.questionnaire.name if self.questionnaire else None
 
 class RiskScore(Base):
     __tablename__ = "risk_scores"
+    __table_args__ = (
+        UniqueConstraint("assessment_id", "model_version", name="uq_risk_score_version"),
+        # At most one current score per assessment
+        Index(
+            "uq_risk_score_current", "assessment_id", unique=True,
+            postgresql_where=text("superseded_at IS NULL"), sqlite_where=text("superseded_at IS NULL")
+        ),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    assessment_id = Column(String, ForeignKey("assessments.id"), unique=True)
+    assessment_id = Column(String, ForeignKey("assessments.id"), index=True)
     user_id = Column(String, ForeignKey("users.id"), index=True)
     risk_level = Column(String)  # low, medium, high, critical
     risk_score = Column(Float)  # 0-100
     contributing_factors = Column(JSON)  # AI-identified factors
+    factor_attributions = Column(JSON)  # Signed TreeSHAP attributions, largest first
     recommendations = Column(JSON)  # Personalized recommendations
     ml_model_used = Column(String)  # Which ML model generated this
     confidence_score = Column(Float)
+    model_version = Column(String, nullable=False, default=UNVERSIONED)  # Version of the model bundle that produced this score
+    superseded_at = Column(DateTime, nullable=True)  # Set when a newer score replaced this one
     calculated_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    assessment = relationship("Assessment", back_populates="risk_score")
+    assessment = relationship("Assessment")
     user = relationship("User", back_populates="risk_scores")
 
+class UserRiskSummary(Base):
+    __tablename__ = "user_risk_summary"
+    
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    latest_risk_score_id = Column(String, ForeignKey("risk_scores.id"))
+    latest_risk_level = Column(String)
+    latest_risk_score = Column(Float)
+    trend_score = Column(Float)  # Exponentially weighted moving average of risk_score
+    assessment_count = Column(Integer, default=0)
+    first_assessment_at = Column(DateTime)
+    last_assessment_at = Column(DateTime)
+    escalation_count = Column(Integer, default=0)  # Level moved up (e.g. low -> high)
+    deescalation_count = Column(Integer, default=0)  # Level moved down
+    level_transitions = Column(JSON)  # {"low->medium": 2, ...}
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    latest_risk = relationship("RiskScore", foreign_keys=[latest_risk_score_id])
+
+class RiskRollup(Base):
+    __tablename__ = "risk_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket_start", "questionnaire_id", "age_band", "gender", "risk_level",
+            name="uq_risk_rollup_bucket"
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    granularity = Column(String)  # hour, day
+    bucket_start = Column(DateTime, index=True)
+    questionnaire_id = Column(String)
+    age_band = Column(String)  # <18, 18-24, ..., 65+, unknown
+    gender = Column(String)
+    risk_level = Column(String)
+    count = Column(Integer, default=0)
+    score_sum = Column(Float, default=0.0)
+    score_histogram = Column(JSON)  # Counts of risk_score in 10 bins of width 10
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String, primary_key=True)
+    last_calculated_at = Column(DateTime)  # High-water mark over RiskScore.calculated_at
+    last_risk_score_id = Column(String)  # Tie-breaker for rows with equal timestamps
+    rows_processed = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RollupContribution(Base):
+    __tablename__ = "rollup_contributions"
+    
+    # What each assessment's current score added to the rollups, so a replaced score can be taken back out
+    assessment_id = Column(String, ForeignKey("assessments.id"), primary_key=True)
+    calculated_at = Column(DateTime)
+    questionnaire_id = Column(String)
+    age_band = Column(String)
+    gender = Column(String)
+    risk_level = Column(String)
+    risk_score = Column(Float)
+
+class RescoreCheckpoint(Base):
+    __tablename__ = "rescore_checkpoints"
+    
+    model_version = Column(String, primary_key=True)
+    partition = Column(Integer, primary_key=True)
+    lower_id = Column(String)  # Inclusive assessment id bound; NULL = from the first id
+    upper_id = Column(String)  # Exclusive bound; NULL = through the last id
+    last_assessment_id = Column(String)  # Highest id re-scored so far
+    rows_processed = Column(Integer, default=0)
+    completed_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     
@@ -30,6 +30,33 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class RefreshResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+
+class BulkProvisionRowResult(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str  # created, error
+    user_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkProvisionResponse(BaseModel):
+    total: int
+    created: int
+    failed: int
+    elapsed_seconds: float
+    users_per_second: Optional[float] = None
+    results: List[BulkProvisionRowResult]
 
 # Assessment Schemas
 class QuestionnaireResponse(BaseModel):
@@ -56,18 +83,58 @@ class AssessmentCreate(BaseModel):
     responses: Dict[str, Any]
 
 # Risk Score Schemas
+class FactorAttribution(BaseModel):
+    feature: str
+    attribution: float  # Change in the predicted level's probability due to this item
+
 class RiskScoreResponse(BaseModel):
     id: str
     risk_level: str
     risk_score: float
     contributing_factors: List[str]
+    factor_attributions: Optional[List[FactorAttribution]] = None
     recommendations: List[str]
     ml_model_used: str
     confidence_score: float
+    model_version: Optional[str] = None
     calculated_at: datetime
     
     class Config:
         from_attributes = True
+        # model_version is a field, not pydantic's model_ API
+        protected_namespaces = ()
+
+class UserRiskSummaryResponse(BaseModel):
+    user_id: str
+    latest_risk_level: str
+    latest_risk_score: float
+    trend_score: float
+    assessment_count: int
+    first_assessment_at: Optional[datetime]
+    last_assessment_at: Optional[datetime]
+    escalation_count: int
+    deescalation_count: int
+    level_transitions: Dict[str, int]
+    
+    class Config:
+        from_attributes = True
+
+class AssessmentHistoryItem(BaseModel):
+    id: str
+    questionnaire_id: Optional[str]
+    questionnaire_name: Optional[str]
+    responses: Optional[Dict[str, Any]]
+    status: str
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    risk_score: Optional[RiskScoreResponse]
+    
+    class Config:
+        from_attributes = True
+
+class AssessmentHistoryResponse(BaseModel):
+    count: int
+    assessments: List[AssessmentHistoryItem]
 
 # Resource Schemas
 class MentalHealthResourceResponse(BaseModel):
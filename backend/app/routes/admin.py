@@ -1,16 +1,32 @@
 """
 Admin routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.models import User, Questionnaire, AuditLog
+from datetime import datetime
+from typing import List, Optional
+import os
+import uuid
+from app.config import settings
+from app.database import get_db, get_read_db, replica_router
+from app.models.models import Questionnaire, AuditLog
+from app.models.schemas import BulkProvisionResponse
 from app.services.auth_service import AuthService
+from app.services.principal_cache import Principal
+from app.services.analytics_service import analytics_service, DIMENSIONS, GRANULARITIES
+from app.services.drift_monitor import drift_monitor
+from app.services.export_service import ExportService
+from app.services.shadow_evaluator import shadow_evaluator
+from app.services.provisioning_service import provisioning_service
+from app.services.questionnaire_catalog import questionnaire_catalog
 
 router = APIRouter()
 auth_service = AuthService()
+export_service = ExportService()
 
-async def check_admin(current_user: User = Depends(auth_service.get_current_user)):
+async def check_admin(current_user: Principal = Depends(auth_service.get_current_user)):
     """Check if user is admin"""
     # In a real app, you'd check a role field
     if current_user.id not in ["admin_user_id"]:
@@ -25,7 +41,7 @@ async def create_questionnaire(
     name: str,
     description: str,
     questions: list,
-    admin_user: User = Depends(check_admin),
+    admin_user: Principal = Depends(check_admin),
     db: Session = Depends(get_db)
 ):
     """Create a new questionnaire"""
@@ -39,13 +55,35 @@ async def create_questionnaire(
     db.add(questionnaire)
     db.commit()
     db.refresh(questionnaire)
+    questionnaire_catalog.invalidate()
     
     return questionnaire
 
+@router.post("/users/bulk", response_model=BulkProvisionResponse)
+async def bulk_provision_users(
+    file: UploadFile = File(...),
+    admin_user: Principal = Depends(check_admin),
+    db: Session = Depends(get_db)
+):
+    """Create users from a CSV (email,username,password,full_name,age,gender)"""
+    try:
+        rows = provisioning_service.parse_csv((await file.read()).decode("utf-8-sig"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if len(rows) > settings.PROVISIONING_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.PROVISIONING_MAX_ROWS} rows per request"
+        )
+    
+    # Hashing thousands of passwords takes a while; keep it off the event loop
+    return await run_in_threadpool(provisioning_service.provision, db, rows)
+
 @router.get("/audit-logs")
 async def get_audit_logs(
-    admin_user: User = Depends(check_admin),
-    db: Session = Depends(get_db),
+    admin_user: Principal = Depends(check_admin),
+    db: Session = Depends(get_read_db),
     limit: int = 50
 ):
     """Get audit logs"""
@@ -54,3 +92,129 @@ async def get_audit_logs(
     ).limit(limit).all()
     
     return {"count": len(logs), "logs": logs}
+
+def _validate_analytics_params(granularity: str, dimension: Optional[str]):
+    """Reject unknown rollup granularities and dimensions"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"granularity must be one of {list(GRANULARITIES)}"
+        )
+    if dimension is not None and dimension not in DIMENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"dimension must be one of {list(DIMENSIONS)}"
+        )
+
+@router.get("/analytics/risk-distribution")
+async def get_risk_distribution(
+    granularity: str = "day",
+    dimension: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    questionnaire_id: Optional[str] = None,
+    age_band: Optional[str] = None,
+    gender: Optional[str] = None,
+    admin_user: Principal = Depends(check_admin),
+    db: Session = Depends(get_read_db)
+):
+    """Get risk-level distribution per time bucket from the rollup tables"""
+    _validate_analytics_params(granularity, dimension)
+    filters = {
+        key: value for key, value in
+        {"questionnaire_id": questionnaire_id, "age_band": age_band, "gender": gender}.items()
+        if value is not None
+    }
+    
+    buckets = analytics_service.risk_distribution(
+        db, granularity=granularity, dimension=dimension, start=start, end=end, filters=filters
+    )
+    watermark = analytics_service.get_watermark(db)
+    
+    return {
+        "granularity": granularity,
+        "dimension": dimension,
+        "up_to": watermark.last_calculated_at if watermark else None,
+        "buckets": buckets
+    }
+
+@router.get("/analytics/score-histogram")
+async def get_score_histogram(
+    granularity: str = "day",
+    dimension: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin_user: Principal = Depends(check_admin),
+    db: Session = Depends(get_read_db)
+):
+    """Get risk score histograms (10 bins over 0-100) from the rollup tables"""
+    _validate_analytics_params(granularity, dimension)
+    
+    histograms = analytics_service.score_histogram(
+        db, granularity=granularity, dimension=dimension, start=start, end=end
+    )
+    
+    return {"bin_width": 10, "dimension": dimension, "histograms": histograms}
+
+@router.get("/monitoring/drift")
+async def get_drift_report(admin_user: Principal = Depends(check_admin)):
+    """Feature and risk-level drift of recent submissions against the training data (this worker's view)"""
+    return drift_monitor.snapshot()
+
+@router.post("/monitoring/drift/reset")
+async def reset_drift_monitor(admin_user: Principal = Depends(check_admin)):
+    """Start drift statistics afresh, e.g. after an investigated shift; the training reference is kept"""
+    drift_monitor.reset()
+    return {"status": "reset", "since": drift_monitor.started_at}
+
+@router.get("/monitoring/shadow")
+async def get_shadow_report(admin_user: Principal = Depends(check_admin)):
+    """Agreement and latency of the shadow candidate against production (this worker's view)"""
+    return shadow_evaluator.snapshot()
+
+@router.post("/monitoring/shadow/reset")
+async def reset_shadow_counters(admin_user: Principal = Depends(check_admin)):
+    """Start shadow counters afresh; the candidate keeps scoring"""
+    shadow_evaluator.reset()
+    return {"status": "reset", "since": shadow_evaluator.started_at}
+
+def _export_columns(columns: Optional[str]) -> List[str]:
+    """Parse and validate a comma-separated export column list"""
+    requested = [column.strip() for column in columns.split(",")] if columns else None
+    try:
+        return export_service.resolve_columns(requested)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/export/assessments.ndjson")
+async def export_assessments_ndjson(
+    columns: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin_user: Principal = Depends(check_admin)
+):
+    """Stream de-identified assessments with risk scores as NDJSON"""
+    selected = _export_columns(columns)
+    
+    return StreamingResponse(
+        export_service.iter_ndjson(replica_router.read_engine(), selected, start, end),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=assessments.ndjson"}
+    )
+
+@router.post("/export/assessments.parquet")
+async def export_assessments_parquet(
+    columns: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin_user: Principal = Depends(check_admin)
+):
+    """Write de-identified assessments with risk scores to a Parquet file on the server"""
+    selected = _export_columns(columns)
+    path = os.path.join(settings.EXPORT_DIR, f"assessments-{uuid.uuid4().hex}.parquet")
+    
+    rows = await run_in_threadpool(
+        export_service.write_parquet, replica_router.read_engine(), path, selected, start, end
+    )
+    
+    return {"path": path, "rows": rows, "columns": selected}
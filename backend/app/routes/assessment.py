@@ -1,46 +1,62 @@
 """
 Assessment routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from datetime import datetime
-from app.database import get_db
-from app.models.models import Assessment, Questionnaire, User, RiskScore
+from app.database import get_db, replica_router
+from app.models.models import UNVERSIONED, Assessment, Questionnaire, RiskScore
 from app.models.schemas import AssessmentCreate, AssessmentResponse, QuestionnaireResponse
 from app.services.auth_service import AuthService
+from app.services.principal_cache import Principal
 from app.services.assessment_service import AssessmentService
+from app.services.drift_monitor import drift_monitor
 from app.services.ml_service import MLService
+from app.services.risk_summary_service import RiskSummaryService
+from app.services.questionnaire_catalog import CatalogEntry, questionnaire_catalog
+from app.config import settings
 
 router = APIRouter()
 auth_service = AuthService()
 assessment_service = AssessmentService()
-ml_service = MLService()
+ml_service = MLService(shadow_model_path=settings.SHADOW_MODEL_PATH)
+risk_summary_service = RiskSummaryService()
+
+def _catalog_response(entry: CatalogEntry, request: Request) -> Response:
+    """Serve a catalog entry, answering 304 when the client's ETag still matches"""
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={settings.QUESTIONNAIRE_CACHE_MAX_AGE}"
+    }
+    
+    if entry.matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 @router.get("/questionnaires", response_model=list[QuestionnaireResponse])
-async def get_questionnaires(db: Session = Depends(get_db)):
+async def get_questionnaires(request: Request, db: Session = Depends(get_db)):
     """Get all available questionnaires"""
-    questionnaires = db.query(Questionnaire).all()
-    return questionnaires
+    entry = questionnaire_catalog.get_all(db)
+    return _catalog_response(entry, request)
 
 @router.get("/questionnaires/{questionnaire_id}", response_model=QuestionnaireResponse)
-async def get_questionnaire(questionnaire_id: str, db: Session = Depends(get_db)):
+async def get_questionnaire(questionnaire_id: str, request: Request, db: Session = Depends(get_db)):
     """Get specific questionnaire"""
-    questionnaire = db.query(Questionnaire).filter(
-        Questionnaire.id == questionnaire_id
-    ).first()
+    entry = questionnaire_catalog.get(db, questionnaire_id)
     
-    if not questionnaire:
+    if entry is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Questionnaire not found"
         )
     
-    return questionnaire
+    return _catalog_response(entry, request)
 
 @router.post("/start", response_model=AssessmentResponse)
 async def start_assessment(
     questionnaire_id: str,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Start a new assessment"""
@@ -64,13 +80,47 @@ async def start_assessment(
     db.add(assessment)
     db.commit()
     db.refresh(assessment)
+    replica_router.mark_write(current_user.id)
     
     return assessment
 
+def _store_risk_score(db: Session, db_assessment: Assessment, risk_prediction: dict) -> tuple[RiskScore, bool]:
+    """Make the prediction the assessment's only current score; also returns whether one existed before"""
+    model_version = ml_service.model_version or UNVERSIONED
+    existing = db.query(RiskScore).filter(
+        (RiskScore.assessment_id == db_assessment.id) &
+        (RiskScore.superseded_at.is_(None) | (RiskScore.model_version == model_version))
+    ).with_for_update().all()
+    
+    now = datetime.utcnow()
+    risk_score = next((row for row in existing if row.model_version == model_version), None)
+    replaced = any(row.superseded_at is None for row in existing)
+    for row in existing:
+        if row is not risk_score and row.superseded_at is None:
+            row.superseded_at = now
+    # Superseded before the new score is written, so at most one row is ever current
+    db.flush()
+    
+    # A resubmission under the same model version updates its score in place
+    if risk_score is None:
+        risk_score = RiskScore(assessment_id=db_assessment.id, model_version=model_version)
+        db.add(risk_score)
+    risk_score.user_id = db_assessment.user_id
+    risk_score.risk_level = risk_prediction["risk_level"]
+    risk_score.risk_score = risk_prediction["risk_score"]
+    risk_score.contributing_factors = risk_prediction["contributing_factors"]
+    risk_score.factor_attributions = risk_prediction.get("factor_attributions")
+    risk_score.recommendations = risk_prediction["recommendations"]
+    risk_score.ml_model_used = risk_prediction["model_used"]
+    risk_score.confidence_score = risk_prediction["confidence_score"]
+    risk_score.superseded_at = None
+    risk_score.calculated_at = now
+    return risk_score, replaced
+
 @router.post("/submit")
 async def submit_assessment(
     assessment: AssessmentCreate,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Submit completed assessment and calculate risk"""
@@ -85,29 +135,36 @@ async def submit_assessment(
             detail="Assessment not found"
         )
     
+    # A resubmission's earlier answers may already be in the cached history
+    if db_assessment.status == "completed":
+        ml_service.forget_history(current_user.id)
+    
     # Update assessment
     db_assessment.responses = assessment.responses
     db_assessment.status = "completed"
     db_assessment.completed_at = datetime.utcnow()
     
+    def load_history():
+        # Earlier completed assessments, oldest first; only read when this worker has no cached history
+        rows = db.query(Assessment.responses).filter(
+            (Assessment.user_id == current_user.id) &
+            (Assessment.status == "completed") &
+            (Assessment.id != db_assessment.id)
+        ).order_by(Assessment.completed_at.desc()).limit(ml_service.history_length).all()
+        return [row.responses or {} for row in reversed(rows)]
+    
     # Calculate risk using ML model
-    risk_prediction = ml_service.predict_risk(assessment.responses)
+    risk_prediction = ml_service.predict_risk(assessment.responses, user_id=current_user.id, load_history=load_history)
+    drift_monitor.observe_responses(assessment.responses, risk_prediction["risk_level"])
     
     # Store risk score
-    risk_score = RiskScore(
-        assessment_id=db_assessment.id,
-        user_id=current_user.id,
-        risk_level=risk_prediction["risk_level"],
-        risk_score=risk_prediction["risk_score"],
-        contributing_factors=risk_prediction["contributing_factors"],
-        recommendations=risk_prediction["recommendations"],
-        ml_model_used=risk_prediction["model_used"],
-        confidence_score=risk_prediction["confidence_score"]
-    )
-    
-    db.add(risk_score)
+    risk_score, replaced = _store_risk_score(db, db_assessment, risk_prediction)
+    risk_summary_service.record(db, risk_score, replaces_existing=replaced)
     db.commit()
+    # Only a stored assessment becomes part of the cached history
+    ml_service.remember_history(current_user.id, risk_prediction)
     db.refresh(db_assessment)
+    replica_router.mark_write(current_user.id)
     
     return {
         "assessment_id": db_assessment.id,
@@ -1,13 +1,17 @@
 """
 Authentication routes
 """
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from jose import JWTError, jwt
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from datetime import datetime, timedelta
 from app.database import get_db
 from app.models.models import User
-from app.models.schemas import UserCreate, UserResponse, TokenResponse
+from app.models.schemas import UserCreate, UserResponse, TokenResponse, RefreshRequest, RefreshResponse, LogoutRequest
 from app.services.auth_service import AuthService
+from app.services.principal_cache import Principal, invalidate_principal
+from app.services.token_service import token_service
 from app.config import settings
 
 router = APIRouter()
@@ -27,8 +31,11 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             detail="Email or username already registered"
         )
     
+    # Return the connection to the pool while bcrypt runs
+    db.rollback()
+    
     # Create new user
-    hashed_password = auth_service.get_password_hash(user.password)
+    hashed_password = await auth_service.hash_password(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -49,25 +56,110 @@ async def login(email: str, password: str, db: Session = Depends(get_db)):
     """Login user"""
     user = db.query(User).filter(User.email == email).first()
     
-    if not user or not auth_service.verify_password(password, user.hashed_password):
+    # Return the connection to the pool while bcrypt runs; keep the loaded user
+    if user:
+        db.expunge(user)
+    db.rollback()
+    
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await auth_service.verify_and_update_password(password, user.hashed_password)
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
     
+    if new_hash:
+        # bcrypt cost changed since this hash was created
+        db.query(User).filter(User.id == user.id).update({"hashed_password": new_hash})
+        db.commit()
+        user.hashed_password = new_hash
+        invalidate_principal(user.id)
+    
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth_service.create_access_token(
         data={"sub": user.id},
         expires_delta=access_token_expires
     )
+    refresh_token = token_service.issue_refresh_token(db, user.id)
     
     return {
         "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer",
         "user": user
     }
 
+@router.post("/refresh", response_model=RefreshResponse)
+async def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token and refresh token"""
+    # The refresh token travels in the body so it stays out of URLs and access logs
+    user_id, new_refresh_token = token_service.rotate_refresh_token(db, request.refresh_token)
+    
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+    
+    access_token = auth_service.create_access_token(
+        data={"sub": user.id},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    
+    return {
+        "access_token": access_token,
+        "refresh_token": new_refresh_token,
+        "token_type": "bearer"
+    }
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: str, request: Optional[LogoutRequest] = None, db: Session = Depends(get_db)):
+    """Revoke an access token and, if given, its refresh token family"""
+    try:
+        # An expired token needs no revocation, but logout should still succeed
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM],
+            options={"verify_exp": False}
+        )
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+    
+    user_id = payload.get("sub")
+    
+    # Only the session's own user may end it; checked before anything is revoked
+    if request is not None and request.refresh_token:
+        if not token_service.revoke_refresh_token(db, request.refresh_token, user_id):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token"
+            )
+    
+    jti = payload.get("jti")
+    expires_at = datetime.utcfromtimestamp(payload.get("exp", 0))
+    if jti and expires_at > datetime.utcnow():
+        token_service.revoke_access_token(db, jti, user_id, expires_at)
+
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(current_user: User = Depends(auth_service.get_current_user)):
+async def get_current_user(
+    current_user: Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
     """Get current user info"""
-    return current_user
+    user = db.query(User).filter(User.id == current_user.id).first()
+    
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+    
+    return user
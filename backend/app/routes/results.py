@@ -2,27 +2,31 @@
 Results routes
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.models import RiskScore, Assessment, User
-from app.models.schemas import RiskScoreResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.database import get_db, get_read_db
+from app.models.models import RiskScore, Assessment, Questionnaire
+from app.models.schemas import AssessmentHistoryResponse, RiskScoreResponse, UserRiskSummaryResponse
 from app.services.auth_service import AuthService
+from app.services.principal_cache import Principal
 from app.services.rag_service import RAGService
+from app.services.risk_summary_service import RiskSummaryService
 
 router = APIRouter()
 auth_service = AuthService()
 rag_service = RAGService()
+risk_summary_service = RiskSummaryService()
 
 @router.get("/assessment/{assessment_id}", response_model=RiskScoreResponse)
 async def get_risk_score(
     assessment_id: str,
-    current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_read_db)
 ):
     """Get risk assessment results"""
     risk_score = db.query(RiskScore).filter(
         (RiskScore.assessment_id == assessment_id) &
-        (RiskScore.user_id == current_user.id)
+        (RiskScore.user_id == current_user.id) &
+        (RiskScore.superseded_at.is_(None))
     ).first()
     
     if not risk_score:
@@ -35,13 +39,12 @@ async def get_risk_score(
 
 @router.get("/user/latest")
 async def get_latest_assessment(
-    current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_read_db)
 ):
     """Get user's latest risk assessment"""
-    risk_score = db.query(RiskScore).filter(
-        RiskScore.user_id == current_user.id
-    ).order_by(RiskScore.calculated_at.desc()).first()
+    summary = risk_summary_service.get_summary(db, current_user.id)
+    risk_score = db.get(RiskScore, summary.latest_risk_score_id) if summary else None
     
     if not risk_score:
         raise HTTPException(
@@ -51,14 +54,34 @@ async def get_latest_assessment(
     
     return risk_score
 
-@router.get("/user/history")
+@router.get("/user/summary", response_model=UserRiskSummaryResponse)
+async def get_risk_summary(
+    current_user: Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Get user's risk trend, latest level and assessment counts"""
+    summary = risk_summary_service.get_summary(db, current_user.id)
+    
+    if not summary:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No assessments found"
+        )
+    
+    return summary
+
+@router.get("/user/history", response_model=AssessmentHistoryResponse)
 async def get_assessment_history(
-    current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_read_db),
     limit: int = 10
 ):
-    """Get user's assessment history"""
-    assessments = db.query(Assessment).filter(
+    """Get user's assessment history with risk scores and questionnaire names"""
+    # Two statements regardless of limit: assessments + questionnaire join, then risk scores
+    assessments = db.query(Assessment).options(
+        joinedload(Assessment.questionnaire).load_only(Questionnaire.name),
+        selectinload(Assessment.risk_score)
+    ).filter(
         Assessment.user_id == current_user.id
     ).order_by(Assessment.completed_at.desc()).limit(limit).all()
     
@@ -70,7 +93,7 @@ async def get_assessment_history(
 @router.get("/resources/{risk_level}")
 async def get_personalized_resources(
     risk_level: str,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get personalized mental health resources based on risk level"""
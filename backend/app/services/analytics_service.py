@@ -0,0 +1,315 @@
+"""
+Population-level risk analytics
+Incrementally rolls risk_scores up into hourly and daily buckets so that
+dashboards never have to scan the raw tables. Each assessment's contribution
+is kept in a ledger, so when its score is replaced (a resubmission, or a
+newer model version) the old contribution is subtracted before the new one
+is added.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import and_, func, insert, or_, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.models import Assessment, RiskRollup, RiskScore, RollupContribution, RollupWatermark, User
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "risk_rollups"
+GRANULARITIES = ("hour", "day")
+DIMENSIONS = ("questionnaire_id", "age_band", "gender", "risk_level")
+HISTOGRAM_BINS = 10  # risk_score is 0-100, so each bin is 10 points wide
+UNKNOWN = "unknown"
+
+AGE_BANDS = [(18, "<18"), (25, "18-24"), (35, "25-34"), (45, "35-44"), (55, "45-54"), (65, "55-64")]
+
+def age_band(age: Optional[int]) -> str:
+    """Map an age to its reporting band"""
+    if age is None:
+        return UNKNOWN
+    for upper, label in AGE_BANDS:
+        if age < upper:
+            return label
+    return "65+"
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its hour or day"""
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def histogram_bin(score: float) -> int:
+    """Histogram bin index for a 0-100 risk score"""
+    return min(max(int(score // (100 / HISTOGRAM_BINS)), 0), HISTOGRAM_BINS - 1)
+
+class AnalyticsService:
+    """Service maintaining and querying the risk rollup tables"""
+
+    def __init__(self, batch_size: int = None, lag_seconds: int = None):
+        self.batch_size = batch_size or settings.ANALYTICS_ROLLUP_BATCH_SIZE
+        self.lag_seconds = settings.ANALYTICS_ROLLUP_LAG_SECONDS if lag_seconds is None else lag_seconds
+
+    def run_incremental(self, db: Session, max_batches: Optional[int] = None) -> int:
+        """Roll up every risk score past the high-water mark; returns rows processed"""
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            processed = self._process_batch(db)
+            total += processed
+            batches += 1
+            if processed < self.batch_size:
+                break
+        return total
+
+    def _process_batch(self, db: Session) -> int:
+        """Fold one batch of new risk scores into the rollups in a single transaction"""
+        # Locking the watermark row serializes concurrent runners (e.g. several workers)
+        watermark = db.query(RollupWatermark).filter(
+            RollupWatermark.name == WATERMARK_NAME
+        ).with_for_update().first()
+
+        if watermark is None:
+            watermark = RollupWatermark(name=WATERMARK_NAME, rows_processed=0)
+            db.add(watermark)
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lag_seconds)
+        query = db.query(
+            RiskScore.id,
+            RiskScore.assessment_id,
+            RiskScore.calculated_at,
+            RiskScore.risk_level,
+            RiskScore.risk_score,
+            Assessment.questionnaire_id,
+            User.age,
+            User.gender
+        ).outerjoin(
+            Assessment, Assessment.id == RiskScore.assessment_id
+        ).outerjoin(
+            User, User.id == RiskScore.user_id
+        ).filter(RiskScore.calculated_at < cutoff, RiskScore.superseded_at.is_(None))
+
+        if watermark.last_calculated_at is not None:
+            query = query.filter(or_(
+                RiskScore.calculated_at > watermark.last_calculated_at,
+                and_(
+                    RiskScore.calculated_at == watermark.last_calculated_at,
+                    RiskScore.id > watermark.last_risk_score_id
+                )
+            ))
+
+        rows = query.order_by(RiskScore.calculated_at, RiskScore.id).limit(self.batch_size).all()
+
+        if not rows:
+            db.rollback()
+            return 0
+
+        assessment_ids = [row.assessment_id for row in rows if row.assessment_id is not None]
+        counted = {
+            row.assessment_id: row._asdict()
+            for row in db.query(*RollupContribution.__table__.columns).filter(
+                RollupContribution.assessment_id.in_(assessment_ids)
+            )
+        }
+
+        # key -> [count, score_sum, histogram]
+        deltas: Dict[tuple, list] = defaultdict(lambda: [0, 0.0, [0] * HISTOGRAM_BINS])
+        inserts, updates = [], []
+        for row in rows:
+            contribution = {
+                "assessment_id": row.assessment_id,
+                "calculated_at": row.calculated_at,
+                "questionnaire_id": row.questionnaire_id or UNKNOWN,
+                "age_band": age_band(row.age),
+                "gender": row.gender or UNKNOWN,
+                "risk_level": row.risk_level or UNKNOWN,
+                "risk_score": row.risk_score or 0.0
+            }
+            previous = counted.get(row.assessment_id)
+            if previous is not None:
+                # This score replaced one already rolled up: take that one back out
+                self._add(deltas, previous, -1)
+                updates.append(contribution)
+            elif row.assessment_id is not None:
+                inserts.append(contribution)
+            self._add(deltas, contribution, 1)
+
+        self._merge(db, deltas)
+        if inserts:
+            db.execute(insert(RollupContribution), inserts)
+        if updates:
+            db.execute(update(RollupContribution), updates)
+
+        last = rows[-1]
+        watermark.last_calculated_at = last.calculated_at
+        watermark.last_risk_score_id = last.id
+        watermark.rows_processed = (watermark.rows_processed or 0) + len(rows)
+        db.commit()
+
+        return len(rows)
+
+    @staticmethod
+    def _add(deltas: Dict[tuple, list], contribution: Dict[str, Any], sign: int):
+        """Add (sign 1) or subtract (sign -1) one score's contribution at every granularity"""
+        score = contribution["risk_score"]
+        dims = tuple(contribution[dimension] for dimension in DIMENSIONS)
+        for granularity in GRANULARITIES:
+            delta = deltas[(granularity, bucket_start(contribution["calculated_at"], granularity)) + dims]
+            delta[0] += sign
+            delta[1] += sign * score
+            delta[2][histogram_bin(score)] += sign
+
+    def _merge(self, db: Session, deltas: Dict[tuple, list]):
+        """Add batch deltas onto existing rollup rows, creating missing ones"""
+        buckets_by_granularity = defaultdict(set)
+        for key in deltas:
+            buckets_by_granularity[key[0]].add(key[1])
+
+        existing = {}
+        for granularity, buckets in buckets_by_granularity.items():
+            rows = db.query(
+                RiskRollup.id, RiskRollup.granularity, RiskRollup.bucket_start,
+                RiskRollup.questionnaire_id, RiskRollup.age_band, RiskRollup.gender,
+                RiskRollup.risk_level, RiskRollup.count, RiskRollup.score_sum,
+                RiskRollup.score_histogram
+            ).filter(
+                RiskRollup.granularity == granularity,
+                RiskRollup.bucket_start.in_(buckets)
+            )
+            for row in rows:
+                existing[tuple(row[1:7])] = row
+
+        inserts, updates = [], []
+        for key, (count, score_sum, histogram) in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                granularity, start, questionnaire_id, band, gender, risk_level = key
+                inserts.append({
+                    "granularity": granularity,
+                    "bucket_start": start,
+                    "questionnaire_id": questionnaire_id,
+                    "age_band": band,
+                    "gender": gender,
+                    "risk_level": risk_level,
+                    "count": count,
+                    "score_sum": score_sum,
+                    "score_histogram": histogram
+                })
+            else:
+                updates.append({
+                    "id": row.id,
+                    "count": row.count + count,
+                    "score_sum": row.score_sum + score_sum,
+                    "score_histogram": [a + b for a, b in zip(row.score_histogram, histogram)]
+                })
+
+        # Bulk statements rather than ORM objects: a batch can touch many thousands of buckets
+        if inserts:
+            db.execute(insert(RiskRollup), inserts)
+        if updates:
+            db.execute(update(RiskRollup), updates)
+
+    def reset(self, db: Session):
+        """Delete all rollups and the high-water mark so they can be rebuilt"""
+        db.query(RiskRollup).delete(synchronize_session=False)
+        db.query(RollupContribution).delete(synchronize_session=False)
+        db.query(RollupWatermark).filter(
+            RollupWatermark.name == WATERMARK_NAME
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    def get_watermark(self, db: Session) -> Optional[RollupWatermark]:
+        """Get the current high-water mark"""
+        return db.query(RollupWatermark).filter(RollupWatermark.name == WATERMARK_NAME).first()
+
+    def _filtered(self, query, granularity: str, start: Optional[datetime], end: Optional[datetime],
+                  filters: Optional[Dict[str, str]]):
+        query = query.filter(RiskRollup.granularity == granularity)
+        if start is not None:
+            query = query.filter(RiskRollup.bucket_start >= bucket_start(start, granularity))
+        if end is not None:
+            query = query.filter(RiskRollup.bucket_start < end)
+        for dimension, value in (filters or {}).items():
+            query = query.filter(getattr(RiskRollup, dimension) == value)
+        return query
+
+    def risk_distribution(
+        self,
+        db: Session,
+        granularity: str = "day",
+        dimension: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Risk-level counts and mean scores per bucket, optionally split by a dimension"""
+        group_columns = [RiskRollup.bucket_start]
+        if dimension and dimension != "risk_level":
+            group_columns.append(getattr(RiskRollup, dimension))
+        group_columns.append(RiskRollup.risk_level)
+
+        query = db.query(
+            *group_columns,
+            func.sum(RiskRollup.count),
+            func.sum(RiskRollup.score_sum)
+        )
+        query = self._filtered(query, granularity, start, end, filters)
+        # Buckets emptied by replaced scores keep their row at count 0
+        rows = query.group_by(*group_columns).having(func.sum(RiskRollup.count) > 0).order_by(*group_columns).all()
+
+        results = []
+        for row in rows:
+            count, score_sum = row[-2], row[-1]
+            item = {"bucket_start": row[0], "risk_level": row[-3], "count": int(count)}
+            if len(group_columns) == 3:
+                item[dimension] = row[1]
+            item["mean_risk_score"] = float(score_sum) / count if count else 0.0
+            results.append(item)
+        return results
+
+    def score_histogram(
+        self,
+        db: Session,
+        granularity: str = "day",
+        dimension: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Dict[str, List[int]]:
+        """Merged risk_score histograms over the range, keyed by dimension value"""
+        columns = [RiskRollup.score_histogram]
+        if dimension:
+            columns.append(getattr(RiskRollup, dimension))
+        query = self._filtered(db.query(*columns), granularity, start, end, filters)
+
+        histograms: Dict[str, List[int]] = defaultdict(lambda: [0] * HISTOGRAM_BINS)
+        for row in query:
+            key = row[1] if dimension else "all"
+            merged = histograms[key]
+            for i, value in enumerate(row[0]):
+                merged[i] += value
+        return dict(histograms)
+
+    async def run_periodically(self, session_factory, interval_seconds: int):
+        """Background loop that keeps the rollups up to date"""
+        while True:
+            try:
+                processed = await asyncio.to_thread(self._run_with_session, session_factory)
+                if processed:
+                    logger.info(f"Rolled up {processed} risk scores")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error updating analytics rollups: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def _run_with_session(self, session_factory) -> int:
+        db = session_factory()
+        try:
+            return self.run_incremental(db)
+        finally:
+            db.close()
+
+analytics_service = AnalyticsService()
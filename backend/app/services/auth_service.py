@@ -1,17 +1,19 @@
 """
 Authentication service
 """
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.config import settings
 from app.database import get_db
 from app.models.models import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.password_hasher import password_hasher, pwd_context
+from app.services.principal_cache import Principal, principals, verified_tokens
+from app.services.token_service import revocation_list
 
 class AuthService:
     def get_password_hash(self, password: str) -> str:
@@ -22,6 +24,22 @@ class AuthService:
         """Verify a password"""
         return pwd_context.verify(plain_password, hashed_password)
     
+    async def hash_password(self, password: str) -> str:
+        """Hash a password without blocking the event loop"""
+        return await password_hasher.hash(password)
+    
+    async def verify_and_update_password(
+        self,
+        plain_password: str,
+        hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Verify a password without blocking the event loop.
+        
+        Returns (valid, new_hash); new_hash is set when the stored hash uses an
+        outdated bcrypt cost and should be replaced.
+        """
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    
     def create_access_token(
         self,
         data: dict,
@@ -35,7 +53,7 @@ class AuthService:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         
-        to_encode.update({"exp": expire})
+        to_encode.update({"exp": expire, "jti": str(uuid.uuid4())})
         
         encoded_jwt = jwt.encode(
             to_encode,
@@ -49,7 +67,7 @@ class AuthService:
         self,
         token: str,
         db: Session = Depends(get_db)
-    ) -> User:
+    ) -> Principal:
         """Get current authenticated user from token"""
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,22 +75,36 @@ class AuthService:
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-        try:
-            payload = jwt.decode(
-                token,
-                settings.SECRET_KEY,
-                algorithms=[settings.ALGORITHM]
-            )
-            user_id: str = payload.get("sub")
-            
-            if user_id is None:
+        payload = verified_tokens.get(token)
+        
+        if payload is None:
+            try:
+                payload = jwt.decode(
+                    token,
+                    settings.SECRET_KEY,
+                    algorithms=[settings.ALGORITHM]
+                )
+            except JWTError:
                 raise credentials_exception
-        except JWTError:
-            raise credentials_exception
+            
+            # Memoize the verified payload, but never beyond the token's expiry
+            expires_in = payload.get("exp", 0) - time.time()
+            verified_tokens.set(token, payload, ttl_seconds=expires_in)
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user_id: str = payload.get("sub")
         
-        if user is None:
+        if user_id is None or revocation_list.is_revoked(payload.get("jti")):
             raise credentials_exception
         
-        return user
+        principal = principals.get(user_id)
+        
+        if principal is None:
+            user = db.query(User.id, User.is_active).filter(User.id == user_id).first()
+            
+            if user is None or not user.is_active:
+                raise credentials_exception
+            
+            principal = Principal(id=user.id, is_active=user.is_active)
+            principals.set(user_id, principal)
+        
+        return principal
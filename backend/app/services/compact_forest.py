@@ -0,0 +1,91 @@
+"""
+Random forest flattened into arrays
+Nodes of every tree live in one set of arrays in depth-first order, so a
+node's left child is always the next node and only the right child index is
+stored. Prediction walks all samples through all trees at once with numpy.
+Built by forest_compression.py; thresholds may be float32, float16 or uint8
+bin codes and leaf probabilities float32 or uint8.
+"""
+from typing import List, Optional
+import numpy as np
+
+class CompactForest:
+    """Array-based random forest classifier with vectorized predict_proba"""
+
+    def __init__(
+        self,
+        classes: np.ndarray,
+        n_features: int,
+        roots: np.ndarray,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        right: np.ndarray,
+        value: np.ndarray,
+        cover: np.ndarray,
+        max_depth: int,
+        bin_edges: Optional[List[np.ndarray]] = None
+    ):
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.right = right
+        self.value = value
+        self.cover = cover
+        self.max_depth = max_depth
+        # With uint8 thresholds: per-feature sorted split values; a node stores its split's index + 1
+        self.bin_edges = bin_edges
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def is_leaf(self) -> np.ndarray:
+        """Leaves point right at themselves"""
+        return self.right == np.arange(self.n_nodes)
+
+    def encode(self, X: np.ndarray) -> np.ndarray:
+        """Feature values in the representation the thresholds use"""
+        X = np.asarray(X, dtype=np.float32)
+        if self.bin_edges is None:
+            return X
+        codes = np.empty(X.shape, dtype=np.int16)
+        for j, edges in enumerate(self.bin_edges):
+            # Number of split values below x: x <= edges[k] exactly when code <= k
+            codes[:, j] = np.searchsorted(edges, X[:, j], side="left")
+        return codes
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf index reached in every tree, shape (n_samples, n_trees)"""
+        X_encoded = self.encode(X)
+        nodes = np.tile(self.roots, len(X_encoded))
+        rows = np.repeat(np.arange(len(X_encoded)), self.n_trees)
+        active = np.flatnonzero(self.right[nodes] != nodes)
+        while active.size:
+            current = nodes[active]
+            x = X_encoded[rows[active], self.feature[current]]
+            if self.bin_edges is None:
+                go_left = x <= self.threshold[current]
+            else:
+                go_left = x < self.threshold[current]
+            step = np.where(go_left, current + 1, self.right[current])
+            nodes[active] = step
+            # Only paths still inside a tree are walked further
+            active = active[self.right[step] != step]
+        return nodes.reshape(len(X_encoded), self.n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.apply(X)
+        proba = self.value[leaves].astype(np.float32).sum(axis=1)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def score(self, X: np.ndarray, y: np.ndarray) -> float:
+        return float(np.mean(self.predict(X) == y))
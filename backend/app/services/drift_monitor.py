@@ -0,0 +1,234 @@
+"""
+Online drift monitor for incoming assessments
+Compares submitted answers and predicted risk levels with the training data
+summary saved by train_model.py (drift_reference.json). A submission is
+only copied into a fixed ring of recent rows; each time the ring wraps it is
+folded into the per-feature mean/variance and fixed-bin histograms kept
+since start, and the sliding-window statistics are computed from the ring
+when a report is requested. Memory does not grow with traffic. State is per
+worker process.
+"""
+import copy
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from app.config import settings
+
+# Interior bin edges for 0-10 item scores: one bin per integer score
+ITEM_BIN_EDGES = [score + 0.5 for score in range(10)]
+
+# Conventional PSI reading: below 0.1 stable, 0.1-0.25 moderate shift, above 0.25 drift
+PSI_MODERATE = 0.1
+PSI_DRIFT = 0.25
+
+def psi(expected: np.ndarray, actual: np.ndarray, epsilon: float = 1e-4) -> np.ndarray:
+    """Population stability index of actual against expected counts or proportions, along the last axis"""
+    expected = np.asarray(expected, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    # Empty bins are floored at epsilon so the log stays finite
+    p = np.maximum(expected / np.maximum(expected.sum(axis=-1, keepdims=True), 1e-12), epsilon)
+    q = np.maximum(actual / np.maximum(actual.sum(axis=-1, keepdims=True), 1e-12), epsilon)
+    return ((q - p) * np.log(q / p)).sum(axis=-1)
+
+def psi_status(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    if value >= PSI_DRIFT:
+        return "drift"
+    return "moderate" if value >= PSI_MODERATE else "stable"
+
+class StreamingStats:
+    """Welford mean/variance and fixed-bin histograms per feature, in constant memory"""
+
+    def __init__(self, n_features: int, bin_edges: Sequence[float] = None):
+        self.bin_edges = np.asarray(ITEM_BIN_EDGES if bin_edges is None else bin_edges, dtype=np.float64)
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.histograms = np.zeros((n_features, len(self.bin_edges) + 1), dtype=np.int64)
+        self._rows = np.arange(n_features)
+
+    def bins(self, X: np.ndarray) -> np.ndarray:
+        """Bin index of every value; a value on an edge goes to the upper bin"""
+        return np.searchsorted(self.bin_edges, X, side="right")
+
+    def update(self, x: np.ndarray, bins: np.ndarray = None):
+        """Add one row"""
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.histograms[self._rows, self.bins(x) if bins is None else bins] += 1
+
+    def update_batch(self, X: np.ndarray):
+        """Add many rows at once (Chan et al.'s merge of batch moments)"""
+        X = np.asarray(X, dtype=np.float64)
+        if not len(X):
+            return
+        n = len(X)
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        for j in range(X.shape[1]):
+            self.histograms[j] += np.bincount(self.bins(X[:, j]), minlength=self.histograms.shape[1])
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self.m2 / max(self.count - 1, 1)
+
+    def to_reference(self, feature_names: List[str], labels: List[str], label_counts: Sequence[int]) -> Dict[str, Any]:
+        """JSON-serializable training summary for DriftMonitor.set_reference"""
+        return {
+            "created_at": datetime.utcnow().isoformat(),
+            "rows": self.count,
+            "feature_names": list(feature_names),
+            "labels": list(labels),
+            "bin_edges": self.bin_edges.tolist(),
+            "mean": self.mean.tolist(),
+            "std": np.sqrt(self.variance).tolist(),
+            "histograms": self.histograms.tolist(),
+            "label_counts": [int(count) for count in label_counts]
+        }
+
+class DriftMonitor:
+    """Streaming feature and risk-level drift against a training reference"""
+
+    def __init__(self, window_size: int = 5000, level_windows: Sequence[int] = (100, 1000, 5000)):
+        self.window_size = window_size
+        self.level_windows = sorted(level_windows)
+        self._lock = threading.Lock()
+        self.reference: Optional[Dict[str, Any]] = None
+        self._reset(None)
+
+    def _reset(self, reference: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.feature_names = reference["feature_names"] if reference else []
+        self.labels = reference["labels"] if reference else []
+        self._level_index = {label: i for i, label in enumerate(self.labels)}
+        self.started_at = datetime.utcnow()
+        # Rows older than the ring are folded into stats a whole ring at a time
+        self.stats = StreamingStats(len(self.feature_names), reference["bin_edges"] if reference else None)
+        self._rows = np.zeros((self.window_size, len(self.feature_names)), dtype=np.float32)
+        self._seen = 0
+        self._levels = np.zeros(self.level_windows[-1], dtype=np.int8)
+        self._level_total = np.zeros(len(self.labels), dtype=np.int64)
+        self._level_seen = 0
+
+    def set_reference(self, reference: Dict[str, Any]):
+        """Start monitoring against a new training reference; previous observations are dropped"""
+        with self._lock:
+            self._reset(reference)
+
+    def reset(self):
+        """Drop observations but keep the reference"""
+        with self._lock:
+            self._reset(self.reference)
+
+    def observe(self, features: np.ndarray, risk_level: Optional[str] = None):
+        """Record one submission's raw item scores (in reference feature order) and predicted level"""
+        if self.reference is None:
+            return
+        level = self._level_index.get(risk_level)
+        with self._lock:
+            slot = self._seen % self.window_size
+            if slot == 0 and self._seen:
+                self.stats.update_batch(self._rows)
+            self._rows[slot] = features
+            self._seen += 1
+            if level is not None:
+                self._levels[self._level_seen % len(self._levels)] = level
+                self._level_total[level] += 1
+                self._level_seen += 1
+
+    def observe_responses(self, responses: Dict[str, Any], risk_level: Optional[str] = None):
+        """observe() from a questionnaire response dict; unanswered or invalid items count as 0"""
+        if self.reference is None:
+            return
+        x = [0.0] * len(self.feature_names)
+        for j, name in enumerate(self.feature_names):
+            try:
+                x[j] = min(max(float(responses.get(name, 0)), 0), 10)
+            except (TypeError, ValueError):
+                pass
+        self.observe(x, risk_level)
+
+    def _recent_levels(self, levels: np.ndarray, seen: int, window: int) -> np.ndarray:
+        """Counts per label over the last min(seen, window) levels of the ring"""
+        n = min(seen, window)
+        slots = np.arange(seen - n, seen) % len(levels)
+        return np.bincount(levels[slots], minlength=len(self.labels))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current drift report: per-feature moments and PSI, and risk-level distributions per window"""
+        with self._lock:
+            if self.reference is None:
+                return {"reference": None, "observed": 0, "worker_pid": os.getpid()}
+            seen, folded = self._seen, self.stats.count
+            stats = copy.deepcopy(self.stats)
+            rows = self._rows[:min(seen, self.window_size)].copy()
+            levels, level_total, level_seen = self._levels.copy(), self._level_total.copy(), self._level_seen
+
+        # The ring holds the last window_size rows; its first seen - folded rows are not in stats yet
+        stats.update_batch(rows[:seen - folded])
+        window = StreamingStats(len(self.feature_names), stats.bin_edges)
+        window.update_batch(rows)
+
+        reference = self.reference
+        reference_histograms = np.asarray(reference["histograms"])
+        reference_std = np.maximum(np.asarray(reference["std"]), 1e-12)
+        psi_total = psi(reference_histograms, stats.histograms) if seen else [None] * len(self.feature_names)
+        psi_window = psi(reference_histograms, window.histograms) if seen else [None] * len(self.feature_names)
+        std = np.sqrt(stats.variance)
+
+        features = {}
+        for j, name in enumerate(self.feature_names):
+            window_psi = float(psi_window[j]) if seen else None
+            features[name] = {
+                "mean": float(stats.mean[j]) if seen else None,
+                "std": float(std[j]) if seen > 1 else None,
+                "reference_mean": reference["mean"][j],
+                "reference_std": reference["std"][j],
+                # Shift of the mean in reference standard deviations
+                "mean_shift": float((stats.mean[j] - reference["mean"][j]) / reference_std[j]) if seen else None,
+                "psi": float(psi_total[j]) if seen else None,
+                "psi_window": window_psi,
+                "status": psi_status(window_psi)
+            }
+
+        reference_levels = np.asarray(reference["label_counts"], dtype=float)
+        risk_levels = {}
+        for window_levels in self.level_windows:
+            counts = self._recent_levels(levels, level_seen, window_levels)
+            n = int(counts.sum())
+            risk_levels[str(window_levels)] = {
+                "observed": n,
+                "distribution": dict(zip(self.labels, (counts / max(n, 1)).round(4).tolist())),
+                "psi": float(psi(reference_levels, counts)) if n else None
+            }
+        risk_levels["total"] = {
+            "observed": int(level_seen),
+            "distribution": dict(zip(self.labels, (level_total / max(level_seen, 1)).round(4).tolist())),
+            "psi": float(psi(reference_levels, level_total)) if level_seen else None
+        }
+
+        worst = max((f["psi_window"] for f in features.values() if f["psi_window"] is not None), default=None)
+        return {
+            "reference": {"created_at": reference.get("created_at"), "rows": reference["rows"]},
+            "since": self.started_at.isoformat(),
+            "observed": int(seen),
+            "window_size": self.window_size,
+            "worker_pid": os.getpid(),
+            "status": psi_status(worst),
+            "max_psi_window": worst,
+            "reference_levels": dict(zip(self.labels, (reference_levels / max(reference_levels.sum(), 1)).round(4).tolist())),
+            "features": features,
+            "risk_levels": risk_levels
+        }
+
+drift_monitor = DriftMonitor(window_size=settings.DRIFT_WINDOW_SIZE, level_windows=settings.DRIFT_LEVEL_WINDOWS)
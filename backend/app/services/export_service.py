@@ -0,0 +1,169 @@
+"""
+De-identified research export of assessments joined with risk scores
+Streams rows through a server-side cursor so memory is bounded by the chunk size
+"""
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from sqlalchemy import and_, select
+from sqlalchemy.engine import Engine
+from app.config import settings
+from app.models.models import Assessment, RiskScore, User
+from app.services.analytics_service import age_band
+
+# Exportable columns; direct identifiers (email, username, name, exact age) are never exported
+EXPORT_COLUMNS = {
+    "assessment_id": Assessment.id,
+    "subject_id": Assessment.user_id,  # Replaced by a keyed pseudonym
+    "questionnaire_id": Assessment.questionnaire_id,
+    "completed_at": Assessment.completed_at,
+    "responses": Assessment.responses,
+    "risk_level": RiskScore.risk_level,
+    "risk_score": RiskScore.risk_score,
+    "confidence_score": RiskScore.confidence_score,
+    "ml_model_used": RiskScore.ml_model_used,
+    "model_version": RiskScore.model_version,
+    "calculated_at": RiskScore.calculated_at,
+    "age_band": User.age,  # Coarsened to a band
+    "gender": User.gender
+}
+
+class ExportService:
+    """Service for streaming de-identified assessment exports"""
+
+    def __init__(self, chunk_size: int = None):
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        self._pseudonym_key = (settings.EXPORT_PSEUDONYM_KEY or settings.SECRET_KEY).encode("utf-8")
+
+    def resolve_columns(self, columns: Optional[List[str]]) -> List[str]:
+        """Validate a column projection, defaulting to all exportable columns"""
+        if not columns:
+            return list(EXPORT_COLUMNS)
+
+        unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+
+        return list(dict.fromkeys(columns))
+
+    def pseudonymize(self, user_id: Optional[str]) -> Optional[str]:
+        """Stable keyed pseudonym for a user id"""
+        if user_id is None:
+            return None
+        return hmac.new(self._pseudonym_key, user_id.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def _build_query(self, columns: List[str], start: Optional[datetime], end: Optional[datetime]):
+        query = select(*[EXPORT_COLUMNS[column] for column in columns]).select_from(Assessment).join(
+            RiskScore, and_(RiskScore.assessment_id == Assessment.id, RiskScore.superseded_at.is_(None))
+        )
+        if "age_band" in columns or "gender" in columns:
+            query = query.outerjoin(User, User.id == Assessment.user_id)
+
+        query = query.filter(Assessment.status == "completed")
+        if start is not None:
+            query = query.filter(Assessment.completed_at >= start)
+        if end is not None:
+            query = query.filter(Assessment.completed_at < end)
+
+        return query.order_by(Assessment.completed_at, Assessment.id)
+
+    def iter_chunks(
+        self,
+        engine: Engine,
+        columns: Optional[List[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield lists of at most chunk_size de-identified rows"""
+        columns = self.resolve_columns(columns)
+        query = self._build_query(columns, start, end)
+
+        with engine.connect() as conn:
+            # stream_results uses a server-side cursor where the driver supports it
+            result = conn.execution_options(stream_results=True, yield_per=self.chunk_size).execute(query)
+            for partition in result.partitions():
+                chunk = []
+                for row in partition:
+                    record = dict(zip(columns, row))
+                    if "subject_id" in record:
+                        record["subject_id"] = self.pseudonymize(record["subject_id"])
+                    if "age_band" in record:
+                        record["age_band"] = age_band(record["age_band"])
+                    chunk.append(record)
+                yield chunk
+
+    def iter_ndjson(
+        self,
+        engine: Engine,
+        columns: Optional[List[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Iterator[bytes]:
+        """Yield NDJSON-encoded chunks, one JSON object per line"""
+        for chunk in self.iter_chunks(engine, columns, start, end):
+            yield _encode_ndjson(chunk)
+
+    def write_ndjson(
+        self,
+        engine: Engine,
+        path: str,
+        columns: Optional[List[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> int:
+        """Write the export to an NDJSON file; returns rows written"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        rows_written = 0
+        with open(path, "wb") as f:
+            for chunk in self.iter_chunks(engine, columns, start, end):
+                f.write(_encode_ndjson(chunk))
+                rows_written += len(chunk)
+
+        return rows_written
+
+    def write_parquet(
+        self,
+        engine: Engine,
+        path: str,
+        columns: Optional[List[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> int:
+        """Write the export to a Parquet file, one row group per chunk; returns rows written"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = self.resolve_columns(columns)
+        schema = pa.schema([(column, _parquet_type(pa, column)) for column in columns])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        rows_written = 0
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for chunk in self.iter_chunks(engine, columns, start, end):
+                if "responses" in schema.names:
+                    for record in chunk:
+                        record["responses"] = json.dumps(record["responses"], default=_json_default)
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                rows_written += len(chunk)
+
+        return rows_written
+
+def _encode_ndjson(chunk: List[Dict[str, Any]]) -> bytes:
+    lines = [json.dumps(record, default=_json_default, separators=(",", ":")) for record in chunk]
+    return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _parquet_type(pa, column: str):
+    if column in ("completed_at", "calculated_at"):
+        return pa.timestamp("us")
+    if column in ("risk_score", "confidence_score"):
+        return pa.float64()
+    return pa.string()  # responses are stored as a JSON string
@@ -4,37 +4,148 @@ Combines Deep Learning, ML, and RAG approaches
 """
 import numpy as np
 import json
-from typing import Dict, List, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier
 import joblib
 import os
+import time
+from app.config import settings
+from app.services.drift_monitor import drift_monitor
+from app.services.model_bundle import BUNDLE_FILE, ModelBundle
+from app.services.sequence_scorer import SequenceScorer
+from app.services.shadow_evaluator import shadow_evaluator
+from app.services.tree_explainer import TreeExplainer, rank_attributions
+
+# Risk levels from least to most severe
+RISK_LEVELS = ["low", "medium", "high", "critical"]
 
 class MLService:
     """ML Service for mental health risk prediction"""
     
-    def __init__(self):
-        self.model_path = "./ml/models/trained_models"
+    def __init__(
+        self, model_path: str = "./ml/models/trained_models", candidate: bool = False, shadow_model_path: str = None
+    ):
+        self.model_path = model_path
+        # A shadow candidate is only used through predict_batch, so it skips the serving-side extras
+        self.candidate = candidate
         self.rf_model = None
         self.scaler = None
+        self.student = None
+        self.bundle = None
+        self.explainer = None
+        self.sequence_scorer = None
         self.feature_importance = None
+        # Model feature order and class labels; None until a trained model is loaded
+        self.feature_names = None
+        self.labels = None
+        # Per-model probability calibration maps (train_model.fit_calibration)
+        self.calibration = {}
+        self.served_model = None
+        # Recorded on every risk score; the bundle's version, or the manifest's without a bundle
+        self.model_version = None
         self.load_models()
+        if shadow_model_path and not candidate:
+            self._load_shadow(shadow_model_path)
     
     def load_models(self):
-        """Load pre-trained models"""
+        """Load pre-trained models, from the bundle when one has been written"""
         try:
+            bundle_file = os.path.join(self.model_path, BUNDLE_FILE)
+            if os.path.exists(bundle_file):
+                self._load_bundle(bundle_file)
+                return
+            
             model_file = os.path.join(self.model_path, "risk_predictor_rf.pkl")
             scaler_file = os.path.join(self.model_path, "scaler.pkl")
+            student_file = os.path.join(self.model_path, "risk_student.pkl")
+            manifest_file = os.path.join(self.model_path, "manifest.json")
+            calibration_file = os.path.join(self.model_path, "calibration.pkl")
+            sequence_file = os.path.join(self.model_path, "risk_sequence.pkl")
+            drift_file = os.path.join(self.model_path, "drift_reference.json")
             
             if os.path.exists(model_file):
                 self.rf_model = joblib.load(model_file)
+                self.served_model = "rf"
             
             if os.path.exists(scaler_file):
                 self.scaler = joblib.load(scaler_file)
+            
+            # Distilled student (distillation.py): one small model instead of the whole ensemble
+            if os.path.exists(student_file):
+                self.student = joblib.load(student_file)
+                self.served_model = "student"
+            
+            if os.path.exists(manifest_file):
+                with open(manifest_file) as f:
+                    manifest = json.load(f)
+                self.feature_names = manifest.get("feature_names")
+                self.labels = manifest.get("labels")
+                self.model_version = manifest.get("data_watermark") or manifest.get("created_at")
+            
+            if os.path.exists(calibration_file):
+                self.calibration = joblib.load(calibration_file)
+            
+            if os.path.exists(sequence_file) and not self.candidate:
+                self._load_sequence_scorer(joblib.load(sequence_file))
+            
+            if os.path.exists(drift_file) and not self.candidate:
+                with open(drift_file) as f:
+                    drift_monitor.set_reference(json.load(f))
         except Exception as e:
             print(f"Error loading models: {e}")
             self._initialize_default_models()
     
+    def _load_bundle(self, path: str):
+        """Read only the members serving needs; the rest stay on disk until asked for"""
+        self.bundle = ModelBundle(path)
+        self.scaler = self.bundle.load("scaler")
+        self.feature_names = self.bundle.index.get("feature_names")
+        self.labels = self.bundle.index.get("labels")
+        self.model_version = self.bundle.index.get("version")
+        if "student" in self.bundle:
+            self.student = self.bundle.load("student")
+            self.served_model = "student"
+        else:
+            # The compressed forest (forest_compression.py) is a fraction of the original's size
+            self.served_model = "rf_compact" if "rf_compact" in self.bundle else "rf"
+            self.rf_model = self.bundle.load(self.served_model)
+        if "calibration" in self.bundle:
+            self.calibration = self.bundle.load("calibration")
+        if "feature_importance" in self.bundle:
+            self.feature_importance = self.bundle.load("feature_importance")
+        if self.candidate:
+            return
+        if self.served_model == "rf_compact":
+            # Only the served forest is explained; paths are precomputed here so requests
+            # only pay for the attribution itself
+            self.explainer = TreeExplainer(self.rf_model, cache_size=settings.EXPLANATION_CACHE_SIZE)
+        if "sequence" in self.bundle:
+            self._load_sequence_scorer(self.bundle.load("sequence"))
+        if "drift_reference" in self.bundle:
+            # Submissions are compared with the data these models were trained on
+            drift_monitor.set_reference(self.bundle.load("drift_reference"))
+    
+    def _load_sequence_scorer(self, model: Dict[str, Any]):
+        """History-aware attention model (sequence_training.py) with its per-user cache"""
+        self.sequence_scorer = SequenceScorer(
+            model, cache_size=settings.SEQUENCE_CACHE_SIZE, ttl_seconds=settings.SEQUENCE_CACHE_TTL_SECONDS
+        )
+    
+    def _load_shadow(self, path: str):
+        """Score live traffic with the model in path in the background, for comparison only"""
+        candidate = MLService(path, candidate=True)
+        if not candidate.has_trained_model():
+            print(f"Shadow model not loaded: no trained model in {path}")
+            return
+        primary_labels = self.student["labels"] if self.student is not None else self.labels
+        shadow_evaluator.set_candidate(candidate, f"{path} ({candidate.served_model})", primary_labels)
+    
+    @property
+    def history_length(self) -> int:
+        """Earlier assessments the sequence model attends to besides the new one (0 without it)"""
+        return self.sequence_scorer.max_length - 1 if self.sequence_scorer is not None else 0
+    
     def _initialize_default_models(self):
         """Initialize default models if trained ones not found"""
         self.rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
@@ -66,47 +177,267 @@ class MLService:
         
         return np.array(features).reshape(1, -1)
     
-    def predict_risk(self, responses: Dict[str, Any]) -> Dict[str, Any]:
-        """Predict mental health risk level"""
+    @staticmethod
+    def _item_scores(responses: Dict[str, Any], feature_names: List[str]) -> np.ndarray:
+        """Raw 0-10 item scores in model feature order; unanswered or invalid items count as 0"""
+        features = np.zeros((1, len(feature_names)), dtype=np.float32)
+        for j, name in enumerate(feature_names):
+            try:
+                features[0, j] = min(max(float(responses.get(name, 0)), 0), 10)
+            except (TypeError, ValueError):
+                pass
+        return features
+    
+    def explain(self, responses: Dict[str, Any], risk_level: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Signed TreeSHAP attributions toward risk_level (largest magnitude first) and the items that raised risk.
+        
+        An item raised risk when its attributions, weighted by each level's
+        place on the 0-100 risk score scale, are positive: it moved the
+        expected risk score up. Answers that only made "low" more likely are
+        protective and are not listed, whatever level was predicted.
+        """
+        feature_names = self.feature_names
+        top = settings.EXPLANATION_TOP_FACTORS
+        raw = self._item_scores(responses, feature_names)
+        # Keyed by the raw scores: identical answers reuse the cached attribution
+        attributions = self.explainer.explain(self.scaler.transform(raw)[0], cache_key=raw.tobytes())
+        
+        toward_level = rank_attributions(attributions[:, self.labels.index(risk_level)], feature_names, top)
+        step = 100 / (len(RISK_LEVELS) - 1)
+        severity = attributions @ np.array([RISK_LEVELS.index(label) * step for label in self.labels])
+        raising = [feature_names[j] for j in np.argsort(-severity, kind="stable") if severity[j] > 0][:top]
+        return toward_level, raising
+    
+    def has_trained_model(self) -> bool:
+        """Whether a fitted model (not the untrained default) is loaded"""
+        if self.student is not None:
+            return True
+        return self.feature_names is not None and hasattr(self.rf_model, "classes_")
+    
+    def predict_proba_batch(self, responses_list: List[Dict[str, Any]]) -> np.ndarray:
+        """Calibrated class probabilities (n_responses, n_labels) in one model call"""
+        if self.student is not None:
+            # The student is trained on raw 0-10 item scores
+            features = np.vstack([self._item_scores(r, self.student["feature_names"]) for r in responses_list])
+            model = self.student["model"]
+            if hasattr(model, "predict_proba"):
+                proba = model.predict_proba(features)
+            else:
+                # Regressor students predict the probability vector directly
+                proba = np.clip(model.predict(features), 1e-6, None)
+                proba = proba / proba.sum(axis=1, keepdims=True)
+        else:
+            features = np.vstack([self._item_scores(r, self.feature_names) for r in responses_list])
+            proba = self.rf_model.predict_proba(self.scaler.transform(features))
+        
+        calibration = self.calibration.get(self.served_model)
+        if calibration is None:
+            return proba
+        # Same table lookup as train_model.apply_calibration
+        tables = calibration["tables"]
+        index = np.rint(np.clip(proba, 0, 1) * (tables.shape[1] - 1)).astype(np.intp)
+        calibrated = tables[np.arange(tables.shape[0]), index]
+        total = calibrated.sum(axis=1, keepdims=True)
+        return np.where(total > 0, calibrated / np.maximum(total, 1e-12), proba)
+    
+    def predict_batch(self, responses_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Risk level and confidence for many questionnaires at once"""
+        proba = self.predict_proba_batch(responses_list)
+        labels = self.student["labels"] if self.student is not None else self.labels
+        if self.student is not None:
+            model_used = f"Distilled {self.student['kind'].upper()}"
+        else:
+            model_used = "RandomForest (compressed)" if self.served_model == "rf_compact" else "RandomForest"
+        if self.served_model in self.calibration:
+            model_used += f", {self.calibration[self.served_model]['method']} calibrated"
+        
+        return [
+            {
+                "risk_level": labels[int(np.argmax(row))],
+                # Calibrated probability of the predicted level
+                "confidence_score": float(np.max(row)),
+                "probabilities": {label: float(p) for label, p in zip(labels, row)},
+                "model_used": model_used,
+                "served_model": self.served_model
+            }
+            for row in proba
+        ]
+    
+    def predict_with_history(
+        self,
+        user_id: Any,
+        responses: Dict[str, Any],
+        load_history: Optional[Callable[[], List[Dict[str, Any]]]] = None
+    ) -> Dict[str, Any]:
+        """Risk level from the user's recent assessments plus this one.
+        
+        load_history returns earlier responses, oldest first, and is only
+        called when this worker has no cached history for the user. The
+        cache is not updated; history_state in the result is handed to
+        remember_history once the assessment is stored.
+        """
+        scorer = self.sequence_scorer
+        
+        def history() -> np.ndarray:
+            past = load_history() if load_history is not None else []
+            return np.vstack([self._item_scores(r, scorer.feature_names) for r in past]) if past else None
+        
+        proba, keys, values = scorer.score_step(user_id, self._item_scores(responses, scorer.feature_names)[0], history)
+        return {**self._sequence_prediction(proba, len(keys)), "history_state": (keys, values)}
+    
+    def predict_history_batch(
+        self,
+        responses_list: List[Dict[str, Any]],
+        histories: List[List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """predict_with_history for many questionnaires, each with its earlier responses (oldest first); uncached"""
+        scorer = self.sequence_scorer
+        predictions = []
+        for responses, past in zip(responses_list, histories):
+            # The same window the live path attends over
+            window = past[max(len(past) - self.history_length, 0):] + [responses]
+            X = np.vstack([self._item_scores(r, scorer.feature_names) for r in window])
+            predictions.append(self._sequence_prediction(scorer.predict_sequence(X)[-1], len(window)))
+        return predictions
+    
+    def _sequence_prediction(self, proba: np.ndarray, steps: int) -> Dict[str, Any]:
+        labels = self.sequence_scorer.labels
+        return {
+            "risk_level": labels[int(np.argmax(proba))],
+            "confidence_score": float(np.max(proba)),
+            "probabilities": {label: float(p) for label, p in zip(labels, proba)},
+            "model_used": f"Attention (history of {steps})",
+            "served_model": "sequence"
+        }
+    
+    def remember_history(self, user_id: Any, result: Dict[str, Any]):
+        """Add a stored assessment's step (from predict_risk's result) to the user's cached history"""
+        state = result.pop("history_state", None)
+        if state is not None and self.sequence_scorer is not None:
+            self.sequence_scorer.remember(user_id, *state)
+    
+    def forget_history(self, user_id: Any):
+        """Drop a user's cached history so the next prediction reloads it"""
+        if self.sequence_scorer is not None:
+            self.sequence_scorer.forget(user_id)
+    
+    def predict_risk(
+        self,
+        responses: Dict[str, Any],
+        user_id: Any = None,
+        load_history: Optional[Callable[[], List[Dict[str, Any]]]] = None
+    ) -> Dict[str, Any]:
+        """Predict mental health risk level; with a user_id and a sequence model, from their history too.
+        
+        A history-based result carries history_state: pass the result to
+        remember_history after the assessment is committed.
+        """
         try:
-            # Extract features
-            features = self.extract_features(responses)
-            
-            # Get base features for scoring
-            base_features = np.mean(features) * 100
-            
-            # Identify contributing factors (features with high values)
-            contributing_factors = []
-            for key, value in responses.items():
-                if isinstance(value, (int, float)) and value > 6:
-                    contributing_factors.append(key)
-            
-            # Determine risk level based on score
-            if base_features < 30:
-                risk_level = "low"
-            elif base_features < 50:
-                risk_level = "medium"
-            elif base_features < 75:
-                risk_level = "high"
+            start = time.perf_counter()
+            if self.sequence_scorer is not None and user_id is not None:
+                prediction = self.predict_with_history(user_id, responses, load_history)
+            elif self.has_trained_model():
+                prediction = self.predict_batch([responses])[0]
             else:
-                risk_level = "critical"
-            
-            # Generate recommendations based on risk level and factors
-            recommendations = self._generate_recommendations(risk_level, contributing_factors)
+                prediction = None
+            model_ms = (time.perf_counter() - start) * 1000
             
-            return {
-                "risk_level": risk_level,
-                "risk_score": min(base_features, 100),
-                "contributing_factors": contributing_factors,
-                "recommendations": recommendations,
-                "model_used": "RandomForest + Feature Analysis",
-                "confidence_score": 0.85
-            }
+            result = self._assemble_prediction(responses, prediction)
+            if prediction is not None and "history_state" in prediction:
+                result["history_state"] = prediction["history_state"]
+            # The candidate sees the same request off the request path
+            shadow_evaluator.submit(
+                responses, result["risk_level"], model_ms,
+                from_history=prediction is not None and prediction["served_model"] == "sequence"
+            )
+            return result
         
         except Exception as e:
             print(f"Error in risk prediction: {e}")
             return self._default_prediction()
     
+    def predict_risk_batch(
+        self,
+        responses_list: List[Dict[str, Any]],
+        histories: Optional[List[List[Dict[str, Any]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """predict_risk for many questionnaires (not mirrored).
+        
+        With histories (each questionnaire's earlier responses, oldest first)
+        and a sequence model, scores like the live path does for a user;
+        otherwise with one call to the batch model.
+        """
+        if self.sequence_scorer is not None and histories is not None:
+            predictions = self.predict_history_batch(responses_list, histories)
+        elif self.has_trained_model():
+            predictions = self.predict_batch(responses_list)
+        else:
+            predictions = [None] * len(responses_list)
+        return [self._assemble_prediction(r, p) for r, p in zip(responses_list, predictions)]
+    
+    @staticmethod
+    def expected_risk_score(probabilities: Dict[str, float]) -> float:
+        """Probability-weighted risk level on a 0-100 scale (low = 0, critical = 100)"""
+        step = 100 / (len(RISK_LEVELS) - 1)
+        weighted = total = 0.0
+        for label, p in probabilities.items():
+            if label in RISK_LEVELS:
+                weighted += RISK_LEVELS.index(label) * step * p
+                total += p
+        return float(weighted / total) if total > 0 else 0.0
+    
+    def _assemble_prediction(self, responses: Dict[str, Any], prediction: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Full risk result around a model prediction (None: rule-based level from the mean item score)"""
+        # Extract features
+        features = self.extract_features(responses)
+        
+        # Get base features for scoring
+        base_features = np.mean(features) * 100
+        
+        # Identify contributing factors (features with high values)
+        contributing_factors = []
+        for key, value in responses.items():
+            if isinstance(value, (int, float)) and value > 6:
+                contributing_factors.append(key)
+        
+        # Determine risk level based on score
+        if base_features < 30:
+            risk_level = "low"
+        elif base_features < 50:
+            risk_level = "medium"
+        elif base_features < 75:
+            risk_level = "high"
+        else:
+            risk_level = "critical"
+        
+        model_used = "RandomForest + Feature Analysis"
+        confidence_score = 0.85
+        risk_score = min(base_features, 100)
+        if prediction is not None:
+            risk_level = prediction["risk_level"]
+            model_used = prediction["model_used"]
+            confidence_score = prediction["confidence_score"]
+            # From the same probabilities as the level and confidence, so the three agree
+            risk_score = self.expected_risk_score(prediction["probabilities"])
+        
+        factor_attributions = []
+        # Attributions describe the compact forest, so only its own predictions are explained
+        if self.explainer is not None and prediction is not None and prediction["served_model"] == "rf_compact":
+            factor_attributions, contributing_factors = self.explain(responses, risk_level)
+        
+        # Generate recommendations based on risk level and factors
+        recommendations = self._generate_recommendations(risk_level, contributing_factors)
+        
+        return {
+            "risk_level": risk_level,
+            "risk_score": risk_score,
+            "contributing_factors": contributing_factors,
+            "factor_attributions": factor_attributions,
+            "recommendations": recommendations,
+            "model_used": model_used,
+            "confidence_score": confidence_score
+        }
+    
     def _generate_recommendations(self, risk_level: str, factors: List[str]) -> List[str]:
         """Generate personalized recommendations"""
         base_recommendations = {
@@ -143,6 +474,7 @@ class MLService:
             "risk_level": "medium",
             "risk_score": 50,
             "contributing_factors": [],
+            "factor_attributions": [],
             "recommendations": ["Please consult a healthcare professional"],
             "model_used": "Default",
             "confidence_score": 0.5
@@ -0,0 +1,157 @@
+"""
+Single-file model bundles
+A bundle packs every serving artifact (scaler, models, feature schema,
+metrics, version) into one file, so a deploy swaps all of them atomically.
+Layout: an 8-byte magic, the index length and SHA-256, an uncompressed JSON
+index, then the member payloads back to back. Opening a bundle reads only
+the index; each member is read, checksummed and deserialized on first use.
+"""
+import hashlib
+import io
+import json
+import os
+import struct
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List
+import joblib
+
+MAGIC = b"RSKBNDL1"
+FORMAT_VERSION = 1
+BUNDLE_FILE = "risk_models.bundle"
+
+# magic, index length, index SHA-256
+_PREFIX = struct.Struct("<8sQ32s")
+
+# How each member's bytes are turned back into an object
+CODECS = ["joblib", "json", "keras"]
+
+def codec_for(filename: str) -> str:
+    """Codec for an artifact file, from its extension"""
+    if filename.endswith(".pkl"):
+        return "joblib"
+    if filename.endswith(".json"):
+        return "json"
+    if filename.endswith((".h5", ".keras")):
+        return "keras"
+    raise ValueError(f"No bundle codec for {filename}")
+
+def write_bundle(path: str, members: Dict[str, Dict[str, Any]], metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Write a bundle; members maps name -> {"codec", "data" (bytes), optional "suffix" and "filename"}.
+
+    The file is written next to its destination and renamed into place, so
+    readers see either the old bundle or the new one, never a mix.
+    """
+    entries, offset = {}, 0
+    for name, member in members.items():
+        if member["codec"] not in CODECS:
+            raise ValueError(f"Unknown codec {member['codec']} for member {name}")
+        entries[name] = {
+            "codec": member["codec"],
+            "suffix": member.get("suffix"),
+            "filename": member.get("filename"),
+            "offset": offset,
+            "length": len(member["data"]),
+            "sha256": hashlib.sha256(member["data"]).hexdigest()
+        }
+        offset += len(member["data"])
+
+    index = json.dumps({
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        **(metadata or {}),
+        "members": entries
+    }, sort_keys=True).encode("utf-8")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(index), hashlib.sha256(index).digest()))
+        f.write(index)
+        for member in members.values():
+            f.write(member["data"])
+    os.replace(tmp_path, path)
+    return json.loads(index)
+
+def pack_directory(model_path: str, artifacts: Dict[str, str], metadata: Dict[str, Any] = None, path: str = None) -> str:
+    """Bundle artifact files already saved in model_path; artifacts maps member name -> file name"""
+    members = {}
+    for name, filename in artifacts.items():
+        with open(os.path.join(model_path, filename), "rb") as f:
+            members[name] = {
+                "codec": codec_for(filename),
+                "data": f.read(),
+                "suffix": os.path.splitext(filename)[1],
+                "filename": filename
+            }
+    path = path or os.path.join(model_path, BUNDLE_FILE)
+    write_bundle(path, members, metadata)
+    return path
+
+class ModelBundle:
+    """Read side of a bundle: the index up front, members lazily"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                raise ValueError(f"{path} is not a model bundle")
+            magic, index_length, index_digest = _PREFIX.unpack(prefix)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a model bundle")
+            raw_index = f.read(index_length)
+        if hashlib.sha256(raw_index).digest() != index_digest:
+            raise ValueError(f"{path}: index checksum mismatch")
+
+        self.index = json.loads(raw_index)
+        if self.index["format_version"] > FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported bundle format {self.index['format_version']}")
+        self._data_start = _PREFIX.size + index_length
+        self._cache: Dict[str, Any] = {}
+
+    @property
+    def members(self) -> List[str]:
+        return list(self.index["members"])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index["members"]
+
+    def read_bytes(self, name: str) -> bytes:
+        """Raw bytes of one member, verified against its checksum"""
+        entry = self.index["members"][name]
+        with open(self.path, "rb") as f:
+            f.seek(self._data_start + entry["offset"])
+            data = f.read(entry["length"])
+        if len(data) != entry["length"] or hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise ValueError(f"{self.path}: checksum mismatch in member {name}")
+        return data
+
+    def load(self, name: str) -> Any:
+        """Deserialize a member on first use and cache it"""
+        if name not in self._cache:
+            entry = self.index["members"][name]
+            data = self.read_bytes(name)
+            if entry["codec"] == "joblib":
+                self._cache[name] = joblib.load(io.BytesIO(data))
+            elif entry["codec"] == "json":
+                self._cache[name] = json.loads(data)
+            else:
+                self._cache[name] = self._load_keras(data, entry.get("suffix") or ".keras")
+        return self._cache[name]
+
+    @staticmethod
+    def _load_keras(data: bytes, suffix: str):
+        # Keras only loads from a path, and picks the format from the extension
+        from tensorflow import keras
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model" + suffix)
+            with open(path, "wb") as f:
+                f.write(data)
+            return keras.models.load_model(path)
+
+    def verify(self) -> bool:
+        """Check every member's checksum without deserializing anything"""
+        for name in self.members:
+            self.read_bytes(name)
+        return True
@@ -0,0 +1,164 @@
+"""
+Bulk user provisioning
+Creates many accounts from a CSV: one set-based duplicate check, bcrypt
+spread across a shared thread pool and users inserted in batches
+"""
+import csv
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import ValidationError
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.models import User
+from app.models.schemas import UserCreate
+from app.services.password_hasher import pwd_context
+
+CSV_COLUMNS = ["email", "username", "password", "full_name", "age", "gender"]
+
+class ProvisioningService:
+    """Service for creating users in bulk"""
+
+    def __init__(self, hash_workers: int = None, batch_size: int = None):
+        self.hash_workers = hash_workers or settings.PROVISIONING_HASH_WORKERS or os.cpu_count() or 1
+        self.batch_size = batch_size or settings.PROVISIONING_BATCH_SIZE
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def parse_csv(self, text: str) -> List[Dict[str, Any]]:
+        """Read CSV rows keyed by header; raises ValueError on missing columns"""
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+        return [{column: (row.get(column) or "").strip() for column in CSV_COLUMNS} for row in reader]
+
+    def provision(self, db: Session, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create users for the given rows; returns per-row results and throughput"""
+        started = time.perf_counter()
+        results: List[Dict[str, Any]] = [
+            {"row": index + 1, "email": row.get("email"), "status": "error", "user_id": None, "error": None}
+            for index, row in enumerate(rows)
+        ]
+
+        # Validate and drop duplicates within the file itself
+        candidates: Dict[int, UserCreate] = {}
+        seen_emails, seen_usernames = set(), set()
+        for index, row in enumerate(rows):
+            try:
+                user = UserCreate(**row)
+            except ValidationError as e:
+                results[index]["error"] = "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+                )
+                continue
+            if user.email in seen_emails or user.username in seen_usernames:
+                results[index]["error"] = "Duplicate email or username in file"
+                continue
+            seen_emails.add(user.email)
+            seen_usernames.add(user.username)
+            candidates[index] = user
+
+        # One set-based lookup for every existing email / username
+        existing_emails, existing_usernames = self._find_existing(
+            db, [user.email for user in candidates.values()], [user.username for user in candidates.values()]
+        )
+        for index in list(candidates):
+            user = candidates[index]
+            if user.email in existing_emails or user.username in existing_usernames:
+                results[index]["error"] = "Email or username already registered"
+                del candidates[index]
+
+        # Hash outside any transaction so no connection is held during bcrypt
+        db.rollback()
+        hashes = self._hash_passwords([user.password for user in candidates.values()])
+
+        now = datetime.utcnow()
+        pending = []
+        for (index, user), hashed_password in zip(candidates.items(), hashes):
+            pending.append((index, {
+                "id": str(uuid.uuid4()),
+                "email": user.email,
+                "username": user.username,
+                "hashed_password": hashed_password,
+                "full_name": user.full_name,
+                "age": user.age,
+                "gender": user.gender,
+                "created_at": now,
+                "updated_at": now,
+                "is_active": True
+            }))
+
+        for offset in range(0, len(pending), self.batch_size):
+            self._insert_batch(db, pending[offset:offset + self.batch_size], results)
+
+        elapsed = time.perf_counter() - started
+        created = sum(1 for result in results if result["status"] == "created")
+        return {
+            "total": len(rows),
+            "created": created,
+            "failed": len(rows) - created,
+            "elapsed_seconds": round(elapsed, 3),
+            "users_per_second": round(created / elapsed, 1) if elapsed > 0 else None,
+            "results": results
+        }
+
+    def _find_existing(self, db: Session, emails: List[str], usernames: List[str]):
+        existing_emails, existing_usernames = set(), set()
+        # Chunked only to stay under driver bind-parameter limits on very large files
+        step = 5000
+        for offset in range(0, max(len(emails), len(usernames)), step):
+            rows = db.query(User.email, User.username).filter(or_(
+                User.email.in_(emails[offset:offset + step]),
+                User.username.in_(usernames[offset:offset + step])
+            )).all()
+            for email, username in rows:
+                existing_emails.add(email)
+                existing_usernames.add(username)
+        return existing_emails, existing_usernames
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use and shared by every import in this process
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hash_workers, thread_name_prefix="provisioning-hash"
+                )
+            return self._executor
+
+    def _hash_passwords(self, passwords: List[str]) -> List[str]:
+        if len(passwords) < 2 or self.hash_workers <= 1:
+            return [pwd_context.hash(password) for password in passwords]
+
+        # bcrypt releases the GIL, so threads use every core; concurrent imports
+        # queue on the one pool instead of each starting hash_workers more
+        return list(self._get_executor().map(pwd_context.hash, passwords))
+
+    def _insert_batch(self, db: Session, batch: List[tuple], results: List[Dict[str, Any]]):
+        try:
+            db.execute(insert(User), [values for _, values in batch])
+            db.commit()
+            for index, values in batch:
+                results[index].update(status="created", user_id=values["id"])
+            return
+        except IntegrityError:
+            # A concurrent registration won the race; retry row by row to find it
+            db.rollback()
+
+        for index, values in batch:
+            try:
+                db.execute(insert(User), [values])
+                db.commit()
+                results[index].update(status="created", user_id=values["id"])
+            except IntegrityError:
+                db.rollback()
+                results[index]["error"] = "Email or username already registered"
+
+provisioning_service = ProvisioningService()
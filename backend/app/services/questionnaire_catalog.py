@@ -0,0 +1,100 @@
+"""
+In-process questionnaire catalog
+Serves questionnaires from pre-serialized JSON bytes with strong ETags
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.models import Questionnaire
+from app.models.schemas import QuestionnaireResponse
+
+class CatalogEntry:
+    """Pre-serialized response body and its strong ETag"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Check an If-None-Match header value against this entry's ETag"""
+        if not if_none_match:
+            return False
+
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*":
+                return True
+            # Weak comparison is allowed for If-None-Match (RFC 9110 13.1.2)
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate == self.etag:
+                return True
+
+        return False
+
+class QuestionnaireCatalog:
+    """Questionnaire catalog loaded once from the database and kept in memory"""
+
+    def __init__(self, ttl_seconds: int = 0):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # (list entry, per-id entries), swapped atomically on reload
+        self._snapshot: Optional[Tuple[CatalogEntry, Dict[str, CatalogEntry]]] = None
+        self._loaded_at = 0.0
+
+    @staticmethod
+    def _serialize(payload) -> bytes:
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def _is_stale(self) -> bool:
+        if self._snapshot is None:
+            return True
+        if self.ttl_seconds > 0:
+            return time.monotonic() - self._loaded_at > self.ttl_seconds
+        return False
+
+    def _load(self, db: Session):
+        """Read all questionnaires once and pre-serialize every response body"""
+        questionnaires = db.query(Questionnaire).all()
+
+        items: List[dict] = []
+        entries: Dict[str, CatalogEntry] = {}
+        for questionnaire in questionnaires:
+            item = QuestionnaireResponse.model_validate(questionnaire).model_dump(mode="json")
+            items.append(item)
+            entries[questionnaire.id] = CatalogEntry(self._serialize(item))
+
+        self._snapshot = (CatalogEntry(self._serialize(items)), entries)
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self, db: Session) -> Tuple[CatalogEntry, Dict[str, CatalogEntry]]:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._is_stale():
+            return snapshot
+        with self._lock:
+            if self._is_stale():
+                self._load(db)
+            return self._snapshot
+
+    def get_all(self, db: Session) -> CatalogEntry:
+        """Get the serialized list of all questionnaires"""
+        index, _ = self._ensure_loaded(db)
+        return index
+
+    def get(self, db: Session, questionnaire_id: str) -> Optional[CatalogEntry]:
+        """Get a serialized questionnaire, or None if it does not exist"""
+        _, entries = self._ensure_loaded(db)
+        return entries.get(questionnaire_id)
+
+    def invalidate(self):
+        """Drop the cached catalog so the next read reloads it"""
+        with self._lock:
+            self._snapshot = None
+
+questionnaire_catalog = QuestionnaireCatalog(ttl_seconds=settings.QUESTIONNAIRE_CACHE_TTL_SECONDS)
@@ -0,0 +1,282 @@
+"""
+Offline re-scoring of stored assessments with a new model version
+Completed assessments are split into id ranges of about equal size; a process
+pool scores each range in batches (one model call per batch) and writes the
+new version's risk scores with bulk statements. When the model has a
+history-aware sequence model, each assessment is scored with the user's
+earlier assessments, as the live API scores it. Earlier versions are kept,
+marked superseded. Each batch commits together with its partition's
+checkpoint, so an interrupted run resumes where it stopped, and an optional
+rate limit keeps the job from starving the live API.
+"""
+import multiprocessing
+import os
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, insert, or_, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.models import UNVERSIONED, Assessment, RescoreCheckpoint, RiskScore, UserRiskSummary
+from app.services.ml_service import MLService
+from app.services.risk_summary_service import RiskSummaryService
+
+def partition_bounds(db: Session, partitions: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Split completed assessment ids into contiguous [lower, upper) ranges of about equal row counts"""
+    completed = Assessment.status == "completed"
+    total = db.query(func.count(Assessment.id)).filter(completed).scalar() or 0
+    partitions = max(1, min(partitions, total))
+    # Cut points are read from the id index, so the ranges balance whatever the id format
+    cuts = sorted({
+        db.query(Assessment.id).filter(completed).order_by(Assessment.id).offset(k * total // partitions).limit(1).scalar()
+        for k in range(1, partitions)
+    })
+    bounds = [None] + cuts + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _rescore_partition(
+    model_path: str,
+    model_version: str,
+    partition: int,
+    batch_size: int,
+    max_rows_per_second: float,
+    nice: int
+) -> Dict[str, Any]:
+    # Module-level so it can be pickled to pool workers; each worker opens its own model and session
+    from app.database import SessionLocal
+    if nice:
+        os.nice(nice)
+    ml_service = MLService(model_path)
+    db = SessionLocal()
+    try:
+        return RescoringService.rescore_partition(
+            db, ml_service, model_version, partition, batch_size, max_rows_per_second
+        )
+    finally:
+        db.close()
+
+class RescoringService:
+    """Service for re-scoring every stored assessment with a new model version"""
+
+    def __init__(self, workers: int = None, batch_size: int = None, max_rows_per_second: float = None):
+        self.workers = workers or settings.RESCORE_WORKERS or os.cpu_count() or 1
+        self.batch_size = batch_size or settings.RESCORE_BATCH_SIZE
+        # Whole job; split evenly between workers. 0 = unthrottled
+        self.max_rows_per_second = (
+            settings.RESCORE_MAX_ROWS_PER_SECOND if max_rows_per_second is None else max_rows_per_second
+        )
+
+    def checkpoints(self, db: Session, model_version: str, partitions: int = None) -> List[RescoreCheckpoint]:
+        """This version's partition checkpoints, created on the first run"""
+        checkpoints = db.query(RescoreCheckpoint).filter(
+            RescoreCheckpoint.model_version == model_version
+        ).order_by(RescoreCheckpoint.partition).all()
+        if checkpoints:
+            return checkpoints
+
+        # Several ranges per worker so a slow range does not hold up the whole run
+        bounds = partition_bounds(db, partitions or self.workers * 4)
+        checkpoints = [
+            RescoreCheckpoint(model_version=model_version, partition=index, lower_id=lower, upper_id=upper, rows_processed=0)
+            for index, (lower, upper) in enumerate(bounds)
+        ]
+        db.add_all(checkpoints)
+        db.commit()
+        return checkpoints
+
+    def run(
+        self,
+        db: Session,
+        model_path: str,
+        model_version: str = None,
+        partitions: int = None,
+        nice: int = 0,
+        on_partition: Callable[[Dict[str, Any]], None] = None
+    ) -> Dict[str, Any]:
+        """Re-score every partition not yet completed for the model in model_path; returns throughput"""
+        model_version = model_version or MLService(model_path, candidate=True).model_version
+        # Unversioned scores are the live path's; re-scoring under that label would overwrite them
+        if not model_version or model_version == UNVERSIONED:
+            raise ValueError(f"No versioned model in {model_path}")
+
+        checkpoints = self.checkpoints(db, model_version, partitions)
+        pending = [checkpoint.partition for checkpoint in checkpoints if checkpoint.completed_at is None]
+        # Release the connection while the workers run
+        db.rollback()
+
+        started = time.perf_counter()
+        results = []
+        workers = min(self.workers, len(pending))
+        rate = self.max_rows_per_second / max(workers, 1)
+        args = (model_path, model_version)
+        if workers <= 1:
+            for partition in pending:
+                results.append(_rescore_partition(*args, partition, self.batch_size, rate, nice))
+                if on_partition:
+                    on_partition(results[-1])
+        else:
+            # spawn: forking a process that holds database connections is unsafe
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = [
+                    executor.submit(_rescore_partition, *args, partition, self.batch_size, rate, nice)
+                    for partition in pending
+                ]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    if on_partition:
+                        on_partition(results[-1])
+        elapsed = time.perf_counter() - started
+
+        # Trends and latest levels now come from the new version's scores
+        summaries = self.rebuild_summaries(db) if pending else 0
+        rows = sum(result["rows"] for result in results)
+        return {
+            "model_version": model_version,
+            "partitions": len(checkpoints),
+            "partitions_run": len(results),
+            "workers": workers,
+            "rows": rows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+            "model_seconds": round(sum(result["model_seconds"] for result in results), 3),
+            "write_seconds": round(sum(result["write_seconds"] for result in results), 3),
+            "throttled_seconds": round(sum(result["throttled_seconds"] for result in results), 3),
+            "summaries_rebuilt": summaries
+        }
+
+    @staticmethod
+    def rescore_partition(
+        db: Session,
+        ml_service: MLService,
+        model_version: str,
+        partition: int,
+        batch_size: int,
+        max_rows_per_second: float = 0
+    ) -> Dict[str, Any]:
+        """Score one id range from its checkpoint onwards, one committed batch at a time"""
+        checkpoint = db.query(RescoreCheckpoint).filter(
+            RescoreCheckpoint.model_version == model_version,
+            RescoreCheckpoint.partition == partition
+        ).one()
+        stats = {"partition": partition, "rows": 0, "model_seconds": 0.0, "write_seconds": 0.0, "throttled_seconds": 0.0}
+        started = time.perf_counter()
+
+        while checkpoint.completed_at is None:
+            query = db.query(
+                Assessment.id, Assessment.user_id, Assessment.responses, Assessment.completed_at
+            ).filter(Assessment.status == "completed")
+            if checkpoint.last_assessment_id is not None:
+                query = query.filter(Assessment.id > checkpoint.last_assessment_id)
+            elif checkpoint.lower_id is not None:
+                query = query.filter(Assessment.id >= checkpoint.lower_id)
+            if checkpoint.upper_id is not None:
+                query = query.filter(Assessment.id < checkpoint.upper_id)
+            batch = query.order_by(Assessment.id).limit(batch_size).all()
+
+            if not batch:
+                checkpoint.completed_at = datetime.utcnow()
+                db.commit()
+                break
+
+            start = time.perf_counter()
+            histories = (
+                RescoringService._histories(db, batch, ml_service.history_length)
+                if ml_service.sequence_scorer is not None else None
+            )
+            predictions = ml_service.predict_risk_batch([row.responses or {} for row in batch], histories)
+            stats["model_seconds"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            RescoringService._write_batch(db, model_version, batch, predictions)
+            checkpoint.last_assessment_id = batch[-1].id
+            checkpoint.rows_processed = (checkpoint.rows_processed or 0) + len(batch)
+            # Scores and checkpoint commit together: a resumed run never skips or repeats a batch
+            db.commit()
+            stats["write_seconds"] += time.perf_counter() - start
+            stats["rows"] += len(batch)
+
+            if max_rows_per_second > 0:
+                ahead = stats["rows"] / max_rows_per_second - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+                    stats["throttled_seconds"] += ahead
+
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    @staticmethod
+    def _histories(db: Session, batch: List[Any], length: int) -> List[List[Dict[str, Any]]]:
+        """Each assessment's last length earlier completed responses by the same user, oldest first"""
+        rows = db.query(Assessment.id, Assessment.user_id, Assessment.responses).filter(
+            Assessment.user_id.in_({row.user_id for row in batch}),
+            Assessment.status == "completed"
+        ).order_by(Assessment.user_id, Assessment.completed_at, Assessment.id).all()
+
+        # One query for the whole batch; positions follow completion order as in the live path
+        responses, position = defaultdict(list), {}
+        for row in rows:
+            position[row.id] = len(responses[row.user_id])
+            responses[row.user_id].append(row.responses or {})
+        return [
+            responses[row.user_id][max(position[row.id] - length, 0):position[row.id]]
+            for row in batch
+        ]
+
+    @staticmethod
+    def _write_batch(db: Session, model_version: str, batch: List[Any], predictions: List[Dict[str, Any]]):
+        """Upsert this version's scores for a batch and supersede the other versions"""
+        ids = [row.id for row in batch]
+        existing = db.query(
+            RiskScore.id, RiskScore.assessment_id, RiskScore.model_version, RiskScore.calculated_at
+        ).filter(
+            RiskScore.assessment_id.in_(ids),
+            or_(RiskScore.superseded_at.is_(None), RiskScore.model_version == model_version)
+        ).all()
+        same_version = {row.assessment_id: row.id for row in existing if row.model_version == model_version}
+        # Re-scored rows keep the original timestamp so histories and trends stay in assessment order
+        calculated_at = {row.assessment_id: row.calculated_at for row in existing}
+
+        now = datetime.utcnow()
+        inserts, updates = [], []
+        for row, prediction in zip(batch, predictions):
+            values = {
+                "assessment_id": row.id,
+                "user_id": row.user_id,
+                "risk_level": prediction["risk_level"],
+                "risk_score": prediction["risk_score"],
+                "contributing_factors": prediction["contributing_factors"],
+                "factor_attributions": prediction.get("factor_attributions"),
+                "recommendations": prediction["recommendations"],
+                "ml_model_used": prediction["model_used"],
+                "confidence_score": prediction["confidence_score"],
+                "model_version": model_version,
+                "superseded_at": None,
+                "calculated_at": calculated_at.get(row.id) or row.completed_at or now
+            }
+            if row.id in same_version:
+                updates.append({"id": same_version[row.id], **values})
+            else:
+                inserts.append({"id": str(uuid.uuid4()), **values})
+
+        db.execute(update(RiskScore).where(
+            RiskScore.assessment_id.in_(ids),
+            RiskScore.superseded_at.is_(None),
+            RiskScore.model_version != model_version
+        ).values(superseded_at=now))
+        # Bulk statements rather than ORM objects, as for the analytics rollups
+        if inserts:
+            db.execute(insert(RiskScore), inserts)
+        if updates:
+            db.execute(update(RiskScore), updates)
+
+    def rebuild_summaries(self, db: Session) -> int:
+        """Recompute every stored user risk summary from the current scores"""
+        summary_service = RiskSummaryService()
+        user_ids = [row.user_id for row in db.query(UserRiskSummary.user_id).all()]
+        for user_id in user_ids:
+            summary_service.rebuild(db, user_id)
+        return len(user_ids)
@@ -0,0 +1,134 @@
+"""
+Per-user risk summary service
+Keeps user_risk_summary in step with risk_scores so reads are O(1)
+"""
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.models import RiskScore, UserRiskSummary
+
+RISK_LEVEL_ORDER = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+class RiskSummaryService:
+    """Service for maintaining the incremental per-user risk summary"""
+
+    def __init__(self, trend_alpha: float = None):
+        self.trend_alpha = settings.RISK_TREND_ALPHA if trend_alpha is None else trend_alpha
+
+    def record(self, db: Session, risk_score: RiskScore, replaces_existing: bool = False) -> UserRiskSummary:
+        """Fold a new risk score into the user's summary.
+
+        Must be called before the commit that persists ``risk_score`` so both
+        rows are written in the same transaction. A score that replaces the
+        assessment's earlier one (a resubmission) is not a new assessment, so
+        the summary is replayed instead of incremented.
+        """
+        # Populate defaults (id, calculated_at) on the new risk score
+        db.flush()
+
+        summary = self._locked(db, risk_score.user_id)
+        if summary is None:
+            try:
+                # A savepoint, so losing the race with a concurrent first submit only undoes this insert
+                with db.begin_nested():
+                    # First summary for this user: replay any earlier history plus the new score
+                    summary = UserRiskSummary(user_id=risk_score.user_id)
+                    db.add(summary)
+                    self._replay(db, summary)
+                return summary
+            except IntegrityError:
+                # The other submit's summary is committed now, without this score
+                summary = self._locked(db, risk_score.user_id)
+
+        if replaces_existing:
+            self._replay(db, summary)
+        else:
+            self._apply(summary, risk_score)
+        return summary
+
+    def _locked(self, db: Session, user_id: str) -> Optional[UserRiskSummary]:
+        return db.query(UserRiskSummary).filter(
+            UserRiskSummary.user_id == user_id
+        ).with_for_update().first()
+
+    def _apply(self, summary: UserRiskSummary, risk_score: RiskScore):
+        """Update summary counters with one risk score, in calculation order"""
+        previous_level = summary.latest_risk_level
+        new_level = risk_score.risk_level
+
+        if summary.assessment_count:
+            alpha = self.trend_alpha
+            summary.trend_score = alpha * risk_score.risk_score + (1 - alpha) * summary.trend_score
+        else:
+            summary.trend_score = risk_score.risk_score
+            summary.first_assessment_at = risk_score.calculated_at
+
+        if previous_level is not None and previous_level != new_level:
+            # Reassign so the JSON column change is detected
+            transitions = dict(summary.level_transitions or {})
+            key = f"{previous_level}->{new_level}"
+            transitions[key] = transitions.get(key, 0) + 1
+            summary.level_transitions = transitions
+
+            if RISK_LEVEL_ORDER.get(new_level, 0) > RISK_LEVEL_ORDER.get(previous_level, 0):
+                summary.escalation_count += 1
+            else:
+                summary.deescalation_count += 1
+
+        summary.assessment_count += 1
+        summary.latest_risk_score_id = risk_score.id
+        summary.latest_risk_level = new_level
+        summary.latest_risk_score = risk_score.risk_score
+        summary.last_assessment_at = risk_score.calculated_at
+
+    def _replay(self, db: Session, summary: UserRiskSummary) -> int:
+        """Recompute a summary from the user's full risk score history"""
+        risk_scores = db.query(RiskScore).filter(
+            RiskScore.user_id == summary.user_id,
+            RiskScore.superseded_at.is_(None)
+        ).order_by(RiskScore.calculated_at.asc()).all()
+
+        summary.latest_risk_level = None
+        summary.assessment_count = 0
+        summary.escalation_count = 0
+        summary.deescalation_count = 0
+        summary.level_transitions = {}
+
+        for risk_score in risk_scores:
+            self._apply(summary, risk_score)
+
+        return len(risk_scores)
+
+    def get_summary(self, db: Session, user_id: str) -> Optional[UserRiskSummary]:
+        """Get a user's summary without writing (safe on read replicas).
+
+        Users whose history predates the summary table get one computed in
+        memory; it is persisted on their next submit.
+        """
+        summary = db.query(UserRiskSummary).filter(
+            UserRiskSummary.user_id == user_id
+        ).first()
+
+        if summary is None:
+            summary = UserRiskSummary(user_id=user_id)
+            if not self._replay(db, summary):
+                return None
+
+        return summary
+
+    def rebuild(self, db: Session, user_id: str) -> Optional[UserRiskSummary]:
+        """Recompute and persist a user's summary from the full risk score history"""
+        summary = self._locked(db, user_id)
+
+        if summary is None:
+            summary = UserRiskSummary(user_id=user_id)
+            db.add(summary)
+
+        if not self._replay(db, summary):
+            db.rollback()
+            return None
+
+        db.commit()
+        db.refresh(summary)
+        return summary
@@ -0,0 +1,156 @@
+"""
+History-aware risk scoring with cached attention state
+Serves the causal attention model trained by sequence_training.py from
+plain numpy weights. Attention is causal and single-layer, so a past step's
+keys and values depend only on that step's answers: they are computed once,
+kept per user, and scoring a new assessment projects one step and attends
+over the cache instead of re-running the whole history. The model's step
+index input only shifts attention scores by an amount linear in position,
+so it is applied here as an offset relative to the newest step.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import numpy as np
+
+class SequenceScorer:
+    """Per-step forward pass of HistoryAttentionRiskDetector with a per-user key/value cache"""
+
+    def __init__(self, model: Dict[str, Any], cache_size: int = 10000, ttl_seconds: float = 300):
+        self.feature_names = model["feature_names"]
+        self.labels = model["labels"]
+        self.max_length = model["max_length"]
+        self.epsilon = model["epsilon"]
+        self.mean = model["mean"]
+        self.scale = model["scale"]
+        self.w = model["weights"]
+        self.key_dim = self.w["query_kernel"].shape[2]
+        # The key kernel's last row weights the step index; the rest weight the answers
+        n_features = len(self.feature_names)
+        self.key_kernel = self.w["key_kernel"][:n_features]
+        self.key_position = self.w["key_kernel"][n_features]
+        # user -> (keys, values, expires_at); the TTL bounds staleness when another worker scored the user
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[Any, Tuple[np.ndarray, np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _layer_norm(self, x: np.ndarray, name: str) -> np.ndarray:
+        mean = x.mean(axis=-1, keepdims=True)
+        variance = x.var(axis=-1, keepdims=True)
+        return (x - mean) / np.sqrt(variance + self.epsilon) * self.w[f"{name}_gamma"] + self.w[f"{name}_beta"]
+
+    def _dense(self, x: np.ndarray, name: str) -> np.ndarray:
+        return x @ self.w[f"{name}_kernel"] + self.w[f"{name}_bias"]
+
+    def _project(self, X: np.ndarray, name: str) -> np.ndarray:
+        """Per-head projection of scaled steps, shape (steps, heads, key_dim); keys exclude the position term"""
+        kernel = self.key_kernel if name == "key" else self.w[f"{name}_kernel"]
+        return np.einsum("tf,fhd->thd", X, kernel) + self.w[f"{name}_bias"]
+
+    def _scores(self, query: np.ndarray, keys: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Attention logits (heads, queries, keys); offsets[q, k] is key position minus query position"""
+        recency = np.einsum("qhd,hd->hq", query, self.key_position)
+        return np.einsum("qhd,khd->hqk", query, keys) + recency[:, :, None] * offsets
+
+    def _head(self, x: np.ndarray, attended: np.ndarray) -> np.ndarray:
+        """Everything after attention for the given steps: residuals, feed-forward and classifier"""
+        attention_output = np.einsum("thd,hdf->tf", attended, self.w["output_kernel"]) + self.w["output_bias"]
+        hidden = self._layer_norm(attention_output + x, "attention_norm")
+        ffn = self._dense(np.maximum(self._dense(hidden, "ffn_hidden"), 0), "ffn_output")
+        output = self._layer_norm(ffn + hidden, "ffn_norm")
+        logits = self._dense(np.maximum(self._dense(output, "head_hidden"), 0), "head_output")
+        logits -= logits.max(axis=-1, keepdims=True)
+        proba = np.exp(logits)
+        return proba / proba.sum(axis=-1, keepdims=True)
+
+    def scale_features(self, X: np.ndarray) -> np.ndarray:
+        return ((np.asarray(X, dtype=np.float32) - self.mean) / self.scale).astype(np.float32)
+
+    def predict_sequence(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities at every step of one raw history (n_steps, n_features), uncached"""
+        x = self.scale_features(X)
+        query = self._project(x, "query") / np.sqrt(self.key_dim)
+        keys, values = self._project(x, "key"), self._project(x, "value")
+        steps = np.arange(len(x))
+        scores = self._scores(query, keys, steps[None, :] - steps[:, None])
+        scores = np.where(np.tril(np.ones((len(x), len(x)), dtype=bool)), scores, -np.inf)
+        scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        scores /= scores.sum(axis=-1, keepdims=True)
+        return self._head(x, np.einsum("hqk,khd->qhd", scores, values))
+
+    def _step(self, x: np.ndarray, keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Probabilities for the newest step, whose key and value are already the last cache rows"""
+        query = self._project(x, "query") / np.sqrt(self.key_dim)
+        scores = self._scores(query, keys, np.arange(1 - len(keys), 1)[None, :])[:, 0]
+        scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        scores /= scores.sum(axis=-1, keepdims=True)
+        return self._head(x, np.einsum("hk,khd->hd", scores, values)[None])[0]
+
+    def score(
+        self,
+        user_id: Any,
+        features: np.ndarray,
+        load_history: Optional[Callable[[], np.ndarray]] = None
+    ) -> Tuple[np.ndarray, int]:
+        """Append one assessment's raw features to the user's history and score it.
+
+        load_history returns the user's earlier assessments (oldest first, raw
+        features) and is only called on a cache miss. Returns the class
+        probabilities and the number of steps attended to.
+        """
+        proba, keys, values = self.score_step(user_id, features, load_history)
+        self.remember(user_id, keys, values)
+        return proba, len(keys)
+
+    def score_step(
+        self,
+        user_id: Any,
+        features: np.ndarray,
+        load_history: Optional[Callable[[], np.ndarray]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Score one assessment after the user's history without changing the cache.
+
+        Returns the class probabilities and the history's keys and values
+        including the new step; pass them to remember() once the assessment
+        is stored, so a failed write never leaves a step behind.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[2] > now:
+                self._cache.move_to_end(user_id)
+            else:
+                cached = None
+
+        if cached is None:
+            history = load_history() if load_history is not None else None
+            if history is not None and len(history):
+                past = self.scale_features(np.asarray(history)[-(self.max_length - 1):])
+                keys, values = self._project(past, "key"), self._project(past, "value")
+            else:
+                keys = values = np.zeros((0,) + self.w["key_bias"].shape, dtype=np.float32)
+        else:
+            keys, values = cached[0], cached[1]
+
+        x = self.scale_features(np.reshape(features, (1, -1)))
+        # Only the newest max_length steps are attended to
+        keys = np.concatenate([keys, self._project(x, "key")])[-self.max_length:]
+        values = np.concatenate([values, self._project(x, "value")])[-self.max_length:]
+        return self._step(x, keys, values), keys, values
+
+    def remember(self, user_id: Any, keys: np.ndarray, values: np.ndarray):
+        """Cache a user's history as returned by score_step"""
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[user_id] = (keys, values, time.monotonic() + self.ttl_seconds)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def forget(self, user_id: Any):
+        """Drop a user's cached history, e.g. after their assessments change"""
+        with self._lock:
+            self._cache.pop(user_id, None)
@@ -0,0 +1,217 @@
+"""
+Shadow evaluation of a candidate model on live traffic
+MLService mirrors every scored questionnaire onto a bounded queue; a
+background thread scores the queue in batches with the candidate and counts
+agreement with what production served. Mirroring never blocks: when the
+queue is full the item is dropped and counted. Only counters are kept (a
+confusion matrix and log-bucket latency histograms); the candidate's
+predictions are never returned to users or written to the database.
+Predictions production served from a user's history are not mirrored: the
+candidate would score the answers alone, a different problem, so they are
+only counted. State is per worker process.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Latency bucket upper edges in milliseconds, 10 per decade from 10 us to 10 s
+LATENCY_EDGES_MS = np.geomspace(0.01, 10_000, 61)
+
+class LatencyHistogram:
+    """Fixed log-spaced latency buckets; percentiles are bucket upper edges"""
+
+    def __init__(self, edges: np.ndarray = LATENCY_EDGES_MS):
+        self.edges = edges
+        # The last bucket collects everything above the largest edge
+        self.counts = np.zeros(len(edges) + 1, dtype=np.int64)
+        self.total_ms = 0.0
+
+    def record(self, ms: float, n: int = 1):
+        self.counts[np.searchsorted(self.edges, ms)] += n
+        self.total_ms += ms * n
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        n = int(self.counts.sum())
+        if not n:
+            return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+        cumulative = np.cumsum(self.counts)
+        upper = np.append(self.edges, np.inf)
+        quantile = lambda q: float(upper[np.searchsorted(cumulative, q * n)])
+        return {
+            "count": n,
+            "mean_ms": round(self.total_ms / n, 4),
+            "p50_ms": round(quantile(0.5), 4),
+            "p95_ms": round(quantile(0.95), 4),
+            "p99_ms": round(quantile(0.99), 4)
+        }
+
+class ShadowEvaluator:
+    """Bounded mirror queue, batch-scoring thread and agreement counters for one candidate model"""
+
+    def __init__(self, queue_size: int = 1000, batch_size: int = 64, batch_wait_ms: float = 50):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid = None
+        self.candidate = None
+        self.candidate_name = None
+        self._reset([])
+
+    def _reset(self, labels: List[str]):
+        self.labels = list(labels)
+        self._label_index = {label: i for i, label in enumerate(self.labels)}
+        self.started_at = datetime.utcnow()
+        self.mirrored = 0
+        self.dropped = 0
+        self.skipped_history = 0
+        self.scored = 0
+        self.agreed = 0
+        self.errors = 0
+        # Rows are what production served, columns what the candidate predicted
+        self.confusion = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+        self.primary_latency = LatencyHistogram()
+        self.shadow_latency = LatencyHistogram()
+        self.batch_latency = LatencyHistogram()
+        self.queue_delay = LatencyHistogram()
+
+    def set_candidate(self, candidate: Any, name: str, primary_labels: List[str]):
+        """Evaluate candidate (anything with predict_batch and labels) from now on; counters start afresh"""
+        labels = list(primary_labels or [])
+        labels += [label for label in candidate.labels or [] if label not in labels]
+        with self._lock:
+            self.candidate = candidate
+            self.candidate_name = name
+            self._reset(labels)
+
+    def reset(self):
+        """Drop counters but keep the candidate"""
+        with self._lock:
+            self._reset(self.labels)
+
+    def submit(self, responses: Dict[str, Any], risk_level: str, primary_ms: float, from_history: bool = False):
+        """Mirror one production prediction; never blocks, drops the item if the queue is full"""
+        if self.candidate is None:
+            return
+        if from_history:
+            # Served by the sequence model from the user's history; the candidate only sees the answers
+            with self._lock:
+                self.skipped_history += 1
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((responses, risk_level, primary_ms, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.mirrored += 1
+
+    def _ensure_worker(self):
+        # Started on first use so each forked server worker runs its own thread
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._worker_pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name="shadow-evaluator", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self) -> List[tuple]:
+        """Block for one item, then collect up to batch_size for at most batch_wait_ms"""
+        batch = [self._queue.get()]
+        # A model call costs nearly the same for one row as for dozens, so waiting briefly saves CPU
+        deadline = time.perf_counter() + self.batch_wait_ms / 1000
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.perf_counter(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            candidate = self.candidate
+            start = time.perf_counter()
+            try:
+                predictions = candidate.predict_batch([item[0] for item in batch])
+            except Exception as e:
+                logger.error(f"Error scoring shadow batch: {e}")
+                with self._lock:
+                    self.errors += len(batch)
+                continue
+            batch_ms = (time.perf_counter() - start) * 1000
+            self._record(batch, predictions, start, batch_ms)
+
+    def _record(self, batch: List[tuple], predictions: List[Dict[str, Any]], start: float, batch_ms: float):
+        with self._lock:
+            self.batch_latency.record(batch_ms)
+            self.shadow_latency.record(batch_ms / len(batch), len(batch))
+            for (_, risk_level, primary_ms, queued_at), prediction in zip(batch, predictions):
+                self.scored += 1
+                self.agreed += prediction["risk_level"] == risk_level
+                self.primary_latency.record(primary_ms)
+                self.queue_delay.record((start - queued_at) * 1000)
+                served = self._label_index.get(risk_level)
+                predicted = self._label_index.get(prediction["risk_level"])
+                if served is not None and predicted is not None:
+                    self.confusion[served, predicted] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Agreement, confusion matrix and latency of the candidate against production"""
+        with self._lock:
+            if self.candidate is None:
+                return {"candidate": None, "worker_pid": os.getpid()}
+            confusion = self.confusion.copy()
+            report = {
+                "candidate": self.candidate_name,
+                "since": self.started_at.isoformat(),
+                "worker_pid": os.getpid(),
+                "mirrored": self.mirrored,
+                "dropped": self.dropped,
+                "skipped_history": self.skipped_history,
+                "errors": self.errors,
+                "queued": self._queue.qsize(),
+                "scored": self.scored,
+                "agreement": round(self.agreed / self.scored, 4) if self.scored else None,
+                "latency": {
+                    "primary": self.primary_latency.summary(),
+                    "shadow_per_item": self.shadow_latency.summary(),
+                    "shadow_batch": self.batch_latency.summary(),
+                    "queue_delay": self.queue_delay.summary()
+                }
+            }
+
+        served, predicted = confusion.sum(axis=1), confusion.sum(axis=0)
+        report["labels"] = self.labels
+        report["confusion"] = {
+            label: dict(zip(self.labels, confusion[i].tolist())) for i, label in enumerate(self.labels)
+        }
+        report["per_level"] = {
+            label: {
+                "served": int(served[i]),
+                "predicted": int(predicted[i]),
+                # Share of this served level the candidate also predicts
+                "recall_vs_primary": round(confusion[i, i] / served[i], 4) if served[i] else None
+            }
+            for i, label in enumerate(self.labels)
+        }
+        return report
+
+shadow_evaluator = ShadowEvaluator(
+    queue_size=settings.SHADOW_QUEUE_SIZE,
+    batch_size=settings.SHADOW_BATCH_SIZE,
+    batch_wait_ms=settings.SHADOW_BATCH_WAIT_MS
+)
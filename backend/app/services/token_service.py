@@ -0,0 +1,207 @@
+"""
+Refresh tokens and access-token revocation
+Refresh tokens are opaque, stored hashed and rotated on every use. Revoked
+access tokens are kept in an in-memory set that each worker refreshes
+incrementally, so checking a token adds no query to the request path.
+"""
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.models import RefreshToken, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+class RevocationList:
+    """Revoked access-token ids held in memory, synced from revoked_tokens"""
+
+    def __init__(self, overlap_seconds: int = 5):
+        # Re-read a little before the last seen row so slow commits are not missed
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._revoked: Dict[str, datetime] = {}  # jti -> token expiry
+        self._last_revoked_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """O(1) membership check, safe to call on every request"""
+        return jti is not None and jti in self._revoked
+
+    def add(self, jti: str, expires_at: datetime):
+        """Record a revocation made by this process without waiting for the next sync"""
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def refresh(self, db: Session) -> int:
+        """Pull revocations recorded since the last sync; returns rows read"""
+        now = datetime.utcnow()
+        query = db.query(
+            RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at
+        ).filter(RevokedToken.expires_at > now)
+
+        if self._last_revoked_at is not None:
+            query = query.filter(RevokedToken.revoked_at >= self._last_revoked_at - self.overlap)
+
+        rows = query.all()
+        with self._lock:
+            for jti, expires_at, revoked_at in rows:
+                self._revoked[jti] = expires_at
+                if self._last_revoked_at is None or revoked_at > self._last_revoked_at:
+                    self._last_revoked_at = revoked_at
+            if self._last_revoked_at is None:
+                self._last_revoked_at = now - self.overlap
+
+            # Expired tokens are rejected anyway; stop tracking them
+            expired = [jti for jti, expires_at in self._revoked.items() if expires_at <= now]
+            for jti in expired:
+                del self._revoked[jti]
+
+        return len(rows)
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    async def run_periodically(self, session_factory, interval_seconds: int, token_service: "TokenService"):
+        """Background loop that keeps the revocation list in sync"""
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(self.refresh_with_session, session_factory)
+                if time.monotonic() - last_purge > 3600:
+                    await asyncio.to_thread(token_service.purge_expired_with_session, session_factory)
+                    last_purge = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing token revocation list: {e}")
+
+    def refresh_with_session(self, session_factory) -> int:
+        db = session_factory()
+        try:
+            return self.refresh(db)
+        finally:
+            db.close()
+
+revocation_list = RevocationList()
+
+class TokenService:
+    """Service for issuing, rotating and revoking tokens"""
+
+    @staticmethod
+    def hash_token(token: str) -> str:
+        # Refresh tokens are 256-bit random values, so a fast hash is sufficient
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def issue_refresh_token(self, db: Session, user_id: str) -> str:
+        """Create a refresh token starting a new rotation family; returns the raw token"""
+        raw_token = secrets.token_urlsafe(32)
+        refresh_token = RefreshToken(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            token_hash=self.hash_token(raw_token),
+            family_id=str(uuid.uuid4()),
+            expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        )
+        db.add(refresh_token)
+        db.commit()
+        return raw_token
+
+    def rotate_refresh_token(self, db: Session, raw_token: str) -> Tuple[str, str]:
+        """Exchange a refresh token for a new one; returns (user_id, new raw token).
+
+        Presenting an already-rotated token means it leaked, so the whole
+        rotation family is revoked.
+        """
+        invalid_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+        current = db.query(RefreshToken).filter(
+            RefreshToken.token_hash == self.hash_token(raw_token)
+        ).with_for_update().first()
+
+        if current is None or current.expires_at <= datetime.utcnow():
+            raise invalid_exception
+
+        if current.revoked_at is not None:
+            logger.warning(f"Refresh token reuse detected for user {current.user_id}")
+            self.revoke_family(db, current.family_id)
+            raise invalid_exception
+
+        new_raw_token = secrets.token_urlsafe(32)
+        replacement = RefreshToken(
+            id=str(uuid.uuid4()),
+            user_id=current.user_id,
+            token_hash=self.hash_token(new_raw_token),
+            family_id=current.family_id,
+            expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        )
+        current.revoked_at = datetime.utcnow()
+        current.replaced_by_id = replacement.id
+        db.add(replacement)
+        db.commit()
+
+        return current.user_id, new_raw_token
+
+    def revoke_refresh_token(self, db: Session, raw_token: str, user_id: Optional[str]) -> bool:
+        """Revoke the rotation family a refresh token belongs to, if user_id owns it.
+
+        Returns False when the token belongs to another user; an unknown token
+        (e.g. already purged) has nothing left to revoke and returns True.
+        """
+        refresh_token = db.query(RefreshToken).filter(
+            RefreshToken.token_hash == self.hash_token(raw_token)
+        ).first()
+        if refresh_token is None:
+            return True
+        if user_id is None or refresh_token.user_id != user_id:
+            logger.warning(f"User {user_id} tried to revoke a refresh token of user {refresh_token.user_id}")
+            return False
+        self.revoke_family(db, refresh_token.family_id)
+        return True
+
+    def revoke_family(self, db: Session, family_id: str):
+        """Revoke every live refresh token in a rotation family"""
+        db.query(RefreshToken).filter(
+            RefreshToken.family_id == family_id,
+            RefreshToken.revoked_at.is_(None)
+        ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+
+    def revoke_access_token(self, db: Session, jti: str, user_id: Optional[str], expires_at: datetime):
+        """Revoke an access token until it expires"""
+        if db.get(RevokedToken, jti) is None:
+            db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+            db.commit()
+        revocation_list.add(jti, expires_at)
+
+    def purge_expired(self, db: Session) -> int:
+        """Delete refresh tokens and revocations that have expired"""
+        now = datetime.utcnow()
+        deleted = db.query(RevokedToken).filter(
+            RevokedToken.expires_at <= now
+        ).delete(synchronize_session=False)
+        deleted += db.query(RefreshToken).filter(
+            RefreshToken.expires_at <= now
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    def purge_expired_with_session(self, session_factory) -> int:
+        db = session_factory()
+        try:
+            return self.purge_expired(db)
+        finally:
+            db.close()
+
+token_service = TokenService()
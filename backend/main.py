@@ -3,9 +3,12 @@ Mental Health Risk Detection System - Main Backend Application
 """
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from app.database import engine, Base, SessionLocal
 from app.routes import auth, assessment, results, admin
+from app.services.analytics_service import analytics_service
+from app.services.token_service import revocation_list, token_service
 from app.config import settings
+import asyncio
 import logging
 
 # Configure logging
@@ -37,6 +40,34 @@ app.include_router(assessment.router, prefix="/api/v1/assessment", tags=["Assess
 app.include_router(results.router, prefix="/api/v1/results", tags=["Results"])
 app.include_router(admin.router, prefix="/api/v1/admin", tags=["Admin"])
 
+background_tasks = []
+
+@app.on_event("startup")
+async def start_background_jobs():
+    """Start periodic background jobs"""
+    if settings.ANALYTICS_ROLLUP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            analytics_service.run_periodically(SessionLocal, settings.ANALYTICS_ROLLUP_INTERVAL_SECONDS)
+        ))
+    
+    # Load revoked access tokens before serving requests
+    try:
+        await asyncio.to_thread(revocation_list.refresh_with_session, SessionLocal)
+    except Exception as e:
+        logger.error(f"Error loading token revocation list: {e}")
+    
+    if settings.TOKEN_REVOCATION_REFRESH_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            revocation_list.run_periodically(SessionLocal, settings.TOKEN_REVOCATION_REFRESH_SECONDS, token_service)
+        ))
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    """Cancel periodic background jobs"""
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
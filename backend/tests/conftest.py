@@ -0,0 +1,36 @@
+"""
+Shared test fixtures
+The app is pointed at a throwaway SQLite database before any app module is
+imported, so the tests never touch a configured PostgreSQL server.
+"""
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="mental-health-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'primary.db')}"
+os.environ["DATABASE_READ_URLS"] = "[]"
+# Cheapest bcrypt cost so tests that hash passwords stay fast
+os.environ["PASSWORD_HASH_ROUNDS"] = "4"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.database import Base, SessionLocal, engine
+from app.services.principal_cache import principals, verified_tokens
+
+@pytest.fixture
+def db_dir() -> str:
+    return _db_dir
+
+@pytest.fixture
+def db():
+    """Session on a freshly created primary schema"""
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+        principals.clear()
+        verified_tokens.clear()
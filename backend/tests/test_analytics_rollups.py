@@ -0,0 +1,79 @@
+"""
+Replaced risk scores are taken back out of the rollups
+"""
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app.models.models import Assessment, Questionnaire, RiskScore, User
+from app.services.analytics_service import AnalyticsService
+from app.services.auth_service import AuthService
+
+ITEMS = ["sleep_quality", "anxiety_level", "social_isolation", "stress_level", "physical_health", "substance_use"]
+
+@pytest.fixture
+def client():
+    from main import app
+    # Not used as a context manager, so the startup tasks (warm-ups, pollers) do not run
+    return TestClient(app)
+
+@pytest.fixture
+def assessment(db) -> Assessment:
+    user = User(email="rollups@example.com", username="rollups", hashed_password="x", is_active=True)
+    questionnaire = Questionnaire(name="PHQ-9", description="", version="1", questions=[])
+    db.add_all([user, questionnaire])
+    db.flush()
+    assessment = Assessment(user_id=user.id, questionnaire_id=questionnaire.id, responses={}, status="in_progress")
+    db.add(assessment)
+    db.commit()
+    return assessment
+
+def _submit(client: TestClient, assessment: Assessment, answer: int) -> dict:
+    token = AuthService().create_access_token({"sub": assessment.user_id})
+    response = client.post(
+        "/api/v1/assessment/submit",
+        params={"token": token},
+        json={"questionnaire_id": assessment.id, "responses": {item: answer for item in ITEMS}}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _day_levels(service: AnalyticsService, db) -> dict:
+    return {row["risk_level"]: row["count"] for row in service.risk_distribution(db, granularity="day")}
+
+def test_resubmission_replaces_its_rolled_up_score(client, assessment, db):
+    service = AnalyticsService(lag_seconds=0)
+    first = _submit(client, assessment, 0)
+    assert service.run_incremental(db) == 1
+    assert _day_levels(service, db) == {first["risk_level"]: 1}
+
+    latest = _submit(client, assessment, 9)
+    assert latest["risk_level"] != first["risk_level"]
+    assert service.run_incremental(db) == 1
+    assert _day_levels(service, db) == {latest["risk_level"]: 1}
+    assert service.score_histogram(db, granularity="day")["all"] == [
+        int(i == min(int(latest["risk_score"] // 10), 9)) for i in range(10)
+    ]
+
+def test_score_superseded_by_another_version_is_replaced(assessment, db):
+    service = AnalyticsService(lag_seconds=0)
+    calculated = datetime.utcnow() - timedelta(minutes=10)
+    old = RiskScore(
+        assessment_id=assessment.id, user_id=assessment.user_id, risk_level="low", risk_score=5.0,
+        model_version="v1", calculated_at=calculated
+    )
+    db.add(old)
+    db.commit()
+    service.run_incremental(db)
+
+    old.superseded_at = datetime.utcnow()
+    db.flush()
+    db.add(RiskScore(
+        assessment_id=assessment.id, user_id=assessment.user_id, risk_level="critical", risk_score=95.0,
+        model_version="v2", calculated_at=calculated + timedelta(minutes=5)
+    ))
+    db.commit()
+    service.run_incremental(db)
+
+    assert _day_levels(service, db) == {"critical": 1}
+    distribution = service.risk_distribution(db, granularity="hour")
+    assert [(row["risk_level"], row["count"], row["mean_risk_score"]) for row in distribution] == [("critical", 1, 95.0)]
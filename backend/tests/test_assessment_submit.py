@@ -0,0 +1,89 @@
+"""
+Resubmitting an assessment replaces its current risk score
+"""
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app.models.models import UNVERSIONED, Assessment, Questionnaire, RiskScore, User
+from app.services.auth_service import AuthService
+
+SUBMIT_URL = "/api/v1/assessment/submit"
+
+@pytest.fixture
+def client():
+    from main import app
+    # Not used as a context manager, so the startup tasks (warm-ups, pollers) do not run
+    return TestClient(app)
+
+@pytest.fixture
+def user(db) -> User:
+    user = User(email="submit@example.com", username="submit", hashed_password="x", is_active=True)
+    questionnaire = Questionnaire(name="PHQ-9", description="", version="1", questions=[])
+    db.add_all([user, questionnaire])
+    db.flush()
+    # Two assessments: one to resubmit, one submitted once
+    for _ in range(2):
+        db.add(Assessment(user_id=user.id, questionnaire_id=questionnaire.id, responses={}, status="in_progress"))
+    db.commit()
+    return user
+
+@pytest.fixture
+def token(user) -> str:
+    return AuthService().create_access_token({"sub": user.id})
+
+def _submit(client: TestClient, token: str, assessment_id: str, answer: int) -> dict:
+    response = client.post(
+        SUBMIT_URL,
+        params={"token": token},
+        json={"questionnaire_id": assessment_id, "responses": {f"q{i}": answer for i in range(9)}}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _current(db, assessment_id: str):
+    db.expire_all()
+    return db.query(RiskScore).filter(
+        RiskScore.assessment_id == assessment_id,
+        RiskScore.superseded_at.is_(None)
+    ).all()
+
+def test_resubmission_keeps_one_current_score(client, token, user, db):
+    first, second = [assessment.id for assessment in db.query(Assessment).order_by(Assessment.id)]
+    _submit(client, token, first, 0)
+    _submit(client, token, second, 1)
+    latest = _submit(client, token, first, 3)
+
+    current = _current(db, first)
+    assert len(current) == 1
+    assert current[0].model_version == UNVERSIONED
+    assert current[0].risk_score == latest["risk_score"]
+
+    response = client.get(f"/api/v1/results/assessment/{first}", params={"token": token})
+    assert response.status_code == 200, response.text
+    assert response.json()["risk_score"] == latest["risk_score"]
+
+    summary = client.get("/api/v1/results/user/summary", params={"token": token}).json()
+    assert summary["assessment_count"] == 2
+    assert summary["latest_risk_score"] == latest["risk_score"]
+
+def test_submission_supersedes_score_from_another_version(client, token, user, db):
+    assessment = db.query(Assessment).first()
+    assessment.status = "completed"
+    assessment.completed_at = datetime.utcnow() - timedelta(days=1)
+    rescored = RiskScore(
+        assessment_id=assessment.id,
+        user_id=user.id,
+        risk_level="low",
+        risk_score=5.0,
+        model_version="2026-01-10T08:00:00",
+        calculated_at=assessment.completed_at
+    )
+    db.add(rescored)
+    db.commit()
+
+    latest = _submit(client, token, assessment.id, 3)
+
+    current = _current(db, assessment.id)
+    assert [row.model_version for row in current] == [UNVERSIONED]
+    assert current[0].risk_score == latest["risk_score"]
+    assert db.get(RiskScore, rescored.id).superseded_at is not None
@@ -0,0 +1,96 @@
+"""
+Authentication: cached principals and the auth routes
+"""
+import dataclasses
+import pytest
+from fastapi.testclient import TestClient
+from app.models.models import User
+from app.services.auth_service import AuthService
+from app.services.principal_cache import Principal, principals
+from app.services.token_service import token_service
+
+@pytest.fixture
+def client():
+    from main import app
+    return TestClient(app)
+
+@pytest.fixture
+def user(db) -> User:
+    user = User(
+        email="auth@example.com",
+        username="auth",
+        hashed_password="x",
+        full_name="Auth Test",
+        age=30,
+        gender="other",
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+def _token(user: User) -> str:
+    return AuthService().create_access_token({"sub": user.id})
+
+def test_cached_principal_is_an_immutable_snapshot(client, user):
+    response = client.get("/api/v1/auth/me", params={"token": _token(user)})
+    assert response.status_code == 200, response.text
+    assert response.json()["email"] == "auth@example.com"
+
+    cached = principals.get(user.id)
+    assert cached == Principal(id=user.id, is_active=True)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        cached.is_active = False
+
+def test_deactivated_user_is_rejected_after_invalidation(client, db, user):
+    token = _token(user)
+    assert client.get("/api/v1/auth/me", params={"token": token}).status_code == 200
+
+    user.is_active = False
+    db.commit()
+
+    assert principals.get(user.id) is None
+    assert client.get("/api/v1/auth/me", params={"token": token}).status_code == 401
+
+def _login_session(db, user: User) -> str:
+    return token_service.issue_refresh_token(db, user.id)
+
+def test_refresh_token_is_read_from_the_body(client, db, user):
+    refresh_token = _login_session(db, user)
+
+    response = client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200, response.text
+    assert response.json()["refresh_token"] != refresh_token
+
+    # Rotated: the old token is spent
+    assert client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+def test_logout_cannot_revoke_another_users_session(client, db, user):
+    other = User(email="other@example.com", username="other", hashed_password="x", is_active=True)
+    db.add(other)
+    db.commit()
+    victim_refresh_token = _login_session(db, other)
+
+    response = client.post(
+        "/api/v1/auth/logout",
+        params={"token": _token(user)},
+        json={"refresh_token": victim_refresh_token}
+    )
+    assert response.status_code == 401
+
+    response = client.post("/api/v1/auth/refresh", json={"refresh_token": victim_refresh_token})
+    assert response.status_code == 200, response.text
+
+def test_logout_revokes_own_session_and_access_token(client, db, user):
+    token = _token(user)
+    refresh_token = _login_session(db, user)
+
+    response = client.post("/api/v1/auth/logout", params={"token": token}, json={"refresh_token": refresh_token})
+    assert response.status_code == 204
+
+    assert client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+    assert client.get("/api/v1/auth/me", params={"token": token}).status_code == 401
+
+def test_logout_without_refresh_token(client, user):
+    response = client.post("/api/v1/auth/logout", params={"token": _token(user)})
+    assert response.status_code == 204
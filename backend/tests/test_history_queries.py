@@ -0,0 +1,78 @@
+"""
+The history endpoint loads a page in a fixed number of SQL statements
+"""
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app.database import count_queries
+from app.models.models import Assessment, Questionnaire, RiskScore, User
+from app.services.auth_service import AuthService
+
+HISTORY_URL = "/api/v1/results/user/history"
+
+@pytest.fixture
+def client():
+    from main import app
+    # Not used as a context manager, so the startup tasks (warm-ups, pollers) do not run
+    return TestClient(app)
+
+@pytest.fixture
+def token(db) -> str:
+    user = User(email="history@example.com", username="history", hashed_password="x", is_active=True)
+    questionnaire = Questionnaire(name="PHQ-9", description="", version="1", questions=[])
+    db.add_all([user, questionnaire])
+    db.flush()
+
+    started = datetime.utcnow() - timedelta(days=30)
+    for day in range(25):
+        assessment = Assessment(
+            user_id=user.id,
+            questionnaire_id=questionnaire.id,
+            responses={"mood": day % 5},
+            status="completed",
+            started_at=started + timedelta(days=day),
+            completed_at=started + timedelta(days=day, minutes=5)
+        )
+        db.add(assessment)
+        db.flush()
+        db.add(RiskScore(
+            assessment_id=assessment.id,
+            user_id=user.id,
+            risk_level="low",
+            risk_score=10.0 + day,
+            contributing_factors=[],
+            recommendations=[],
+            ml_model_used="rule_based",
+            confidence_score=0.5,
+            model_version="unversioned",
+            calculated_at=assessment.completed_at
+        ))
+    db.commit()
+    return AuthService().create_access_token({"sub": user.id})
+
+def _history(client: TestClient, token: str, limit: int):
+    with count_queries() as counter:
+        response = client.get(HISTORY_URL, params={"token": token, "limit": limit})
+    assert response.status_code == 200, response.text
+    return response.json(), counter
+
+def test_history_statement_count_does_not_grow_with_limit(client, token):
+    # Warm the principal cache so only the page's own statements are counted
+    _history(client, token, 1)
+
+    counts = {}
+    for limit in (1, 5, 25):
+        body, counter = _history(client, token, limit)
+        assert body["count"] == limit
+        counts[limit] = counter.count
+
+    assert counts == {1: 2, 5: 2, 25: 2}
+
+def test_history_rows_carry_risk_score_and_questionnaire_name(client, token):
+    body, _ = _history(client, token, 3)
+
+    completed = [row["completed_at"] for row in body["assessments"]]
+    assert completed == sorted(completed, reverse=True)
+    for row in body["assessments"]:
+        assert row["questionnaire_name"] == "PHQ-9"
+        assert row["risk_score"]["risk_level"] == "low"
@@ -0,0 +1,82 @@
+"""
+Incremental retraining serves the updated forest
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+import joblib
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import engine
+from app.models.models import Assessment, Questionnaire, RiskScore, User
+from app.services.ml_service import MLService
+
+@pytest.fixture
+def trainer(tmp_path, monkeypatch):
+    from train_model import RiskDetectionTrainer
+    # The trainer creates its default model directory relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    trainer = RiskDetectionTrainer(rf_params={"n_estimators": 10})
+    trainer.model_path = str(tmp_path / "models")
+    os.makedirs(trainer.model_path)
+    trainer.train()
+    return trainer
+
+def _derive_compact_forest(model_path: str):
+    """Stand-in for forest_compression.save_compact: a compact forest plus its calibration map"""
+    from train_model import update_calibration, write_model_bundle
+    rf = joblib.load(os.path.join(model_path, "risk_predictor_rf.pkl"))
+    joblib.dump(rf, os.path.join(model_path, "risk_predictor_rf_compact.pkl"))
+    update_calibration(model_path, "rf_compact", joblib.load(os.path.join(model_path, "calibration.pkl"))["rf"])
+    manifest_path = os.path.join(model_path, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["artifacts"]["rf_compact"] = "risk_predictor_rf_compact.pkl"
+    manifest["rf_compression"] = {"level": "medium"}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    write_model_bundle(model_path)
+
+def _add_assessments(db, trainer, n: int = 300):
+    from train_model import RISK_LEVELS
+    X, y = trainer.generate_synthetic_data(n_samples=n, seed=3)
+    user = User(email="incremental@example.com", username="incremental", hashed_password="x", is_active=True)
+    questionnaire = Questionnaire(name="PHQ-9", description="", version="1", questions=[])
+    db.add_all([user, questionnaire])
+    db.flush()
+    completed = datetime.utcnow() - timedelta(hours=1)
+    for i, (row, level) in enumerate(zip(X, y)):
+        assessment = Assessment(
+            user_id=user.id,
+            questionnaire_id=questionnaire.id,
+            responses=dict(zip(trainer.feature_names, row.tolist())),
+            status="completed",
+            completed_at=completed + timedelta(seconds=i)
+        )
+        db.add(assessment)
+        db.flush()
+        db.add(RiskScore(assessment_id=assessment.id, user_id=user.id, risk_level=RISK_LEVELS[level], risk_score=0.0))
+    db.commit()
+
+def test_incremental_run_serves_the_grown_forest(trainer, db):
+    _derive_compact_forest(trainer.model_path)
+    before = MLService(trainer.model_path, candidate=True)
+    assert before.served_model == "rf_compact"
+
+    _add_assessments(db, trainer)
+    result = trainer.retrain_incremental(
+        engine=engine, add_trees=5, lag_seconds=0, min_rows=100, since=datetime.utcnow() - timedelta(days=1)
+    )
+    assert result["rf_trees"] == 15
+    assert result["dropped_artifacts"] == ["rf_compact"]
+
+    after = MLService(trainer.model_path, candidate=True)
+    assert after.served_model == "rf"
+    assert len(after.rf_model.estimators_) == 15
+    assert after.model_version == result["window_end"] != before.model_version
+    assert set(after.calibration) == {"rf"}
+    np.testing.assert_allclose(after.calibration["rf"]["tables"], trainer.calibration["tables"])
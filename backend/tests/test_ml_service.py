@@ -0,0 +1,121 @@
+"""
+MLService prediction assembly
+"""
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from app.services import ml_service
+from app.services.ml_service import MLService
+from app.services.shadow_evaluator import ShadowEvaluator
+from app.services.tree_explainer import TreeExplainer
+
+FEATURES = ["sleep_quality", "anxiety_level", "stress_level"]
+LABELS = ["low", "medium", "high", "critical"]
+
+class RecordingExplainer(TreeExplainer):
+    """Stands in for TreeExplainer and records what it was asked to explain.
+
+    Each item's attributions grow with its scaled answer and point toward
+    the higher levels, so below-average answers point toward "low".
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def explain(self, x, cache_key=None):
+        self.calls += 1
+        return np.outer(x, [-0.3, -0.1, 0.1, 0.3])
+
+@pytest.fixture
+def service(tmp_path) -> MLService:
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 11, size=(400, len(FEATURES))).astype(np.float32)
+    y = np.minimum(X.mean(axis=1) // 2.5, 3).astype(int)
+
+    service = MLService(str(tmp_path))
+    service.scaler = StandardScaler().fit(X)
+    service.rf_model = RandomForestClassifier(n_estimators=10, random_state=0).fit(service.scaler.transform(X), y)
+    service.feature_names = FEATURES
+    service.labels = LABELS
+    service.served_model = "rf_compact"
+    service.explainer = RecordingExplainer()
+    return service
+
+def _history_prediction(user_id, responses, load_history=None):
+    return {
+        "risk_level": "high",
+        "confidence_score": 0.7,
+        "probabilities": {"low": 0.05, "medium": 0.15, "high": 0.7, "critical": 0.1},
+        "model_used": "Attention (history of 2)",
+        "served_model": "sequence"
+    }
+
+def test_forest_predictions_are_explained(service):
+    result = service.predict_risk({"sleep_quality": 9, "anxiety_level": 8, "stress_level": 7})
+
+    assert service.explainer.calls == 1
+    assert result["contributing_factors"] == ["sleep_quality", "anxiety_level", "stress_level"]
+    assert len(result["factor_attributions"]) == 3
+
+def test_low_answers_are_not_contributing_factors(service):
+    result = service.predict_risk({"sleep_quality": 0, "anxiety_level": 0, "stress_level": 0})
+
+    assert result["risk_level"] == "low"
+    # They pushed toward the predicted "low", but lowered risk
+    assert all(factor["attribution"] > 0 for factor in result["factor_attributions"])
+    assert result["contributing_factors"] == []
+
+def test_sequence_predictions_are_not_explained_by_the_forest(service, monkeypatch):
+    service.sequence_scorer = object()
+    monkeypatch.setattr(service, "predict_with_history", _history_prediction)
+
+    result = service.predict_risk({"sleep_quality": 9, "anxiety_level": 8, "stress_level": 2}, user_id="u1")
+
+    assert service.explainer.calls == 0
+    assert result["factor_attributions"] == []
+    # Falls back to the answers-above-6 rule
+    assert result["contributing_factors"] == ["sleep_quality", "anxiety_level"]
+
+def test_risk_score_is_the_expected_level_of_the_served_probabilities(service, monkeypatch):
+    service.sequence_scorer = object()
+    monkeypatch.setattr(service, "predict_with_history", _history_prediction)
+
+    result = service.predict_risk({"sleep_quality": 1, "anxiety_level": 1, "stress_level": 1}, user_id="u1")
+
+    # 0.15 * 33.3 + 0.7 * 66.7 + 0.1 * 100, although the answers alone would score 10
+    assert result["risk_score"] == pytest.approx(61.667, abs=1e-3)
+
+def test_forest_risk_score_agrees_with_its_level(service):
+    for answers in ({"sleep_quality": 0, "anxiety_level": 1, "stress_level": 0}, {"sleep_quality": 10, "anxiety_level": 10, "stress_level": 9}):
+        result = service.predict_risk(answers)
+        proba = service.predict_batch([answers])[0]["probabilities"]
+        assert result["risk_score"] == pytest.approx(MLService.expected_risk_score(proba))
+    assert service.predict_risk({"sleep_quality": 10, "anxiety_level": 10, "stress_level": 9})["risk_score"] > 66
+
+def test_history_predictions_skip_the_forest(service, monkeypatch):
+    service.sequence_scorer = object()
+    monkeypatch.setattr(service, "predict_with_history", _history_prediction)
+    monkeypatch.setattr(service, "predict_batch", lambda responses_list: pytest.fail("forest was run"))
+
+    assert service.predict_risk({"sleep_quality": 5}, user_id="u1")["risk_level"] == "high"
+
+class AlwaysLow:
+    """Shadow candidate that predicts "low" for everything"""
+    labels = LABELS
+
+    def predict_batch(self, responses_list):
+        return [{"risk_level": "low"} for _ in responses_list]
+
+def test_history_predictions_are_not_mirrored_to_the_candidate(service, monkeypatch):
+    evaluator = ShadowEvaluator()
+    evaluator.set_candidate(AlwaysLow(), "always-low", LABELS)
+    monkeypatch.setattr(ml_service, "shadow_evaluator", evaluator)
+    answers = {"sleep_quality": 9, "anxiety_level": 8, "stress_level": 2}
+
+    service.predict_risk(answers)
+    service.sequence_scorer = object()
+    monkeypatch.setattr(service, "predict_with_history", _history_prediction)
+    service.predict_risk(answers, user_id="u1")
+
+    assert (evaluator.mirrored, evaluator.skipped_history) == (1, 1)
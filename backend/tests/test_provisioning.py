@@ -0,0 +1,46 @@
+"""
+Bulk user provisioning
+"""
+from app.models.models import User
+from app.services.password_hasher import pwd_context
+from app.services.provisioning_service import ProvisioningService
+
+def _row(n: int, **overrides) -> dict:
+    row = {
+        "email": f"user{n}@example.com",
+        "username": f"user{n}",
+        "password": f"password-{n}",
+        "full_name": f"User {n}",
+        "age": "30",
+        "gender": "other"
+    }
+    row.update(overrides)
+    return row
+
+def test_provision_creates_valid_rows_and_reports_the_rest(db):
+    db.add(User(email="taken@example.com", username="taken", hashed_password="x", is_active=True))
+    db.commit()
+    service = ProvisioningService(hash_workers=2, batch_size=2)
+
+    result = service.provision(db, [
+        _row(1),
+        _row(2),
+        _row(3, email="user1@example.com"),
+        _row(4, username="taken"),
+        _row(5)
+    ])
+
+    assert result["created"] == 3
+    assert [row["status"] for row in result["results"]] == ["created", "created", "error", "error", "created"]
+    user = db.query(User).filter(User.email == "user5@example.com").one()
+    assert pwd_context.verify("password-5", user.hashed_password)
+
+def test_imports_share_one_bounded_hash_pool(db):
+    service = ProvisioningService(hash_workers=2, batch_size=10)
+
+    service.provision(db, [_row(1), _row(2)])
+    executor = service._executor
+    service.provision(db, [_row(3), _row(4)])
+
+    assert executor is not None and service._executor is executor
+    assert executor._max_workers == 2
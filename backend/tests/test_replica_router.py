@@ -0,0 +1,91 @@
+"""
+Read-replica routing against two local SQLite databases
+"""
+import os
+import time
+import pytest
+from sqlalchemy import create_engine, text
+from app.database import ReplicaRouter, engine
+
+def _make_database(path: str, name: str) -> str:
+    url = f"sqlite:///{path}"
+    marker = create_engine(url)
+    with marker.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS marker (name TEXT)"))
+        conn.execute(text("DELETE FROM marker"))
+        conn.execute(text("INSERT INTO marker (name) VALUES (:name)"), {"name": name})
+    marker.dispose()
+    return url
+
+def _served_by(session) -> str:
+    try:
+        return session.execute(text("SELECT name FROM marker")).scalar()
+    finally:
+        session.close()
+
+@pytest.fixture
+def replica_urls(db_dir):
+    urls = [
+        _make_database(os.path.join(db_dir, "replica_a.db"), "replica_a"),
+        _make_database(os.path.join(db_dir, "replica_b.db"), "replica_b")
+    ]
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS marker (name TEXT)"))
+        conn.execute(text("DELETE FROM marker"))
+        conn.execute(text("INSERT INTO marker (name) VALUES ('primary')"))
+    yield urls
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE marker"))
+
+def test_reads_alternate_between_replicas(replica_urls):
+    router = ReplicaRouter(replica_urls, health_check_seconds=60, sticky_seconds=5)
+
+    served = [_served_by(router.session("reader")) for _ in range(4)]
+
+    assert served == ["replica_a", "replica_b", "replica_a", "replica_b"]
+
+def test_writer_reads_from_primary_within_sticky_window(replica_urls):
+    router = ReplicaRouter(replica_urls, health_check_seconds=60, sticky_seconds=0.2)
+    router.mark_write("writer")
+
+    assert _served_by(router.session("writer")) == "primary"
+    assert _served_by(router.session("someone-else")).startswith("replica_")
+
+    time.sleep(0.25)
+    assert _served_by(router.session("writer")).startswith("replica_")
+
+def test_unhealthy_replica_is_skipped(replica_urls, db_dir):
+    missing = f"sqlite:///{os.path.join(db_dir, 'missing', 'replica.db')}"
+    router = ReplicaRouter([missing, replica_urls[1]], health_check_seconds=60, sticky_seconds=5)
+
+    served = [_served_by(router.session()) for _ in range(3)]
+
+    assert served == ["replica_b"] * 3
+    assert router._healthy == [False, True]
+
+def test_falls_back_to_primary_when_no_replica_is_healthy(db_dir, replica_urls):
+    missing = f"sqlite:///{os.path.join(db_dir, 'missing', 'replica.db')}"
+    router = ReplicaRouter([missing], health_check_seconds=60, sticky_seconds=5)
+
+    assert router.choose() is None
+    assert _served_by(router.session()) == "primary"
+    assert router.read_engine() is engine
+
+def test_recovered_replica_rejoins_after_health_check(db_dir, replica_urls):
+    directory = os.path.join(db_dir, "late")
+    router = ReplicaRouter([f"sqlite:///{os.path.join(directory, 'replica.db')}"], health_check_seconds=0.1, sticky_seconds=5)
+    assert router.choose() is None
+
+    os.makedirs(directory, exist_ok=True)
+    _make_database(os.path.join(directory, "replica.db"), "late")
+    # Still within the health check interval: the failed check is remembered
+    assert router.choose() is None
+
+    time.sleep(0.15)
+    assert _served_by(router.session()) == "late"
+
+def test_no_replicas_reads_from_primary(replica_urls):
+    router = ReplicaRouter([], health_check_seconds=60, sticky_seconds=5)
+
+    assert router.choose("reader") is None
+    assert _served_by(router.session("reader")) == "primary"
@@ -0,0 +1,80 @@
+"""
+SequenceScorer history cache
+"""
+import numpy as np
+import pytest
+from app.services.ml_service import MLService
+from app.services.sequence_scorer import SequenceScorer
+
+N_FEATURES, HEADS, KEY_DIM, HIDDEN, LABELS = 3, 2, 4, 8, ["low", "medium", "high", "critical"]
+
+@pytest.fixture
+def scorer() -> SequenceScorer:
+    rng = np.random.default_rng(0)
+    dense = lambda n_in, n_out: rng.normal(0, 0.3, (n_in, n_out)).astype(np.float32)
+    weights = {
+        "query_kernel": rng.normal(0, 0.3, (N_FEATURES, HEADS, KEY_DIM)).astype(np.float32),
+        "query_bias": np.zeros((HEADS, KEY_DIM), np.float32),
+        "key_kernel": rng.normal(0, 0.3, (N_FEATURES + 1, HEADS, KEY_DIM)).astype(np.float32),
+        "key_bias": np.zeros((HEADS, KEY_DIM), np.float32),
+        "value_kernel": rng.normal(0, 0.3, (N_FEATURES, HEADS, KEY_DIM)).astype(np.float32),
+        "value_bias": np.zeros((HEADS, KEY_DIM), np.float32),
+        "output_kernel": rng.normal(0, 0.3, (HEADS, KEY_DIM, N_FEATURES)).astype(np.float32),
+        "output_bias": np.zeros(N_FEATURES, np.float32),
+        "ffn_hidden_kernel": dense(N_FEATURES, HIDDEN), "ffn_hidden_bias": np.zeros(HIDDEN, np.float32),
+        "ffn_output_kernel": dense(HIDDEN, N_FEATURES), "ffn_output_bias": np.zeros(N_FEATURES, np.float32),
+        "head_hidden_kernel": dense(N_FEATURES, HIDDEN), "head_hidden_bias": np.zeros(HIDDEN, np.float32),
+        "head_output_kernel": dense(HIDDEN, len(LABELS)), "head_output_bias": np.zeros(len(LABELS), np.float32)
+    }
+    for name in ("attention_norm", "ffn_norm"):
+        weights[f"{name}_gamma"] = np.ones(N_FEATURES, np.float32)
+        weights[f"{name}_beta"] = np.zeros(N_FEATURES, np.float32)
+    return SequenceScorer({
+        "feature_names": ["a", "b", "c"],
+        "labels": LABELS,
+        "max_length": 4,
+        "epsilon": 1e-3,
+        "mean": np.full(N_FEATURES, 5, np.float32),
+        "scale": np.full(N_FEATURES, 3, np.float32),
+        "weights": weights
+    })
+
+def test_score_step_leaves_the_cache_alone_until_remembered(scorer):
+    first = np.array([2, 3, 4], np.float32)
+    second = np.array([8, 9, 7], np.float32)
+    proba, keys, values = scorer.score_step("u1", first)
+    assert len(keys) == 1
+
+    # Not remembered (e.g. the commit failed): the next step does not see the first
+    _, keys, _ = scorer.score_step("u1", second)
+    assert len(keys) == 1
+
+    _, keys, values = scorer.score_step("u1", first)
+    scorer.remember("u1", keys, values)
+    proba, keys, _ = scorer.score_step("u1", second)
+    assert len(keys) == 2
+    np.testing.assert_allclose(proba, scorer.predict_sequence(np.vstack([first, second]))[-1], atol=1e-5)
+
+def test_score_matches_the_uncached_forward_pass(scorer):
+    history = np.random.default_rng(1).integers(0, 11, (6, N_FEATURES)).astype(np.float32)
+    for t, step in enumerate(history):
+        proba, steps = scorer.score("u2", step)
+        assert steps == min(t + 1, 4)
+    window = history[-4:]
+    np.testing.assert_allclose(proba, scorer.predict_sequence(window)[-1], atol=1e-5)
+
+def test_batch_with_histories_scores_like_the_live_path(scorer, tmp_path):
+    service = MLService(str(tmp_path))
+    service.sequence_scorer = scorer
+    rng = np.random.default_rng(2)
+    answers = [dict(zip(scorer.feature_names, row)) for row in rng.integers(0, 11, (6, N_FEATURES)).tolist()]
+
+    live = [
+        service.predict_risk(responses, user_id=f"u{t}", load_history=lambda t=t: answers[:t])
+        for t, responses in enumerate(answers)
+    ]
+    batch = service.predict_risk_batch(answers, [answers[:t] for t in range(len(answers))])
+    for served, rescored in zip(live, batch):
+        assert rescored["model_used"] == served["model_used"]
+        assert rescored["risk_level"] == served["risk_level"]
+        assert rescored["risk_score"] == pytest.approx(served["risk_score"], abs=1e-3)
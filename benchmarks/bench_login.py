@@ -0,0 +1,118 @@
+"""
+Benchmark for login under a burst of concurrent users
+Reports login latency percentiles and how responsive the event loop stays
+(/health latency) while bcrypt runs, for the hashing executor and for the
+old inline behaviour
+
+Usage:
+    python benchmarks/bench_login.py --users 100 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.array(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max())
+    }
+
+async def run_burst(app, n_users: int, password: str):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login_latencies, health_latencies, statuses = [], [], {}
+        done = asyncio.Event()
+
+        async def login(i):
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/auth/login", params={"email": f"user{i}@example.com", "password": password}
+            )
+            login_latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe_health():
+            # Latency is measured from when the probe was due, so event-loop stalls count
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start - 0.01)
+
+        probe = asyncio.create_task(probe_health())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(n_users)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+
+    return {
+        "elapsed_seconds": elapsed,
+        "logins_per_second": n_users / elapsed,
+        "status_codes": statuses,
+        "login": percentiles(login_latencies),
+        "health_during_burst": percentiles(health_latencies)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent logins")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost")
+    parser.add_argument("--concurrency", type=int, default=None, help="PASSWORD_HASH_CONCURRENCY")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_login.db')}"
+    os.environ["PASSWORD_HASH_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS"] = "60"
+    os.environ["ANALYTICS_ROLLUP_INTERVAL_SECONDS"] = "0"
+    if args.concurrency:
+        os.environ["PASSWORD_HASH_CONCURRENCY"] = str(args.concurrency)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+    from main import app
+    from app.database import SessionLocal
+    from app.models.models import User
+    from app.services.password_hasher import password_hasher, pwd_context
+
+    password = "correct horse battery staple"
+    hashed = pwd_context.hash(password)
+    db = SessionLocal()
+    for i in range(args.users):
+        db.add(User(
+            email=f"user{i}@example.com", username=f"user{i}", hashed_password=hashed,
+            full_name=f"User {i}", age=20, gender="unspecified"
+        ))
+    db.commit()
+    db.close()
+
+    results = {"users": args.users, "rounds": args.rounds, "concurrency": password_hasher.max_concurrency}
+    results["executor"] = asyncio.run(run_burst(app, args.users, password))
+
+    # Old behaviour for comparison: bcrypt called directly on the event loop
+    async def run_inline(fn, *fn_args):
+        return fn(*fn_args)
+
+    password_hasher._run = run_inline
+    results["inline"] = asyncio.run(run_burst(app, args.users, password))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark model loading: separate artifact files vs the single-file bundle
+Each load runs in a fresh process so nothing stays deserialized between runs:
+  - legacy: joblib/json/Keras loads of every artifact file, one after another
+  - legacy_serving: the files MLService loaded before bundles (rf, scaler, student)
+  - bundle_full: opening the bundle and loading every member
+  - bundle_serving: opening the bundle and loading only what MLService needs
+  - bundle_index: opening the bundle (index read and checksum only)
+Run train_model.py (and optionally distillation.py) first so both formats exist.
+
+Usage:
+    python benchmarks/bench_model_load.py --model-path ./ml/models/trained_models --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from app.services.model_bundle import BUNDLE_FILE, ModelBundle
+
+MODES = ["legacy", "legacy_serving", "bundle_full", "bundle_serving", "bundle_index"]
+
+def load_legacy(model_path: str, filenames: list):
+    import joblib
+
+    for filename in filenames:
+        path = os.path.join(model_path, filename)
+        if filename.endswith(".pkl"):
+            joblib.load(path)
+        elif filename.endswith(".json"):
+            with open(path) as f:
+                json.load(f)
+        else:
+            from tensorflow import keras
+            keras.models.load_model(path)
+
+def load_bundle(path: str, mode: str):
+    bundle = ModelBundle(path)
+    if mode == "bundle_full":
+        for name in bundle.members:
+            bundle.load(name)
+    elif mode == "bundle_serving":
+        # What MLService._load_bundle reads
+        bundle.load("scaler")
+        if "student" in bundle:
+            bundle.load("student")
+        else:
+            bundle.load("rf_compact" if "rf_compact" in bundle else "rf")
+        if "feature_importance" in bundle:
+            bundle.load("feature_importance")
+        if "sequence" in bundle:
+            bundle.load("sequence")
+
+def time_load(model_path: str, mode: str) -> float:
+    bundle_path = os.path.join(model_path, BUNDLE_FILE)
+    if mode.startswith("legacy"):
+        # The same files the bundle was packed from
+        members = ModelBundle(bundle_path).index["members"]
+        names = members if mode == "legacy" else [name for name in ("rf", "scaler", "student") if name in members]
+        filenames = [members[name]["filename"] for name in names]
+        start = time.perf_counter()
+        load_legacy(model_path, filenames)
+    else:
+        start = time.perf_counter()
+        load_bundle(bundle_path, mode)
+    return time.perf_counter() - start
+
+def run_child(model_path: str, mode: str) -> float:
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--model-path", model_path, "--child", mode],
+        stderr=subprocess.DEVNULL
+    )
+    return float(output.decode().strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark artifact files vs model bundle load time")
+    parser.add_argument("--model-path", default="./ml/models/trained_models")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh-process loads per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Subset of {','.join(MODES)}")
+    parser.add_argument("--child", choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    if args.child:
+        print(time_load(args.model_path, args.child))
+        return
+
+    bundle_path = os.path.join(args.model_path, BUNDLE_FILE)
+    bundle = ModelBundle(bundle_path)
+    report = {
+        "bundle_bytes": os.path.getsize(bundle_path),
+        "members": bundle.members,
+        "repeat": args.repeat,
+        "results": {}
+    }
+    for mode in args.modes.split(","):
+        samples = [run_child(args.model_path, mode) for _ in range(args.repeat)]
+        report["results"][mode] = {
+            "median_ms": round(float(np.median(samples)) * 1000, 2),
+            "min_ms": round(float(np.min(samples)) * 1000, 2)
+        }
+        print(f"{mode}: {report['results'][mode]}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark for the population analytics rollups
+Seeds synthetic users/assessments/risk_scores, then compares backfill,
+incremental refresh and dashboard query latency against a raw GROUP BY
+
+Usage:
+    python benchmarks/bench_rollups.py --rows 10000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+def seed(engine, tables, n_rows: int, origin: datetime, span_seconds: int, start_index: int = 0,
+         chunk_size: int = 50000, seed_value: int = 42):
+    """Insert n_rows synthetic assessments with risk scores spread over [origin, origin + span)"""
+    User, Questionnaire, Assessment, RiskScore = tables
+    rng = np.random.default_rng(seed_value + start_index)
+    n_users = max(n_rows // 10, 1)
+    levels = np.array(["low", "medium", "high", "critical"])
+    genders = np.array(["female", "male", "non-binary", "unspecified"])
+    questionnaire_ids = ["phq9", "gad7"]
+
+    with engine.begin() as conn:
+        if start_index == 0:
+            conn.execute(Questionnaire.__table__.insert(), [
+                {"id": qid, "name": qid, "version": "1.0", "questions": []} for qid in questionnaire_ids
+            ])
+            for offset in range(0, n_users, chunk_size):
+                count = min(chunk_size, n_users - offset)
+                ages = rng.integers(13, 90, size=count)
+                gender_idx = rng.integers(0, len(genders), size=count)
+                conn.execute(User.__table__.insert(), [
+                    {
+                        "id": f"user-{offset + i}",
+                        "email": f"user{offset + i}@example.com",
+                        "username": f"user{offset + i}",
+                        "age": int(ages[i]),
+                        "gender": str(genders[gender_idx[i]])
+                    }
+                    for i in range(count)
+                ])
+
+    for offset in range(0, n_rows, chunk_size):
+        count = min(chunk_size, n_rows - offset)
+        scores = np.clip(rng.normal(45, 20, size=count), 0, 100)
+        level_idx = np.digitize(scores, [30, 50, 75])
+        user_idx = rng.integers(0, n_users, size=count)
+        q_idx = rng.integers(0, len(questionnaire_ids), size=count)
+        seconds = np.sort(rng.integers(0, span_seconds, size=count))
+        assessments, risk_scores = [], []
+        for i in range(count):
+            assessment_id = uuid.uuid4().hex
+            timestamp = origin + timedelta(seconds=int(seconds[i]))
+            user_id = f"user-{user_idx[i]}"
+            assessments.append({
+                "id": assessment_id,
+                "user_id": user_id,
+                "questionnaire_id": questionnaire_ids[q_idx[i]],
+                "status": "completed",
+                "completed_at": timestamp
+            })
+            risk_scores.append({
+                "id": uuid.uuid4().hex,
+                "assessment_id": assessment_id,
+                "user_id": user_id,
+                "risk_level": str(levels[level_idx[i]]),
+                "risk_score": float(scores[i]),
+                "calculated_at": timestamp
+            })
+        with engine.begin() as conn:
+            conn.execute(Assessment.__table__.insert(), assessments)
+            conn.execute(RiskScore.__table__.insert(), risk_scores)
+
+def timed(fn, repeat: int = 5):
+    """Median wall time of fn over several runs, in milliseconds"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples)), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analytics rollups")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Synthetic risk scores to seed")
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite file")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    db_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_rollups.db')}"
+    os.environ["DATABASE_URL"] = db_url
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+    from sqlalchemy import func
+    from app.database import engine, SessionLocal, Base
+    from app.models.models import User, Questionnaire, Assessment, RiskScore
+    from app.services.analytics_service import AnalyticsService
+
+    Base.metadata.create_all(bind=engine)
+    tables = (User, Questionnaire, Assessment, RiskScore)
+    results = {"rows": args.rows, "database": engine.dialect.name}
+
+    print(f"Seeding {args.rows} rows into {db_url} ...")
+    start = time.perf_counter()
+    now = datetime.utcnow()
+    seed(engine, tables, args.rows, origin=now - timedelta(days=366), span_seconds=365 * 86400)
+    results["seed_seconds"] = time.perf_counter() - start
+
+    service = AnalyticsService(batch_size=args.batch_size, lag_seconds=0)
+    db = SessionLocal()
+
+    start = time.perf_counter()
+    service.run_incremental(db)
+    elapsed = time.perf_counter() - start
+    results["backfill_seconds"] = elapsed
+    results["backfill_rows_per_second"] = args.rows / elapsed
+
+    # Incremental refresh after 1% new rows
+    new_rows = max(args.rows // 100, 1)
+    seed(engine, tables, new_rows, origin=now - timedelta(hours=1), span_seconds=3000, start_index=args.rows)
+    start = time.perf_counter()
+    processed = service.run_incremental(db)
+    results["incremental_rows"] = processed
+    results["incremental_seconds"] = time.perf_counter() - start
+
+    def raw_group_by():
+        return db.query(
+            func.date(RiskScore.calculated_at), Assessment.questionnaire_id, RiskScore.risk_level,
+            func.count(RiskScore.id), func.avg(RiskScore.risk_score)
+        ).join(Assessment, Assessment.id == RiskScore.assessment_id).join(
+            User, User.id == RiskScore.user_id
+        ).group_by(
+            func.date(RiskScore.calculated_at), Assessment.questionnaire_id, RiskScore.risk_level
+        ).all()
+
+    def rollup_query():
+        return service.risk_distribution(db, granularity="day", dimension="questionnaire_id")
+
+    results["raw_group_by_ms"], raw_rows = timed(raw_group_by, repeat=3)
+    results["rollup_query_ms"], rollup_rows = timed(rollup_query)
+    results["dashboard_speedup"] = results["raw_group_by_ms"] / max(results["rollup_query_ms"], 1e-9)
+    results["raw_groups"] = len(raw_rows)
+    results["rollup_groups"] = len(rollup_rows)
+    db.close()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
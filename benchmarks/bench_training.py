@@ -0,0 +1,171 @@
+"""
+Benchmark suite for the risk models
+Reports fit time, predict latency (batch 1/64/4096), serialized model size
+and holdout accuracy for each model at several training-set sizes, and
+writes the results as JSON for regression tracking
+
+Usage:
+    python benchmarks/bench_training.py --sizes 10000,100000,1000000 --output bench_training.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from synthetic_data import generate
+from train_model import make_gb_model, available_gb_backends
+
+MODELS = ["rf", "gb", "hist_gb", "lightgbm", "dl", "attention"]
+BATCH_SIZES = [1, 64, 4096]
+
+class SklearnModel:
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def fit(self, X, y):
+        self.estimator.fit(X, y)
+
+    def predict(self, X):
+        return self.estimator.predict(X)
+
+    def size_bytes(self) -> int:
+        buffer = io.BytesIO()
+        joblib.dump(self.estimator, buffer)
+        return buffer.tell()
+
+class KerasModel:
+    def __init__(self, detector, epochs: int, batch_size: int, sequence: bool = False):
+        self.detector = detector
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.sequence = sequence
+
+    def _shape(self, X):
+        if self.sequence:
+            return X.reshape(X.shape[0], self.detector.seq_length, self.detector.input_dim)
+        return X
+
+    def fit(self, X, y):
+        # Keras progress bars would otherwise end up in the JSON on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            self.detector.train(X, y, epochs=self.epochs, batch_size=self.batch_size)
+
+    def predict(self, X):
+        return np.argmax(self.detector.model.predict(self._shape(X), verbose=0), axis=1)
+
+    def size_bytes(self) -> int:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.keras")
+            self.detector.model.save(path)
+            return os.path.getsize(path)
+
+def build(name: str, args):
+    """Build a model wrapper, or raise ImportError/ValueError if unavailable"""
+    if name == "rf":
+        return SklearnModel(RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1))
+    if name == "gb":
+        return SklearnModel(make_gb_model("classic"))
+    if name == "hist_gb":
+        return SklearnModel(make_gb_model("hist"))
+    if name == "lightgbm":
+        return SklearnModel(make_gb_model("lightgbm"))
+
+    from deep_learning_model import DeepLearningRiskDetector, AttentionBasedRiskDetector
+    if name == "dl":
+        return KerasModel(DeepLearningRiskDetector(input_dim=12), args.dl_epochs, args.dl_batch_size)
+    return KerasModel(AttentionBasedRiskDetector(input_dim=12), args.dl_epochs, args.dl_batch_size, sequence=True)
+
+def predict_latency_ms(model, X_test: np.ndarray, batch_size: int, repeat: int) -> float:
+    """Median latency of one predict call on a batch"""
+    batch = X_test[:batch_size]
+    model.predict(batch)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(batch)
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+def run_one(name: str, rows: int, X_test, y_test, scaler_seed: int, args) -> dict:
+    result = {"model": name, "rows": rows}
+    try:
+        model = build(name, args)
+    except (ImportError, ValueError) as e:
+        result["skipped"] = str(e)
+        return result
+
+    X_train, y_train = generate(rows, seed=scaler_seed)
+    scaler = StandardScaler().fit(X_train)
+    X_train = scaler.transform(X_train).astype(np.float32)
+    X_eval = scaler.transform(X_test).astype(np.float32)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    result["fit_seconds"] = round(time.perf_counter() - start, 3)
+    result["accuracy"] = float(np.mean(model.predict(X_eval) == y_test))
+    result["predict_ms"] = {
+        str(batch_size): round(predict_latency_ms(model, X_eval, batch_size, args.repeat), 3)
+        for batch_size in BATCH_SIZES
+    }
+    result["model_bytes"] = model.size_bytes()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark risk model training and inference")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated training-set sizes")
+    parser.add_argument("--models", default=",".join(MODELS), help=f"Subset of {','.join(MODELS)}")
+    parser.add_argument("--test-rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed predict calls per batch size")
+    parser.add_argument("--dl-epochs", type=int, default=5)
+    parser.add_argument("--dl-batch-size", type=int, default=256)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    models = [model for model in args.models.split(",") if model]
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+
+    # One fixed holdout set, drawn from a different seed than the training sets
+    X_test, y_test = generate(max(args.test_rows, max(BATCH_SIZES)), seed=7)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "gb_backends": available_gb_backends()
+        },
+        "sizes": sizes,
+        "results": []
+    }
+
+    for rows in sizes:
+        for name in models:
+            print(f"{name} @ {rows} rows ...", file=sys.stderr)
+            result = run_one(name, rows, X_test, y_test, scaler_seed=rows, args=args)
+            report["results"].append(result)
+            print(json.dumps(result), file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Backfill the population analytics rollups from risk_scores
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from app.database import engine, SessionLocal, Base
+from app.services.analytics_service import AnalyticsService
+
+def backfill(full: bool = False, batch_size: int = None):
+    """Roll up all risk scores past the high-water mark (or from scratch with full=True)"""
+    Base.metadata.create_all(bind=engine)
+    service = AnalyticsService(batch_size=batch_size, lag_seconds=0)
+    db = SessionLocal()
+
+    try:
+        if full:
+            service.reset(db)
+            print("✓ Existing rollups cleared")
+
+        start = time.perf_counter()
+        total = 0
+        while True:
+            processed = service.run_incremental(db, max_batches=10)
+            total += processed
+            elapsed = time.perf_counter() - start
+            print(f"  {total} rows rolled up ({total / max(elapsed, 1e-9):.0f} rows/s)")
+            if processed < service.batch_size * 10:
+                break
+
+        watermark = service.get_watermark(db)
+        print(f"✓ Backfill complete: {total} rows in {time.perf_counter() - start:.1f}s")
+        if watermark is not None:
+            print(f"✓ High-water mark: {watermark.last_calculated_at}")
+        return total
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--full", action="store_true", help="Drop existing rollups and rebuild from scratch")
+    parser.add_argument("--batch-size", type=int, default=None, help="Risk scores per transaction")
+    args = parser.parse_args()
+    backfill(full=args.full, batch_size=args.batch_size)
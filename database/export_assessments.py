@@ -0,0 +1,42 @@
+"""
+Export de-identified assessments with risk scores to NDJSON or Parquet
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from app.database import engine
+from app.services.export_service import ExportService
+
+def export(path: str, columns=None, start=None, end=None, chunk_size: int = None) -> int:
+    """Stream the export to path; the format is picked from the file extension"""
+    service = ExportService(chunk_size=chunk_size)
+    started = time.perf_counter()
+
+    if path.endswith(".parquet"):
+        rows = service.write_parquet(engine, path, columns, start, end)
+    else:
+        rows = service.write_ndjson(engine, path, columns, start, end)
+
+    elapsed = time.perf_counter() - started
+    print(f"✓ Exported {rows} rows to {path} in {elapsed:.1f}s")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output", help="Output file (.ndjson or .parquet)")
+    parser.add_argument("--columns", default=None, help="Comma-separated column projection")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="completed_at >= START")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="completed_at < END")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows per fetch / row group")
+    args = parser.parse_args()
+    export(
+        args.output,
+        columns=args.columns.split(",") if args.columns else None,
+        start=args.start,
+        end=args.end,
+        chunk_size=args.chunk_size
+    )
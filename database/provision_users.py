@@ -0,0 +1,45 @@
+"""
+Create users in bulk from a CSV (email,username,password,full_name,age,gender)
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from app.database import SessionLocal
+from app.services.provisioning_service import ProvisioningService
+
+def provision(path: str, workers: int = None, batch_size: int = None, report: str = None) -> dict:
+    """Provision every row in the CSV and print a summary"""
+    service = ProvisioningService(hash_workers=workers, batch_size=batch_size)
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = service.parse_csv(f.read())
+
+    db = SessionLocal()
+    try:
+        result = service.provision(db, rows)
+    finally:
+        db.close()
+
+    print(
+        f"✓ Created {result['created']}/{result['total']} users in {result['elapsed_seconds']:.1f}s "
+        f"({result['users_per_second']} users/s)"
+    )
+    for row in result["results"]:
+        if row["status"] != "created":
+            print(f"  row {row['row']} ({row['email']}): {row['error']}")
+
+    if report:
+        with open(report, "w") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("csv", help="Input CSV with a header row")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing threads (default: one per CPU)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Users per INSERT")
+    parser.add_argument("--report", default=None, help="Write per-row results as JSON")
+    args = parser.parse_args()
+    provision(args.csv, workers=args.workers, batch_size=args.batch_size, report=args.report)
@@ -0,0 +1,69 @@
+"""
+Re-score every completed assessment with a new model version
+Resumable: re-running with the same model version continues from the saved
+partition checkpoints. Afterwards rebuild the rollups with
+backfill_rollups.py --full so dashboards use the new scores too.
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from app.database import engine, SessionLocal, Base
+from app.services.rescoring_service import RescoringService
+
+def rescore(
+    model_path: str,
+    model_version: str = None,
+    workers: int = None,
+    partitions: int = None,
+    batch_size: int = None,
+    max_rows_per_second: float = None,
+    nice: int = 0
+) -> dict:
+    """Re-score all pending partitions and print throughput"""
+    Base.metadata.create_all(bind=engine)
+    service = RescoringService(workers=workers, batch_size=batch_size, max_rows_per_second=max_rows_per_second)
+    db = SessionLocal()
+
+    def on_partition(result: dict):
+        rate = result["rows"] / max(result["seconds"], 1e-9)
+        print(f"  partition {result['partition']}: {result['rows']} rows in {result['seconds']:.1f}s ({rate:.0f} rows/s)")
+
+    try:
+        result = service.run(
+            db, model_path, model_version=model_version, partitions=partitions, nice=nice, on_partition=on_partition
+        )
+    finally:
+        db.close()
+
+    print(
+        f"✓ Re-scored {result['rows']} assessments with {result['model_version']} in "
+        f"{result['elapsed_seconds']:.1f}s ({result['rows_per_second']} rows/s, {result['workers']} workers)"
+    )
+    print(f"✓ {result['summaries_rebuilt']} user summaries rebuilt")
+    if result["partitions_run"]:
+        print("  Run backfill_rollups.py --full to rebuild the analytics rollups")
+    print(json.dumps(result, indent=2))
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-path", default="./ml/models/trained_models", help="Model directory to score with")
+    parser.add_argument("--model-version", default=None, help="Version label (default: the model bundle's version)")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: one per CPU)")
+    parser.add_argument("--partitions", type=int, default=None, help="Id ranges on the first run (default: 4 per worker)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Assessments per model call and transaction")
+    parser.add_argument("--max-rows-per-second", type=float, default=None, help="Whole-job rate limit (0 = unthrottled)")
+    parser.add_argument("--nice", type=int, default=10, help="Lower the workers' CPU priority by this much")
+    args = parser.parse_args()
+    rescore(
+        args.model_path,
+        model_version=args.model_version,
+        workers=args.workers,
+        partitions=args.partitions,
+        batch_size=args.batch_size,
+        max_rows_per_second=args.max_rows_per_second,
+        nice=args.nice
+    )
@@ -17,6 +17,30 @@ CREATE TABLE users (
     INDEX idx_username (username)
 );
 
+CREATE TABLE refresh_tokens (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL,
+    token_hash VARCHAR(64) UNIQUE NOT NULL,
+    family_id VARCHAR(36) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP NULL,
+    replaced_by_id VARCHAR(36),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_user_id (user_id),
+    INDEX idx_family_id (family_id)
+);
+
+CREATE TABLE revoked_tokens (
+    jti VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36),
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_expires_at (expires_at),
+    INDEX idx_revoked_at (revoked_at)
+);
+
 CREATE TABLE questionnaires (
     id VARCHAR(36) PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
@@ -44,15 +68,19 @@ CREATE TABLE assessments (
 
 CREATE TABLE risk_scores (
     id VARCHAR(36) PRIMARY KEY,
-    assessment_id VARCHAR(36) UNIQUE NOT NULL,
+    assessment_id VARCHAR(36) NOT NULL,
     user_id VARCHAR(36) NOT NULL,
     risk_level VARCHAR(50),
     risk_score FLOAT,
     contributing_factors JSON,
+    factor_attributions JSON,
     recommendations JSON,
     ml_model_used VARCHAR(255),
     confidence_score FLOAT,
+    model_version VARCHAR(64) NOT NULL DEFAULT 'unversioned',
+    superseded_at TIMESTAMP NULL,
     calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_risk_score_version UNIQUE (assessment_id, model_version),
     FOREIGN KEY (assessment_id) REFERENCES assessments(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
@@ -60,6 +88,69 @@ CREATE TABLE risk_scores (
     INDEX idx_calculated_at (calculated_at)
 );
 
+CREATE TABLE user_risk_summary (
+    user_id VARCHAR(36) PRIMARY KEY,
+    latest_risk_score_id VARCHAR(36),
+    latest_risk_level VARCHAR(50),
+    latest_risk_score FLOAT,
+    trend_score FLOAT,
+    assessment_count INTEGER DEFAULT 0,
+    first_assessment_at TIMESTAMP,
+    last_assessment_at TIMESTAMP,
+    escalation_count INTEGER DEFAULT 0,
+    deescalation_count INTEGER DEFAULT 0,
+    level_transitions JSON,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (latest_risk_score_id) REFERENCES risk_scores(id) ON DELETE SET NULL
+);
+
+CREATE TABLE risk_rollups (
+    id SERIAL PRIMARY KEY,
+    granularity VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    questionnaire_id VARCHAR(36),
+    age_band VARCHAR(10),
+    gender VARCHAR(50),
+    risk_level VARCHAR(50),
+    count INTEGER DEFAULT 0,
+    score_sum FLOAT DEFAULT 0,
+    score_histogram JSON,
+    CONSTRAINT uq_risk_rollup_bucket UNIQUE (granularity, bucket_start, questionnaire_id, age_band, gender, risk_level),
+    INDEX idx_bucket_start (bucket_start)
+);
+
+CREATE TABLE rollup_watermarks (
+    name VARCHAR(100) PRIMARY KEY,
+    last_calculated_at TIMESTAMP,
+    last_risk_score_id VARCHAR(36),
+    rows_processed INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE rollup_contributions (
+    assessment_id VARCHAR(36) PRIMARY KEY,
+    calculated_at TIMESTAMP,
+    questionnaire_id VARCHAR(36),
+    age_band VARCHAR(10),
+    gender VARCHAR(50),
+    risk_level VARCHAR(50),
+    risk_score FLOAT,
+    FOREIGN KEY (assessment_id) REFERENCES assessments(id) ON DELETE CASCADE
+);
+
+CREATE TABLE rescore_checkpoints (
+    model_version VARCHAR(64) NOT NULL,
+    partition INTEGER NOT NULL,
+    lower_id VARCHAR(36),
+    upper_id VARCHAR(36),
+    last_assessment_id VARCHAR(36),
+    rows_processed INTEGER DEFAULT 0,
+    completed_at TIMESTAMP NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (model_version, partition)
+);
+
 CREATE TABLE audit_logs (
     id VARCHAR(36) PRIMARY KEY,
     user_id VARCHAR(36),
@@ -89,3 +180,5 @@ CREATE TABLE mental_health_resources (
 CREATE INDEX idx_user_assessments ON assessments(user_id, completed_at);
 CREATE INDEX idx_user_risk_scores ON risk_scores(user_id, calculated_at);
 CREATE INDEX idx_assessment_risk ON risk_scores(assessment_id);
+-- At most one current score per assessment
+CREATE UNIQUE INDEX uq_risk_score_current ON risk_scores(assessment_id) WHERE superseded_at IS NULL;
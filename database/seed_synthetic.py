@@ -0,0 +1,132 @@
+"""
+Fill users, assessments and risk_scores with synthetic data for benchmarks
+Rows come from synthetic_data.py shards (--data-dir) or are generated on the fly
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from sqlalchemy import insert
+
+from app.database import engine, Base
+from app.models.models import User, Questionnaire, Assessment, RiskScore
+from synthetic_data import generate
+from training_data import FEATURE_NAMES, RISK_LEVELS, ShardedDataset, peak_memory_mb
+
+QUESTIONNAIRE_ID = "synthetic-v1"
+GENDERS = ["female", "male", "non-binary", "unspecified"]
+
+def iter_source(rows: int, data_dir: str, chunk_size: int, seed: int, class_weights):
+    """Yield (X, y) chunks from shards or from the generator"""
+    if data_dir:
+        dataset = ShardedDataset(data_dir)
+        yield from dataset.iter_batches(chunk_size, stop=min(rows, dataset.n_rows) if rows else None)
+        return
+
+    rng = np.random.default_rng(seed)
+    for offset in range(0, rows, chunk_size):
+        yield generate(min(chunk_size, rows - offset), class_weights=class_weights, rng=rng)
+
+def seed(rows: int = 0, data_dir: str = None, users: int = None, days: int = 365, chunk_size: int = 10000,
+         seed_value: int = 42, class_weights=None) -> int:
+    """Insert one assessment + risk score per row, spread over the last `days` days"""
+    Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(seed_value)
+    n_rows = ShardedDataset(data_dir).n_rows if data_dir and not rows else rows
+    n_users = users or max(n_rows // 10, 1)
+    origin = datetime.utcnow() - timedelta(days=days)
+    start = time.perf_counter()
+
+    with engine.begin() as conn:
+        conn.execute(insert(Questionnaire), [{
+            "id": QUESTIONNAIRE_ID,
+            "name": "Synthetic Assessment",
+            "description": "Generated for benchmarks",
+            "version": "1.0",
+            "questions": [{"id": name, "text": name, "type": "rating", "scale": list(range(11))} for name in FEATURE_NAMES]
+        }])
+        for offset in range(0, n_users, chunk_size):
+            count = min(chunk_size, n_users - offset)
+            ages = rng.integers(13, 90, size=count)
+            genders = rng.integers(0, len(GENDERS), size=count)
+            conn.execute(insert(User), [
+                {
+                    "id": f"synthetic-user-{offset + i}",
+                    "email": f"synthetic{offset + i}@example.com",
+                    "username": f"synthetic{offset + i}",
+                    "hashed_password": "!",  # Not a valid bcrypt hash, so these users cannot log in
+                    "age": int(ages[i]),
+                    "gender": GENDERS[genders[i]]
+                }
+                for i in range(count)
+            ])
+
+    inserted = 0
+    for X, y in iter_source(n_rows, data_dir, chunk_size, seed_value, class_weights):
+        count = len(y)
+        user_idx = rng.integers(0, n_users, size=count)
+        seconds = np.sort(rng.integers(0, days * 86400, size=count))
+        scores = X.mean(axis=1) * 10
+        assessments, risk_scores = [], []
+        for i in range(count):
+            assessment_id = str(uuid.uuid4())
+            timestamp = origin + timedelta(seconds=int(seconds[i]))
+            user_id = f"synthetic-user-{user_idx[i]}"
+            assessments.append({
+                "id": assessment_id,
+                "user_id": user_id,
+                "questionnaire_id": QUESTIONNAIRE_ID,
+                "responses": dict(zip(FEATURE_NAMES, X[i].astype(int).tolist())),
+                "status": "completed",
+                "started_at": timestamp,
+                "completed_at": timestamp
+            })
+            risk_scores.append({
+                "id": str(uuid.uuid4()),
+                "assessment_id": assessment_id,
+                "user_id": user_id,
+                "risk_level": RISK_LEVELS[y[i]],
+                "risk_score": float(scores[i]),
+                "confidence_score": 1.0,
+                "ml_model_used": "synthetic",
+                "calculated_at": timestamp
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Assessment), assessments)
+            conn.execute(insert(RiskScore), risk_scores)
+        inserted += count
+        elapsed = time.perf_counter() - start
+        print(f"  {inserted}/{n_rows} assessments ({inserted / max(elapsed, 1e-9):.0f} rows/s)")
+
+    print(f"✓ Seeded {n_users} users and {inserted} assessments in {time.perf_counter() - start:.1f}s "
+          f"(peak memory {peak_memory_mb():.0f} MB)")
+    return inserted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=0, help="Assessments to insert (default: all rows in --data-dir)")
+    parser.add_argument("--data-dir", default=None, help="Shards written by synthetic_data.py")
+    parser.add_argument("--users", type=int, default=None, help="Default: rows / 10")
+    parser.add_argument("--days", type=int, default=365, help="Spread completed_at over this many past days")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per INSERT batch")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--class-weights", default=None, help="low,medium,high,critical when generating on the fly")
+    args = parser.parse_args()
+    if not args.rows and not args.data_dir:
+        parser.error("give --rows, --data-dir or both")
+    seed(
+        rows=args.rows,
+        data_dir=args.data_dir,
+        users=args.users,
+        days=args.days,
+        chunk_size=args.chunk_size,
+        seed_value=args.seed,
+        class_weights=[float(w) for w in args.class_weights.split(",")] if args.class_weights else None
+    )
@@ -5,7 +5,217 @@ import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 import numpy as np
-from typing import Tuple
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from training_data import RISK_LEVELS, ShardedDataset
+
+def configure_cpu_threads(intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """Size TensorFlow's CPU thread pools (0 = TensorFlow's default); call before building models"""
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+def _npy_data_offset(path: str) -> int:
+    """Byte offset of the array data in a .npy file"""
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            _, fortran_order, _ = np.lib.format.read_array_header_1_0(f)
+        else:
+            _, fortran_order, _ = np.lib.format.read_array_header_2_0(f)
+        if fortran_order:
+            raise ValueError(f"{path} is Fortran-ordered")
+        return f.tell()
+
+def make_shard_dataset(
+    directory: str,
+    batch_size: int = 256,
+    shuffle_buffer: int = 65536,
+    cycle_length: int = 4,
+    shard_indices: Optional[List[int]] = None,
+    scaler=None,
+    sequence_length: Optional[int] = None,
+    private_threads: int = 0,
+    seed: int = 42
+) -> tf.data.Dataset:
+    """tf.data pipeline over .npy shards written by training_data.ShardWriter.
+    
+    Shards are read cycle_length at a time with parallel interleave, so memory
+    is bounded by a few shards plus the shuffle buffer, not the dataset size.
+    Scaling and the attention model's sequence reshape happen per batch.
+    """
+    dataset = ShardedDataset(directory)
+    shards = dataset.manifest["shards"]
+    if shard_indices is not None:
+        shards = [shards[i] for i in shard_indices]
+    if any(shard["X"].endswith(".parquet") for shard in shards):
+        raise ValueError("The tf.data pipeline reads .npy shards only")
+    n_features = len(dataset.feature_names)
+    
+    x_paths = [os.path.join(directory, shard["X"]) for shard in shards]
+    y_paths = [os.path.join(directory, shard["y"]) for shard in shards]
+    offsets = ([_npy_data_offset(p) for p in x_paths], [_npy_data_offset(p) for p in y_paths])
+    
+    def read_shard(x_path, x_offset, y_path, y_offset):
+        X = tf.io.decode_raw(tf.strings.substr(tf.io.read_file(x_path), x_offset, -1), tf.float32)
+        y = tf.io.decode_raw(tf.strings.substr(tf.io.read_file(y_path), y_offset, -1), tf.int8)
+        return tf.data.Dataset.from_tensor_slices((tf.reshape(X, [-1, n_features]), y))
+    
+    files = tf.data.Dataset.from_tensor_slices((x_paths, offsets[0], y_paths, offsets[1]))
+    if shuffle_buffer:
+        files = files.shuffle(len(x_paths), seed=seed, reshuffle_each_iteration=True)
+    
+    ds = files.interleave(
+        read_shard,
+        cycle_length=min(cycle_length, len(x_paths)),
+        block_length=64,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=False
+    )
+    if shuffle_buffer:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    
+    mean = tf.constant(scaler.mean_ if scaler is not None else np.zeros(n_features), tf.float32)
+    scale = tf.constant(scaler.scale_ if scaler is not None else np.ones(n_features), tf.float32)
+    
+    def prepare(X, y):
+        X = (X - mean) / scale
+        if sequence_length:
+            X = tf.reshape(X, [-1, sequence_length, n_features // sequence_length])
+        return X, tf.cast(y, tf.int32)
+    
+    ds = ds.map(prepare, num_parallel_calls=tf.data.AUTOTUNE)
+    
+    options = tf.data.Options()
+    options.threading.private_threadpool_size = private_threads
+    return ds.with_options(options).prefetch(tf.data.AUTOTUNE)
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """Records training examples per second for each epoch"""
+    
+    def __init__(self, batch_size: int):
+        super().__init__()
+        self.batch_size = batch_size
+        self.examples_per_second: List[float] = []
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+        self._batches = 0
+    
+    def on_train_batch_end(self, batch, logs=None):
+        self._batches += 1
+    
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._start
+        rate = self._batches * self.batch_size / elapsed
+        self.examples_per_second.append(rate)
+        print(f"Epoch {epoch + 1}: {rate:,.0f} examples/s ({elapsed:.1f}s)")
+
+def fit_on_shards(
+    model: keras.Model,
+    directory: str,
+    epochs: int = 10,
+    batch_size: int = 256,
+    validation_shards: Optional[List[int]] = None,
+    sequence_length: Optional[int] = None,
+    **pipeline_options
+) -> dict:
+    """Fit a compiled model from shards on disk; validation_shards are held out of training"""
+    n_shards = len(ShardedDataset(directory).manifest["shards"])
+    validation_shards = validation_shards or []
+    train_shards = [i for i in range(n_shards) if i not in validation_shards]
+    
+    train_ds = make_shard_dataset(
+        directory, batch_size=batch_size, shard_indices=train_shards,
+        sequence_length=sequence_length, **pipeline_options
+    )
+    validation_ds = None
+    if validation_shards:
+        validation_ds = make_shard_dataset(
+            directory, batch_size=batch_size, shard_indices=validation_shards,
+            sequence_length=sequence_length, **{**pipeline_options, "shuffle_buffer": 0}
+        )
+    
+    throughput = ThroughputCallback(batch_size)
+    early_stopping = keras.callbacks.EarlyStopping(
+        monitor='val_loss' if validation_ds is not None else 'loss',
+        patience=10,
+        restore_best_weights=True
+    )
+    history = model.fit(
+        train_ds,
+        validation_data=validation_ds,
+        epochs=epochs,
+        callbacks=[early_stopping, throughput],
+        verbose=2
+    )
+    
+    return {**history.history, "examples_per_second": throughput.examples_per_second}
+
+def default_bucket_boundaries(max_length: int) -> List[int]:
+    """Powers of two below max_length: buckets hold lengths [1, 2), [2, 4), ... [2^k, max_length]"""
+    boundaries, length = [], 2
+    while length <= max_length:
+        boundaries.append(length)
+        length *= 2
+    return boundaries
+
+def make_sequence_dataset(
+    sequences: List[np.ndarray],
+    labels: List[np.ndarray],
+    batch_size: int = 64,
+    bucket_boundaries: Optional[List[int]] = None,
+    scaler=None,
+    shuffle: bool = True,
+    seed: int = 42
+) -> tf.data.Dataset:
+    """Variable-length histories batched by length bucket, yielding ((X, positions), y, weights).
+    
+    Sequences are grouped with others of similar length before padding, so a
+    batch is padded to its own longest history instead of the longest one
+    overall. Padding sits at the end and gets weight 0 in the loss; with a
+    causal model it is never attended to by real steps. bucket_boundaries=[]
+    puts everything in one bucket (plain padded batching).
+    """
+    n_features = sequences[0].shape[1]
+    if bucket_boundaries is None:
+        bucket_boundaries = default_bucket_boundaries(max(len(y) for y in labels))
+    mean = scaler.mean_ if scaler is not None else np.zeros(n_features)
+    scale = scaler.scale_ if scaler is not None else np.ones(n_features)
+    rng = np.random.default_rng(seed)
+    
+    def generate():
+        order = rng.permutation(len(sequences)) if shuffle else range(len(sequences))
+        for i in order:
+            yield ((sequences[i] - mean) / scale).astype(np.float32), labels[i].astype(np.int32)
+    
+    ds = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+        tf.TensorSpec(shape=(None,), dtype=tf.int32)
+    ))
+    ds = ds.bucket_by_sequence_length(
+        lambda X, y: tf.shape(y)[0],
+        bucket_boundaries=bucket_boundaries,
+        bucket_batch_sizes=[batch_size] * (len(bucket_boundaries) + 1),
+        padding_values=(0.0, -1)
+    )
+    
+    def weight(X, y):
+        # Step index within the history, (batch, steps, 1)
+        positions = tf.cast(tf.range(tf.shape(X)[1]), tf.float32)[None, :, None] * tf.ones_like(X[:, :, :1])
+        return (X, positions), tf.maximum(y, 0), tf.cast(y >= 0, tf.float32)
+    
+    return ds.map(weight, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+def padding_stats(dataset: tf.data.Dataset) -> Dict[str, Any]:
+    """Real and padded steps over one pass of a make_sequence_dataset pipeline"""
+    batches, steps, real = 0, 0, 0.0
+    for _, _, weights in dataset:
+        batches += 1
+        steps += int(tf.size(weights))
+        real += float(tf.reduce_sum(weights))
+    return {"batches": batches, "steps": steps, "padding_fraction": round(1 - real / max(steps, 1), 4)}
 
 class DeepLearningRiskDetector:
     """Deep Neural Network for risk detection"""
@@ -40,7 +250,8 @@ class DeepLearningRiskDetector:
         model.compile(
             optimizer=keras.optimizers.Adam(learning_rate=0.001),
             loss='sparse_categorical_crossentropy',
-            metrics=['accuracy', keras.metrics.Precision(), keras.metrics.Recall()]
+            # Precision()/Recall() are binary metrics and fail on sparse 4-class labels
+            metrics=['accuracy']
         )
         
         return model
@@ -80,6 +291,28 @@ class DeepLearningRiskDetector:
         
         return history.history
     
+    def train_on_shards(self, directory: str, epochs: int = 10, batch_size: int = 256, **pipeline_options) -> dict:
+        """Train from .npy shards through the tf.data pipeline (see fit_on_shards)"""
+        return fit_on_shards(self.model, directory, epochs=epochs, batch_size=batch_size, **pipeline_options)
+    
+    def fine_tune(
+        self,
+        X_new: np.ndarray,
+        y_new: np.ndarray,
+        epochs: int = 3,
+        batch_size: int = 32,
+        learning_rate: float = 1e-4
+    ) -> dict:
+        """Continue training on new data only, at a lower learning rate"""
+        # Fresh optimizer at a lower rate; the weights carry over from the checkpoint
+        self.model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        history = self.model.fit(X_new, y_new, epochs=epochs, batch_size=batch_size, verbose=0)
+        return history.history
+    
     def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """Make predictions"""
         predictions = self.model.predict(X)
@@ -158,3 +391,172 @@ class AttentionBasedRiskDetector:
         )
         
         return history.history
+    
+    def train_on_shards(self, directory: str, epochs: int = 10, batch_size: int = 256, **pipeline_options) -> dict:
+        """Train from .npy shards; rows are reshaped to sequences per batch in the pipeline"""
+        return fit_on_shards(
+            self.model, directory, epochs=epochs, batch_size=batch_size,
+            sequence_length=self.seq_length, **pipeline_options
+        )
+    
+    def fine_tune(
+        self,
+        X_new: np.ndarray,
+        y_new: np.ndarray,
+        epochs: int = 3,
+        batch_size: int = 32,
+        learning_rate: float = 1e-4
+    ) -> dict:
+        """Continue training on new data only, at a lower learning rate"""
+        X_new_seq = X_new.reshape(X_new.shape[0], self.seq_length, self.input_dim)
+        # Fresh optimizer at a lower rate; the weights carry over from the checkpoint
+        self.model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        history = self.model.fit(X_new_seq, y_new, epochs=epochs, batch_size=batch_size, verbose=0)
+        return history.history
+    
+    def save(self, path: str = "./ml/models/trained_models/attention_risk_detector.keras"):
+        """Save model"""
+        self.model.save(path)
+        print(f"Model saved to {path}")
+    
+    def load(self, path: str = "./ml/models/trained_models/attention_risk_detector.keras"):
+        """Load model"""
+        self.model = keras.models.load_model(path)
+        print(f"Model loaded from {path}")
+
+class HistoryAttentionRiskDetector(AttentionBasedRiskDetector):
+    """Causal attention over a user's assessment history, with a risk prediction at every step
+    
+    Each step may attend only to itself and earlier steps, so the prediction
+    for the latest assessment does not change when later ones arrive, and
+    the keys and values of past steps can be cached when serving (see
+    export_serving_weights and app.services.sequence_scorer). The step index
+    enters the keys only: it adds a bias linear in the key's position, which
+    softmax turns into a learned preference for recent assessments that
+    depends only on how far back a step is.
+    """
+    
+    def __init__(self, input_dim: int = 12, max_length: int = 16):
+        self.max_length = max_length
+        super().__init__(input_dim=input_dim, seq_length=None)
+    
+    def _build_model(self) -> keras.Model:
+        """Same block as AttentionBasedRiskDetector, causal, with a per-step classification head"""
+        inputs = layers.Input(shape=(None, self.input_dim))
+        positions = layers.Input(shape=(None, 1))
+        keys = layers.Concatenate()([inputs, positions])
+        
+        attention_output = layers.MultiHeadAttention(
+            num_heads=4,
+            key_dim=self.input_dim // 4,
+            name="attention"
+        )(inputs, inputs, key=keys, use_causal_mask=True)
+        
+        attention_output = layers.LayerNormalization(epsilon=1e-6, name="attention_norm")(attention_output + inputs)
+        
+        # Feed-forward
+        ffn_output = layers.Dense(64, activation='relu', name="ffn_hidden")(attention_output)
+        ffn_output = layers.Dense(self.input_dim, name="ffn_output")(ffn_output)
+        
+        output = layers.LayerNormalization(epsilon=1e-6, name="ffn_norm")(ffn_output + attention_output)
+        
+        # Classification head, applied to every step
+        output = layers.Dense(32, activation='relu', name="head_hidden")(output)
+        output = layers.Dropout(0.2)(output)
+        output = layers.Dense(4, activation='softmax', name="head_output")(output)
+        
+        model = keras.Model(inputs=[inputs, positions], outputs=output)
+        
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=0.001),
+            loss='sparse_categorical_crossentropy',
+            # Weighted, so padded steps do not count toward accuracy
+            weighted_metrics=['accuracy']
+        )
+        
+        return model
+    
+    def train_on_sequences(
+        self,
+        sequences: List[np.ndarray],
+        labels: List[np.ndarray],
+        validation: Optional[Tuple[List[np.ndarray], List[np.ndarray]]] = None,
+        epochs: int = 20,
+        batch_size: int = 64,
+        bucket_boundaries: Optional[List[int]] = None,
+        scaler=None
+    ) -> dict:
+        """Train on histories of at most max_length steps (training_data.split_windows)"""
+        train_ds = make_sequence_dataset(
+            sequences, labels, batch_size=batch_size, bucket_boundaries=bucket_boundaries, scaler=scaler
+        )
+        validation_ds = None
+        if validation is not None:
+            validation_ds = make_sequence_dataset(
+                *validation, batch_size=batch_size, bucket_boundaries=bucket_boundaries, scaler=scaler, shuffle=False
+            )
+        
+        throughput = ThroughputCallback(batch_size)
+        early_stopping = keras.callbacks.EarlyStopping(
+            monitor='val_loss' if validation_ds is not None else 'loss',
+            patience=5,
+            restore_best_weights=True
+        )
+        history = self.model.fit(
+            train_ds,
+            validation_data=validation_ds,
+            epochs=epochs,
+            callbacks=[early_stopping, throughput],
+            verbose=2
+        )
+        
+        return {**history.history, "padding": padding_stats(train_ds)}
+    
+    def predict_sequence(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities at every step of one (already scaled) history"""
+        positions = np.arange(len(X), dtype=np.float32)[None, :, None]
+        return self.model.predict([X[None].astype(np.float32), positions], verbose=0)[0]
+    
+    def export_serving_weights(self, scaler, feature_names: List[str]) -> Dict[str, Any]:
+        """Plain numpy weights for SequenceScorer, with the scaler folded in"""
+        attention = self.model.get_layer("attention")
+        query, key, value, output = (
+            attention._query_dense, attention._key_dense, attention._value_dense, attention._output_dense
+        )
+        weights = {
+            "query_kernel": query.kernel, "query_bias": query.bias,
+            "key_kernel": key.kernel, "key_bias": key.bias,
+            "value_kernel": value.kernel, "value_bias": value.bias,
+            "output_kernel": output.kernel, "output_bias": output.bias
+        }
+        for name in ("attention_norm", "ffn_norm"):
+            layer = self.model.get_layer(name)
+            weights[f"{name}_gamma"], weights[f"{name}_beta"] = layer.gamma, layer.beta
+        for name in ("ffn_hidden", "ffn_output", "head_hidden", "head_output"):
+            layer = self.model.get_layer(name)
+            weights[f"{name}_kernel"], weights[f"{name}_bias"] = layer.kernel, layer.bias
+        
+        return {
+            "kind": "attention_history",
+            "feature_names": list(feature_names),
+            "labels": RISK_LEVELS,
+            "max_length": self.max_length,
+            "epsilon": 1e-6,
+            "mean": np.asarray(scaler.mean_, dtype=np.float32),
+            "scale": np.asarray(scaler.scale_, dtype=np.float32),
+            "weights": {name: np.asarray(weight, dtype=np.float32) for name, weight in weights.items()}
+        }
+    
+    def save(self, path: str = "./ml/models/trained_models/attention_history_detector.keras"):
+        """Save model"""
+        self.model.save(path)
+        print(f"Model saved to {path}")
+    
+    def load(self, path: str = "./ml/models/trained_models/attention_history_detector.keras"):
+        """Load model"""
+        self.model = keras.models.load_model(path)
+        print(f"Model loaded from {path}")
@@ -0,0 +1,262 @@
+"""
+Distill the risk model ensemble into one compact serving model
+The teacher (random forest + gradient boosting + the Keras detectors that
+have checkpoints) labels a large transfer set with its averaged class
+probabilities; a small student is fitted to those soft labels and saved as
+risk_student.pkl for MLService. The teacher artifacts are left in place for
+offline auditing.
+
+Usage:
+    python distillation.py --rows 500000 --student mlp
+    python distillation.py --data-dir ./ml/data/history --student gbm
+"""
+import argparse
+import io
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from synthetic_data import generate
+from train_model import CALIBRATION_METHODS, fit_calibration, learner_scaler, update_calibration, write_model_bundle
+from training_data import FEATURE_NAMES, RISK_LEVELS, ShardedDataset, peak_memory_mb
+
+STUDENTS = ["mlp", "gbm"]
+STUDENT_FILE = "risk_student.pkl"
+
+def make_student(kind: str = "mlp", random_state: int = 42):
+    """Build a student on raw 0-10 item scores (scaling is part of the pipeline)"""
+    if kind == "mlp":
+        # Regresses the teacher's probability vector: soft-label distillation under squared error
+        return make_pipeline(StandardScaler(), MLPRegressor(
+            hidden_layer_sizes=(32,), max_iter=50, early_stopping=True, random_state=random_state
+        ))
+    if kind == "gbm":
+        # Depth-limited trees on the teacher's hard labels, weighted by its confidence
+        return make_pipeline(StandardScaler(), HistGradientBoostingClassifier(
+            max_depth=3, max_iter=100, early_stopping=False, random_state=random_state
+        ))
+    raise ValueError(f"student must be one of {STUDENTS}")
+
+def student_proba(model, X: np.ndarray) -> np.ndarray:
+    """Class probabilities from a student, renormalizing regressor outputs"""
+    if hasattr(model, "predict_proba"):
+        return model.predict_proba(X)
+    proba = np.clip(model.predict(X), 1e-6, None)
+    return proba / proba.sum(axis=1, keepdims=True)
+
+def _size_bytes(model) -> int:
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+class TeacherEnsemble:
+    """The saved ensemble, averaging class probabilities over every available model"""
+
+    def __init__(self, model_path: str = "./ml/models/trained_models", use_keras: bool = True):
+        self.model_path = model_path
+        self.scaler = joblib.load(os.path.join(model_path, "scaler.pkl"))
+        self.models: Dict[str, Any] = {}
+        for name in ("rf", "gb"):
+            path = os.path.join(model_path, f"risk_predictor_{name}.pkl")
+            if os.path.exists(path):
+                self.models[name] = joblib.load(path)
+        self.keras_models: Dict[str, Any] = {}
+        self.keras_scalers: Dict[str, Any] = {}
+        if use_keras:
+            self._load_keras()
+        if not self.models and not self.keras_models:
+            raise ValueError(f"No trained models in {model_path}")
+
+    def _load_keras(self):
+        checkpoints = [
+            (name, os.path.join(self.model_path, filename))
+            for name, filename in (("dl", "dl_risk_detector.h5"), ("attention", "attention_risk_detector.keras"))
+            if os.path.exists(os.path.join(self.model_path, filename))
+        ]
+        if not checkpoints:
+            return
+        try:
+            from tensorflow import keras
+        except ImportError:
+            return
+        for name, path in checkpoints:
+            self.keras_models[name] = keras.models.load_model(path)
+            self.keras_scalers[name] = learner_scaler(self.model_path, name, self.scaler)
+
+    @property
+    def members(self) -> List[str]:
+        return list(self.models) + list(self.keras_models)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Mean class probabilities for raw item scores"""
+        X_scaled = self.scaler.transform(X).astype(np.float32)
+        total = np.zeros((len(X), len(RISK_LEVELS)))
+        for model in self.models.values():
+            # Map onto all risk levels in case a model never saw one of them
+            total[:, model.classes_] += model.predict_proba(X_scaled)
+        for name, model in self.keras_models.items():
+            scaler = self.keras_scalers[name]
+            scaled = X_scaled if scaler is self.scaler else scaler.transform(X).astype(np.float32)
+            inputs = scaled.reshape((len(X),) + tuple(model.input_shape[1:]))
+            total += np.asarray(model.predict_on_batch(inputs))
+        return total / len(self.members)
+
+    def predict_proba_batched(self, X: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        return np.concatenate([self.predict_proba(X[i:i + batch_size]) for i in range(0, len(X), batch_size)])
+
+    def size_bytes(self) -> int:
+        """Size of the teacher's artifacts on disk"""
+        files = ["scaler.pkl"] + [f"risk_predictor_{name}.pkl" for name in self.models]
+        files += ["dl_risk_detector.h5" if name == "dl" else "attention_risk_detector.keras" for name in self.keras_models]
+        files += [f"scaler_{name}.pkl" for name in self.keras_models if self.keras_scalers[name] is not self.scaler]
+        return sum(os.path.getsize(os.path.join(self.model_path, filename)) for filename in files)
+
+def _latency_ms(predict, X: np.ndarray, batch_size: int, repeat: int) -> float:
+    """Median latency of one call on a batch"""
+    batch = X[:batch_size]
+    predict(batch)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict(batch)
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+def load_data(
+    rows: int = None,
+    holdout_rows: int = 20_000,
+    data_dir: str = None,
+    seed: int = 42
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Transfer rows for the teacher to label, plus a labeled holdout.
+
+    From shards, the newest holdout_rows rows are the holdout and up to
+    rows of the older ones are the transfer set; otherwise both are
+    synthetic, drawn from different seeds.
+    """
+    if data_dir:
+        dataset = ShardedDataset(data_dir)
+        holdout_start = max(dataset.n_rows - holdout_rows, 0)
+        stop = min(rows, holdout_start) if rows else holdout_start
+        X_transfer = np.concatenate([X for X, _ in dataset.iter_batches(100_000, stop=stop)])
+        holdout = list(dataset.iter_batches(100_000, start=holdout_start))
+        X_holdout = np.concatenate([X for X, _ in holdout])
+        y_holdout = np.concatenate([y for _, y in holdout]).astype(int)
+        return X_transfer.astype(np.float32), X_holdout.astype(np.float32), y_holdout
+
+    X_transfer = generate(rows or 200_000, seed=seed)[0]
+    X_holdout, y_holdout = generate(holdout_rows, seed=seed + 1)
+    return X_transfer, X_holdout, y_holdout.astype(int)
+
+def distill(
+    teacher: TeacherEnsemble,
+    X_transfer: np.ndarray,
+    X_holdout: np.ndarray,
+    y_holdout: np.ndarray,
+    kind: str = "mlp",
+    repeat: int = 50
+) -> Tuple[Any, Dict[str, Any]]:
+    """Fit a student to the teacher's soft labels and compare the two on a labeled holdout"""
+    start = time.perf_counter()
+    soft_labels = teacher.predict_proba_batched(X_transfer)
+    label_seconds = time.perf_counter() - start
+
+    student = make_student(kind)
+    start = time.perf_counter()
+    if kind == "mlp":
+        student.fit(X_transfer, soft_labels)
+    else:
+        student.fit(
+            X_transfer, soft_labels.argmax(axis=1),
+            histgradientboostingclassifier__sample_weight=soft_labels.max(axis=1)
+        )
+    fit_seconds = time.perf_counter() - start
+
+    teacher_pred = teacher.predict_proba_batched(X_holdout).argmax(axis=1)
+    student_pred = student_proba(student, X_holdout).argmax(axis=1)
+    teacher_accuracy = float(np.mean(teacher_pred == y_holdout))
+    student_accuracy = float(np.mean(student_pred == y_holdout))
+
+    latency = {}
+    for batch_size in (1, 64):
+        teacher_ms = _latency_ms(teacher.predict_proba, X_holdout, batch_size, repeat)
+        student_ms = _latency_ms(lambda X: student_proba(student, X), X_holdout, batch_size, repeat)
+        latency[str(batch_size)] = {
+            "teacher_ms": round(teacher_ms, 3),
+            "student_ms": round(student_ms, 3),
+            "speedup": round(teacher_ms / student_ms, 1)
+        }
+
+    teacher_bytes, student_bytes = teacher.size_bytes(), _size_bytes(student)
+    report = {
+        "student": kind,
+        "teacher_members": teacher.members,
+        "transfer_rows": int(len(X_transfer)),
+        "holdout_rows": int(len(y_holdout)),
+        "label_seconds": round(label_seconds, 2),
+        "fit_seconds": round(fit_seconds, 2),
+        "agreement": float(np.mean(teacher_pred == student_pred)),
+        "teacher_accuracy": teacher_accuracy,
+        "student_accuracy": student_accuracy,
+        "accuracy_delta": student_accuracy - teacher_accuracy,
+        "latency": latency,
+        "teacher_bytes": teacher_bytes,
+        "student_bytes": student_bytes,
+        "size_reduction": round(teacher_bytes / student_bytes, 1),
+        "peak_memory_mb": round(peak_memory_mb(), 1)
+    }
+    return student, report
+
+def save_student(student, report: Dict[str, Any], model_path: str = "./ml/models/trained_models"):
+    """Write risk_student.pkl, record it in the manifest and rebuild the bundle; teacher files are untouched"""
+    joblib.dump({
+        "kind": report["student"],
+        "model": student,
+        "feature_names": FEATURE_NAMES,
+        "labels": RISK_LEVELS
+    }, os.path.join(model_path, STUDENT_FILE))
+
+    manifest_path = os.path.join(model_path, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    manifest.setdefault("artifacts", {})["student"] = STUDENT_FILE
+    manifest["distillation"] = {"created_at": datetime.utcnow().isoformat(), **report}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    write_model_bundle(model_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill the ensemble into a compact serving model")
+    parser.add_argument("--student", choices=STUDENTS, default="mlp")
+    parser.add_argument("--rows", type=int, default=None, help="Transfer-set rows (default: 200000, or all with --data-dir)")
+    parser.add_argument("--data-dir", default=None, help="Label historical shards instead of synthetic rows")
+    parser.add_argument("--holdout-rows", type=int, default=20_000, help="Labeled rows for evaluation")
+    parser.add_argument("--model-path", default="./ml/models/trained_models")
+    parser.add_argument("--no-keras", action="store_true", help="Leave the Keras detectors out of the teacher")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--calibration", choices=CALIBRATION_METHODS, default="isotonic")
+    args = parser.parse_args()
+
+    teacher = TeacherEnsemble(args.model_path, use_keras=not args.no_keras)
+    print(f"Teacher: {', '.join(teacher.members)}")
+    X_transfer, X_holdout, y_holdout = load_data(args.rows, args.holdout_rows, args.data_dir, seed=args.seed)
+
+    student, report = distill(teacher, X_transfer, X_holdout, y_holdout, kind=args.student)
+    # Calibrated against true labels, which the student never saw
+    update_calibration(args.model_path, "student", fit_calibration(
+        student_proba(student, X_holdout), y_holdout, method=args.calibration
+    ))
+    save_student(student, report, args.model_path)
+    print(json.dumps(report, indent=2))
+    print(f"✓ Student saved to {os.path.join(args.model_path, STUDENT_FILE)}")
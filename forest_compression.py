@@ -0,0 +1,313 @@
+"""
+Post-training compression for the random forest
+Each level prunes deep or sparsely populated nodes, merges sibling leaves
+that vote for the same class, keeps a greedily selected subset of trees and
+stores thresholds and leaf probabilities in smaller dtypes when that does
+not change predictions. The result is a CompactForest (flattened arrays)
+instead of a pickled RandomForestClassifier.
+
+Usage:
+    python forest_compression.py --level medium
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from synthetic_data import generate
+from training_data import ShardedDataset
+from train_model import CALIBRATION_METHODS, fit_calibration, update_calibration, write_model_bundle
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from app.services.compact_forest import CompactForest
+
+COMPACT_FILE = "risk_predictor_rf_compact.pkl"
+
+# max_depth / min_samples prune, merge_leaves collapses same-class siblings,
+# tree_fraction keeps the best trees, dtypes are tried smallest-first
+COMPRESSION_LEVELS = {
+    "lossless": {
+        "max_depth": None, "min_samples": 0, "merge_leaves": False, "tree_fraction": 1.0,
+        "threshold_dtypes": ["float32"], "leaf_dtype": "float32"
+    },
+    "light": {
+        "max_depth": None, "min_samples": 0, "merge_leaves": True, "tree_fraction": 1.0,
+        "threshold_dtypes": ["uint8", "float16", "float32"], "leaf_dtype": "uint8"
+    },
+    "medium": {
+        "max_depth": 14, "min_samples": 5, "merge_leaves": True, "tree_fraction": 0.5,
+        "threshold_dtypes": ["uint8", "float16", "float32"], "leaf_dtype": "uint8"
+    },
+    "aggressive": {
+        "max_depth": 10, "min_samples": 20, "merge_leaves": True, "tree_fraction": 0.25,
+        "threshold_dtypes": ["uint8", "float16", "float32"], "leaf_dtype": "uint8"
+    }
+}
+
+def _size_bytes(model) -> int:
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+def _round_down(values: np.ndarray, dtype) -> np.ndarray:
+    """Largest representable value <= each threshold, so float32 inputs split exactly as in sklearn"""
+    rounded = values.astype(dtype)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.array(-np.inf, dtype=dtype))
+    return rounded
+
+def flatten_tree(tree, max_depth: int = None, min_samples: float = 0, merge_leaves: bool = False) -> List[Tuple]:
+    """Nodes of one sklearn tree in depth-first order as (feature, threshold, right, value, cover).
+
+    right is relative to the returned list (the left child is the next
+    node); leaves have feature -1 and point right at themselves.
+    """
+    t = tree.tree_
+    # sklearn < 1.4 stores class counts per node, later versions fractions; normalize both
+    values = t.value[:, 0, :] / t.value[:, 0, :].sum(axis=1, keepdims=True)
+
+    def build(node: int, depth: int) -> List[list]:
+        leaf = [[-1, 0.0, 0, values[node], t.weighted_n_node_samples[node]]]
+        if (
+            t.children_left[node] == -1
+            or (max_depth is not None and depth >= max_depth)
+            or t.weighted_n_node_samples[node] < min_samples
+        ):
+            return leaf
+        left = build(t.children_left[node], depth + 1)
+        right = build(t.children_right[node], depth + 1)
+        if merge_leaves and len(left) == 1 and len(right) == 1 and left[0][3].argmax() == right[0][3].argmax():
+            # Both halves vote the same way, so the split never changes this tree's vote
+            return leaf
+        # Shift child indices past this node (and the left subtree, for the right one)
+        for entry in left:
+            entry[2] += 1
+        for entry in right:
+            entry[2] += 1 + len(left)
+        return [[t.feature[node], t.threshold[node], 1 + len(left), values[node], t.weighted_n_node_samples[node]]] + left + right
+
+    nodes = build(0, 0)
+    for i, entry in enumerate(nodes):
+        if entry[0] == -1:
+            entry[2] = i
+    return [tuple(entry) for entry in nodes]
+
+def select_trees(tree_proba: np.ndarray, y: np.ndarray, n_keep: int) -> List[int]:
+    """Greedy forward selection: add the tree that most improves the subset's accuracy.
+
+    Ties go to the tree that raises the probability of the true class most.
+    """
+    n_trees, n_samples, _ = tree_proba.shape
+    true_class = tree_proba[:, np.arange(n_samples), y]
+    selected: List[int] = []
+    total = np.zeros(tree_proba.shape[1:])
+    remaining = list(range(n_trees))
+    for _ in range(min(n_keep, n_trees)):
+        candidates = total[None] + tree_proba[remaining]
+        accuracy = (candidates.argmax(axis=2) == y).mean(axis=1)
+        margin = (total[np.arange(n_samples), y][None] + true_class[remaining]).mean(axis=1)
+        best = remaining[int(np.lexsort((margin, accuracy))[-1])]
+        selected.append(best)
+        total += tree_proba[best]
+        remaining.remove(best)
+    return sorted(selected)
+
+def build_compact(
+    rf: RandomForestClassifier,
+    tree_indices: List[int],
+    threshold_dtype: str,
+    leaf_dtype: str,
+    **prune_options
+) -> CompactForest:
+    """Flatten the selected trees into one CompactForest"""
+    trees = [flatten_tree(rf.estimators_[i], **prune_options) for i in tree_indices]
+    roots = np.cumsum([0] + [len(nodes) for nodes in trees[:-1]]).astype(np.int32)
+    nodes = [node for tree_nodes in trees for node in tree_nodes]
+    offsets = np.concatenate([np.full(len(tree_nodes), root) for root, tree_nodes in zip(roots, trees)])
+
+    feature = np.array([node[0] for node in nodes])
+    leaf = feature == -1
+    threshold = np.array([node[1] for node in nodes], dtype=np.float64)
+    right = (np.array([node[2] for node in nodes]) + offsets).astype(np.int32)
+    value = np.stack([node[3] for node in nodes])
+    cover = np.array([node[4] for node in nodes], dtype=np.float64)
+    # Cover as a fraction of each tree's root, which fits float16 and is all explanations need
+    cover = (cover / cover[np.repeat(roots, [len(tree_nodes) for tree_nodes in trees])]).astype(np.float16)
+
+    bin_edges = None
+    if threshold_dtype == "uint8":
+        bin_edges = [np.unique(_round_down(threshold[~leaf & (feature == j)], np.float32)) for j in range(rf.n_features_in_)]
+        if max(len(edges) for edges in bin_edges) > 255:
+            raise ValueError("too many distinct thresholds per feature for uint8 codes")
+        codes = np.zeros(len(nodes), dtype=np.uint8)
+        for j, edges in enumerate(bin_edges):
+            mask = ~leaf & (feature == j)
+            codes[mask] = np.searchsorted(edges, _round_down(threshold[mask], np.float32)) + 1
+        threshold = codes
+    else:
+        threshold = _round_down(np.where(leaf, -np.inf, threshold), np.dtype(threshold_dtype))
+
+    if leaf_dtype == "uint8":
+        value = np.rint(value * 255).astype(np.uint8)
+    else:
+        value = value.astype(np.float32)
+    value[~leaf] = 0
+
+    depth = max(_tree_depth(tree_nodes) for tree_nodes in trees)
+    return CompactForest(
+        classes=rf.classes_,
+        n_features=rf.n_features_in_,
+        roots=roots,
+        feature=np.where(leaf, 0, feature).astype(np.uint8 if rf.n_features_in_ <= 256 else np.int32),
+        threshold=threshold,
+        right=right,
+        value=value,
+        cover=cover,
+        max_depth=depth,
+        bin_edges=bin_edges
+    )
+
+def _tree_depth(nodes: List[Tuple]) -> int:
+    depth = np.zeros(len(nodes), dtype=int)
+    for i, (feature, _, right, _, _) in enumerate(nodes):
+        if feature != -1:
+            depth[i + 1] = depth[right] = depth[i] + 1
+    return int(depth.max())
+
+def compress_forest(
+    rf: RandomForestClassifier,
+    X_select: np.ndarray,
+    y_select: np.ndarray,
+    level: str = "medium"
+) -> Tuple[CompactForest, Dict[str, Any]]:
+    """Compress rf at a level; X_select/y_select choose trees and check dtype safety"""
+    options = COMPRESSION_LEVELS[level]
+    prune_options = {
+        "max_depth": options["max_depth"],
+        "min_samples": options["min_samples"],
+        "merge_leaves": options["merge_leaves"]
+    }
+
+    n_keep = max(1, int(round(len(rf.estimators_) * options["tree_fraction"])))
+    if n_keep < len(rf.estimators_):
+        # Score each pruned tree alone, then pick the subset on the selection rows
+        pruned = build_compact(rf, list(range(len(rf.estimators_))), "float32", "float32", **prune_options)
+        leaves = pruned.apply(X_select)
+        tree_proba = pruned.value[leaves].transpose(1, 0, 2)
+        tree_indices = select_trees(tree_proba, np.searchsorted(rf.classes_, y_select), n_keep)
+    else:
+        tree_indices = list(range(len(rf.estimators_)))
+
+    reference = build_compact(rf, tree_indices, "float32", options["leaf_dtype"], **prune_options)
+    expected = reference.predict(X_select)
+    for threshold_dtype in options["threshold_dtypes"]:
+        # A smaller dtype is safe only if it leaves every prediction on the selection rows unchanged
+        try:
+            compact = build_compact(rf, tree_indices, threshold_dtype, options["leaf_dtype"], **prune_options)
+        except ValueError:
+            continue
+        if threshold_dtype == "float32" or np.array_equal(compact.predict(X_select), expected):
+            break
+
+    return compact, {
+        "level": level,
+        "n_trees": compact.n_trees,
+        "n_nodes": compact.n_nodes,
+        "max_depth": compact.max_depth,
+        "threshold_dtype": threshold_dtype,
+        "leaf_dtype": options["leaf_dtype"]
+    }
+
+def _latency_ms(model, X: np.ndarray, batch_size: int, repeat: int) -> float:
+    batch = X[:batch_size]
+    model.predict_proba(batch)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict_proba(batch)
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+def compression_report(
+    rf: RandomForestClassifier,
+    X_val: np.ndarray,
+    y_val: np.ndarray,
+    levels: List[str] = None,
+    repeat: int = 20
+) -> Tuple[Dict[str, CompactForest], List[Dict[str, Any]]]:
+    """Size, accuracy, agreement and latency per level, evaluated on rows not used for selection"""
+    half = len(y_val) // 2
+    X_select, y_select, X_eval, y_eval = X_val[:half], y_val[:half], X_val[half:], y_val[half:]
+    rf_pred = rf.predict(X_eval)
+
+    def measure(model) -> Dict[str, Any]:
+        return {
+            "bytes": _size_bytes(model),
+            "accuracy": float(np.mean(model.predict(X_eval) == y_eval)),
+            "agreement": float(np.mean(model.predict(X_eval) == rf_pred)),
+            "latency_ms": {str(b): round(_latency_ms(model, X_eval, b, repeat), 3) for b in (1, 64, 4096)}
+        }
+
+    report = [{"level": "original", "n_trees": len(rf.estimators_), **measure(rf)}]
+    models = {}
+    for level in levels or list(COMPRESSION_LEVELS):
+        models[level], info = compress_forest(rf, X_select, y_select, level)
+        report.append({**info, **measure(models[level])})
+    for entry in report:
+        entry["size_reduction"] = round(report[0]["bytes"] / entry["bytes"], 1)
+        entry["accuracy_delta"] = entry["accuracy"] - report[0]["accuracy"]
+    return models, report
+
+def save_compact(compact: CompactForest, report: List[Dict[str, Any]], level: str,
+                 model_path: str = "./ml/models/trained_models"):
+    """Write the compact forest next to the original, record it in the manifest and rebuild the bundle"""
+    joblib.dump(compact, os.path.join(model_path, COMPACT_FILE))
+    manifest_path = os.path.join(model_path, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest.setdefault("artifacts", {})["rf_compact"] = COMPACT_FILE
+    manifest["rf_compression"] = {"created_at": datetime.utcnow().isoformat(), "level": level, "report": report}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    write_model_bundle(model_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress the trained random forest")
+    parser.add_argument("--level", choices=list(COMPRESSION_LEVELS), default="medium", help="Level to save")
+    parser.add_argument("--rows", type=int, default=20_000, help="Validation rows (half select, half evaluate)")
+    parser.add_argument("--data-dir", default=None, help="Validate on the newest rows of these shards instead of synthetic rows")
+    parser.add_argument("--model-path", default="./ml/models/trained_models")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--calibration", choices=CALIBRATION_METHODS, default="isotonic")
+    args = parser.parse_args()
+
+    rf = joblib.load(os.path.join(args.model_path, "risk_predictor_rf.pkl"))
+    scaler = joblib.load(os.path.join(args.model_path, "scaler.pkl"))
+    if args.data_dir:
+        dataset = ShardedDataset(args.data_dir)
+        batches = list(dataset.iter_batches(100_000, start=max(dataset.n_rows - args.rows, 0)))
+        X_val = np.concatenate([X for X, _ in batches])
+        y_val = np.concatenate([y for _, y in batches]).astype(int)
+        # Shuffle so the selection and evaluation halves cover the same period
+        order = np.random.default_rng(args.seed).permutation(len(y_val))
+        X_val, y_val = X_val[order], y_val[order]
+    else:
+        X_val, y_val = generate(args.rows, seed=args.seed)
+        y_val = y_val.astype(int)
+    X_val = scaler.transform(X_val).astype(np.float32)
+
+    models, report = compression_report(rf, X_val, y_val)
+    # Pruned forests shift probabilities, so the compact forest gets its own calibration maps
+    calibration = fit_calibration(models[args.level].predict_proba(X_val), y_val, method=args.calibration)
+    update_calibration(args.model_path, "rf_compact", calibration)
+    save_compact(models[args.level], report, args.level, args.model_path)
+    print(json.dumps(report, indent=2))
+    print(f"✓ Saved the {args.level} forest to {os.path.join(args.model_path, COMPACT_FILE)}")
@@ -0,0 +1,235 @@
+"""
+Hyperparameter search for the risk models
+Grid, random and successive-halving search over cross-validation folds.
+Trials run on a process pool; scaled fold datasets and per-trial fold scores
+are cached on disk, so an interrupted search resumes where it stopped.
+"""
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+import numpy as np
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+from train_model import make_gb_model, make_rf_model
+
+STRATEGIES = ["grid", "random", "halving"]
+
+# Search spaces per model; gradient boosting parameters depend on the backend
+SEARCH_SPACES = {
+    "rf": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [None, 10, 20],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": ["sqrt", 0.5]
+    },
+    "gb:classic": {
+        "n_estimators": [100, 200],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "max_depth": [2, 3, 5]
+    },
+    "gb:hist": {
+        "max_iter": [100, 200, 400],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "max_leaf_nodes": [15, 31, 63],
+        "l2_regularization": [0.0, 1.0]
+    },
+    "gb:lightgbm": {
+        "n_estimators": [100, 200, 400],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "num_leaves": [15, 31, 63]
+    }
+}
+
+def _digest(*parts) -> str:
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True).encode("utf-8"))
+    return hasher.hexdigest()[:16]
+
+def _write_json(path: str, payload: Dict[str, Any]):
+    # Write-then-rename so an interrupted run never leaves a truncated result
+    with open(path + ".tmp", "w") as f:
+        json.dump(payload, f)
+    os.replace(path + ".tmp", path)
+
+def _evaluate(task: Dict[str, Any]) -> Dict[str, Any]:
+    # Module-level so it can be pickled to pool workers
+    fold = np.load(task["fold_path"])
+    X_train, y_train = fold["X_train"], fold["y_train"]
+
+    if task["n_samples"] < len(y_train):
+        # Successive-halving budget: a fixed random subset of the training fold
+        subset = np.sort(np.random.default_rng(task["fold"]).permutation(len(y_train))[:task["n_samples"]])
+        X_train, y_train = X_train[subset], y_train[subset]
+
+    if task["model"] == "rf":
+        # One core per trial; the pool provides the parallelism
+        estimator = make_rf_model(**{**task["params"], "n_jobs": 1})
+    else:
+        estimator = make_gb_model(task["gb_backend"], **task["params"])
+
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    score = get_scorer(task["scoring"])(estimator, fold["X_val"], fold["y_val"])
+
+    result = {"score": float(score), "fit_seconds": round(fit_seconds, 3)}
+    _write_json(task["result_path"], result)
+    return result
+
+class HyperparameterSearch:
+    """Cross-validated search whose folds and trial scores are cached on disk"""
+
+    def __init__(
+        self,
+        model: str = "rf",
+        strategy: str = "random",
+        gb_backend: str = "hist",
+        n_trials: int = 20,
+        n_folds: int = 3,
+        halving_factor: int = 3,
+        min_samples: int = 2000,
+        scoring: str = "accuracy",
+        workers: int = None,
+        cache_dir: str = "./ml/cache/hpsearch",
+        seed: int = 42,
+        search_space: Dict[str, List[Any]] = None
+    ):
+        if model not in ("rf", "gb"):
+            raise ValueError("model must be 'rf' or 'gb'")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"strategy must be one of {STRATEGIES}")
+        self.model = model
+        self.strategy = strategy
+        self.gb_backend = gb_backend
+        self.n_trials = n_trials
+        self.n_folds = n_folds
+        self.halving_factor = halving_factor
+        self.min_samples = min_samples
+        self.scoring = scoring
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.seed = seed
+        self.search_space = search_space or SEARCH_SPACES[model if model == "rf" else f"gb:{gb_backend}"]
+
+    def candidates(self) -> List[Dict[str, Any]]:
+        """Parameter sets to try: the full grid, or a seeded sample of it"""
+        names = sorted(self.search_space)
+        grid = [dict(zip(names, values)) for values in itertools.product(*(self.search_space[n] for n in names))]
+        if self.strategy == "grid" or self.n_trials >= len(grid):
+            return grid
+        order = np.random.default_rng(self.seed).permutation(len(grid))[:self.n_trials]
+        return [grid[i] for i in sorted(order)]
+
+    def prepare_folds(self, X: np.ndarray, y: np.ndarray) -> List[str]:
+        """Write scaled train/validation arrays per fold, reusing them if cached"""
+        data_key = _digest(np.ascontiguousarray(X).tobytes(), np.ascontiguousarray(y).tobytes(), self.n_folds, self.seed)
+        directory = os.path.join(self.cache_dir, "folds", data_key)
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, f"fold-{k}.npz") for k in range(self.n_folds)]
+        if all(os.path.exists(path) for path in paths):
+            return paths
+
+        splitter = StratifiedKFold(n_splits=self.n_folds, shuffle=True, random_state=self.seed)
+        for path, (train_index, val_index) in zip(paths, splitter.split(X, y)):
+            if os.path.exists(path):
+                continue
+            # Scaler is fitted on the training fold only, as in real training
+            scaler = StandardScaler().fit(X[train_index])
+            with open(path + ".tmp", "wb") as f:
+                np.savez(
+                    f,
+                    X_train=scaler.transform(X[train_index]).astype(np.float32), y_train=y[train_index],
+                    X_val=scaler.transform(X[val_index]).astype(np.float32), y_val=y[val_index]
+                )
+            os.replace(path + ".tmp", path)
+        return paths
+
+    def _run_trials(self, candidates: List[Dict[str, Any]], fold_paths: List[str], n_samples: int) -> List[Dict[str, Any]]:
+        """Mean fold score per candidate, running only trials with no cached result"""
+        trial_dir = os.path.join(self.cache_dir, "trials")
+        os.makedirs(trial_dir, exist_ok=True)
+        scores: Dict[int, List[Dict[str, Any]]] = {i: [] for i in range(len(candidates))}
+        pending = []
+
+        for i, params in enumerate(candidates):
+            for fold, fold_path in enumerate(fold_paths):
+                key = _digest(self.model, self.gb_backend, params, fold_path, n_samples, self.scoring)
+                result_path = os.path.join(trial_dir, f"{key}.json")
+                if os.path.exists(result_path):
+                    with open(result_path) as f:
+                        scores[i].append({**json.load(f), "cached": True})
+                    continue
+                pending.append((i, {
+                    "model": self.model, "gb_backend": self.gb_backend, "params": params,
+                    "fold": fold, "fold_path": fold_path, "n_samples": n_samples,
+                    "scoring": self.scoring, "result_path": result_path
+                }))
+
+        if pending and self.workers > 1:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)), mp_context=context) as executor:
+                futures = {executor.submit(_evaluate, task): i for i, task in pending}
+                for future in as_completed(futures):
+                    scores[futures[future]].append({**future.result(), "cached": False})
+        else:
+            for i, task in pending:
+                scores[i].append({**_evaluate(task), "cached": False})
+
+        return [
+            {
+                "params": params,
+                "n_samples": n_samples,
+                "score": float(np.mean([s["score"] for s in scores[i]])),
+                "score_std": float(np.std([s["score"] for s in scores[i]])),
+                "fit_seconds": float(np.sum([s["fit_seconds"] for s in scores[i]])),
+                "cached_folds": sum(1 for s in scores[i] if s["cached"])
+            }
+            for i, params in enumerate(candidates)
+        ]
+
+    def run(self, X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+        """Search and return the best parameters with every trial's score"""
+        start = time.perf_counter()
+        fold_paths = self.prepare_folds(X, y)
+        full_samples = len(y) - len(y) // self.n_folds
+        candidates = self.candidates()
+        trials: List[Dict[str, Any]] = []
+
+        if self.strategy == "halving":
+            # Each rung keeps the best 1/factor of candidates and multiplies their budget by factor
+            n_samples = min(self.min_samples, full_samples)
+            while True:
+                rung = self._run_trials(candidates, fold_paths, n_samples)
+                trials.extend(rung)
+                if len(candidates) <= 1 or n_samples >= full_samples:
+                    break
+                keep = max(1, len(candidates) // self.halving_factor)
+                candidates = [t["params"] for t in sorted(rung, key=lambda t: -t["score"])[:keep]]
+                n_samples = min(n_samples * self.halving_factor, full_samples)
+            final = [t for t in trials if t["n_samples"] == n_samples]
+        else:
+            trials = self._run_trials(candidates, fold_paths, full_samples)
+            final = trials
+
+        best = max(final, key=lambda t: t["score"])
+        return {
+            "model": self.model,
+            "gb_backend": self.gb_backend if self.model == "gb" else None,
+            "strategy": self.strategy,
+            "scoring": self.scoring,
+            "n_folds": self.n_folds,
+            "best_params": best["params"],
+            "best_score": best["score"],
+            "trials": sorted(trials, key=lambda t: (-t["n_samples"], -t["score"])),
+            "cached_folds": sum(t["cached_folds"] for t in trials),
+            "elapsed_seconds": round(time.perf_counter() - start, 2)
+        }
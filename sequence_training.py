@@ -0,0 +1,170 @@
+"""
+Train the history-aware attention model on per-user assessment sequences
+Histories come from the database (Assessment joined with RiskScore) or the
+synthetic generator, are split by user into training and holdout sets, cut
+into windows of at most --max-length assessments and batched by length
+bucket. The trained model is exported as numpy weights (risk_sequence.pkl)
+for SequenceScorer, which caches each user's attention keys and values.
+
+Usage:
+    python sequence_training.py --users 20000 --epochs 20
+    python sequence_training.py --from-db --max-length 16
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from deep_learning_model import (
+    HistoryAttentionRiskDetector, configure_cpu_threads, make_sequence_dataset, padding_stats
+)
+from synthetic_data import generate_sequences
+from train_model import write_model_bundle
+from training_data import FEATURE_NAMES, DatabaseSequenceSource, peak_memory_mb, split_windows
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from app.services.sequence_scorer import SequenceScorer
+
+SEQUENCE_FILE = "risk_sequence.pkl"
+SEQUENCE_CHECKPOINT = "attention_history_detector.keras"
+
+def split_users(
+    sequences: List[np.ndarray], labels: List[np.ndarray], holdout_fraction: float = 0.2, seed: int = 42
+) -> Tuple[Tuple[list, list], Tuple[list, list]]:
+    """Hold out whole users, so no history is split between training and evaluation"""
+    order = np.random.default_rng(seed).permutation(len(sequences))
+    n_holdout = max(1, int(len(order) * holdout_fraction))
+    pick = lambda items, idx: [items[i] for i in idx]
+    train, holdout = order[n_holdout:], order[:n_holdout]
+    return (pick(sequences, train), pick(labels, train)), (pick(sequences, holdout), pick(labels, holdout))
+
+def evaluate(scorer: SequenceScorer, sequences: List[np.ndarray], labels: List[np.ndarray]) -> Dict[str, Any]:
+    """Score holdout histories step by step through the cache, as serving does, against single-step scoring"""
+    with_history, single_step, step_ms = [], [], []
+    for user, (X, y) in enumerate(zip(sequences, labels)):
+        for t in range(len(y)):
+            start = time.perf_counter()
+            proba, _ = scorer.score(("holdout", user), X[t])
+            step_ms.append((time.perf_counter() - start) * 1000)
+            with_history.append(np.argmax(proba) == y[t])
+        single_step.extend(scorer.predict_sequence(X[t:t + 1])[0].argmax() == y[t] for t in range(len(y)))
+
+    # Re-running a full window per assessment is what the cache avoids
+    window = next((X[:scorer.max_length] for X in sequences if len(X) >= scorer.max_length), sequences[0])
+    start = time.perf_counter()
+    for _ in range(100):
+        scorer.predict_sequence(window)
+    full_ms = (time.perf_counter() - start) * 10
+
+    return {
+        "holdout_users": len(sequences),
+        "holdout_steps": len(with_history),
+        "accuracy": float(np.mean(with_history)),
+        "accuracy_single_step": float(np.mean(single_step)),
+        "cached_step_ms": round(float(np.median(step_ms)), 3),
+        f"full_window_ms_{len(window)}_steps": round(full_ms, 3)
+    }
+
+def train_sequence_model(
+    sequences: List[np.ndarray],
+    labels: List[np.ndarray],
+    max_length: int = 16,
+    epochs: int = 20,
+    batch_size: int = 64,
+    seed: int = 42
+) -> Tuple[HistoryAttentionRiskDetector, StandardScaler, Dict[str, Any]]:
+    """Fit the detector on training users and evaluate the exported scorer on held-out users"""
+    (train_X, train_y), (holdout_X, holdout_y) = split_users(sequences, labels, seed=seed)
+    scaler = StandardScaler().fit(np.concatenate(train_X))
+    windows = split_windows(train_X, train_y, max_length)
+    validation = split_windows(holdout_X, holdout_y, max_length)
+
+    detector = HistoryAttentionRiskDetector(input_dim=len(FEATURE_NAMES), max_length=max_length)
+    start = time.perf_counter()
+    history = detector.train_on_sequences(
+        *windows, validation=validation, epochs=epochs, batch_size=batch_size, scaler=scaler
+    )
+    fit_seconds = time.perf_counter() - start
+
+    # One bucket for every length is plain padded batching
+    unbucketed = padding_stats(make_sequence_dataset(*windows, batch_size=batch_size, bucket_boundaries=[], scaler=scaler))
+    weights = detector.export_serving_weights(scaler, FEATURE_NAMES)
+    scorer = SequenceScorer(weights, cache_size=len(holdout_X) + 1)
+
+    # The numpy forward pass must reproduce Keras
+    sample = validation[0][:32]
+    serving_diff = max(
+        float(np.abs(scorer.predict_sequence(X) - detector.predict_sequence(scorer.scale_features(X))).max())
+        for X in sample
+    )
+
+    report = {
+        "users": len(sequences),
+        "training_windows": len(windows[0]),
+        "max_length": max_length,
+        "epochs": len(history["loss"]),
+        "fit_seconds": round(fit_seconds, 1),
+        "val_accuracy": history["val_accuracy"][-1],
+        "padding": {"bucketed": history["padding"], "unbucketed": unbucketed},
+        "serving_max_abs_diff": serving_diff,
+        **evaluate(scorer, holdout_X, holdout_y),
+        "peak_memory_mb": round(peak_memory_mb(), 1)
+    }
+    return detector, scaler, report
+
+def save_sequence_model(
+    detector: HistoryAttentionRiskDetector,
+    scaler: StandardScaler,
+    report: Dict[str, Any],
+    model_path: str = "./ml/models/trained_models"
+):
+    """Write the serving weights and Keras checkpoint, record them in the manifest and rebuild the bundle"""
+    joblib.dump(detector.export_serving_weights(scaler, FEATURE_NAMES), os.path.join(model_path, SEQUENCE_FILE))
+    detector.save(os.path.join(model_path, SEQUENCE_CHECKPOINT))
+
+    manifest_path = os.path.join(model_path, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest.setdefault("artifacts", {})["sequence"] = SEQUENCE_FILE
+    manifest["sequence_model"] = {"created_at": datetime.utcnow().isoformat(), **report}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    write_model_bundle(model_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the history-aware attention model")
+    parser.add_argument("--from-db", action="store_true", help="Read assessment histories from DATABASE_URL")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="completed_at >= START")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="completed_at < END")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per database fetch")
+    parser.add_argument("--users", type=int, default=20_000, help="Synthetic users when not reading the database")
+    parser.add_argument("--max-length", type=int, default=16, help="Assessments attended to per prediction")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="TensorFlow intra-op threads (0 = default)")
+    parser.add_argument("--inter-op-threads", type=int, default=0, help="TensorFlow inter-op threads (0 = default)")
+    parser.add_argument("--model-path", default="./ml/models/trained_models")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configure_cpu_threads(args.intra_op_threads, args.inter_op_threads)
+    if args.from_db:
+        source = DatabaseSequenceSource(chunk_size=args.chunk_size, start=args.start, end=args.end)
+        sequences, labels = source.to_sequences()
+    else:
+        sequences, labels = generate_sequences(args.users, max_assessments=4 * args.max_length, seed=args.seed)
+    print(f"{len(sequences)} users, {sum(len(y) for y in labels)} assessments")
+
+    detector, scaler, report = train_sequence_model(
+        sequences, labels, max_length=args.max_length, epochs=args.epochs, batch_size=args.batch_size, seed=args.seed
+    )
+    save_sequence_model(detector, scaler, report, args.model_path)
+    print(json.dumps(report, indent=2))
+    print(f"✓ Sequence model saved to {os.path.join(args.model_path, SEQUENCE_FILE)}")
@@ -0,0 +1,210 @@
+"""
+Synthetic assessment data for training and load tests
+Vectorized and seeded: symptoms share a latent severity factor so they are
+correlated like real questionnaires, labels follow the same mean-score rule
+as the original generator, and class balance can be set explicitly. Large
+datasets are written as .npy or Parquet shards by a process pool.
+
+Usage:
+    python synthetic_data.py ./ml/data/synthetic --rows 10000000 --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from training_data import FEATURE_NAMES, RISK_LEVELS, ShardWriter, peak_memory_mb
+
+# Mean item score thresholds between low / medium / high / critical
+LABEL_THRESHOLDS = [3, 5, 7]
+
+# How strongly each item loads on the latent severity factor
+DEFAULT_LOADINGS = {
+    "sleep_quality": 0.65, "anxiety_level": 0.80, "social_isolation": 0.70,
+    "stress_level": 0.80, "physical_health": 0.50, "substance_use": 0.45,
+    "self_harm_thoughts": 0.60, "concentration": 0.65, "appetite_change": 0.50,
+    "energy_level": 0.65, "hopelessness": 0.85, "irritability": 0.60
+}
+
+def label_scores(X: np.ndarray) -> np.ndarray:
+    """Risk class per row from the mean item score"""
+    return np.digitize(X.mean(axis=1), LABEL_THRESHOLDS).astype(np.int8)
+
+def _draw(rng: np.random.Generator, n: int, loadings: np.ndarray, severity: np.ndarray = None) -> np.ndarray:
+    if severity is None:
+        severity = rng.standard_normal((n, 1))
+    noise = rng.standard_normal((n, len(loadings)))
+    latent = severity * loadings + noise * np.sqrt(1 - loadings ** 2)
+    return np.clip(np.rint(5 + 2.5 * latent), 0, 10).astype(np.float32)
+
+def generate(
+    n_samples: int,
+    seed: Optional[int] = None,
+    class_weights: Optional[Sequence[float]] = None,
+    feature_names: List[str] = None,
+    rng: np.random.Generator = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Generate (X, y); class_weights=None keeps the natural class mix.
+
+    With class_weights, rows are drawn in vectorized batches and kept per
+    class until each class has its share (rejection sampling).
+    """
+    feature_names = feature_names or FEATURE_NAMES
+    loadings = np.array([DEFAULT_LOADINGS.get(name, 0.6) for name in feature_names])
+    rng = rng or np.random.default_rng(seed)
+
+    if class_weights is None:
+        X = _draw(rng, n_samples, loadings)
+        return X, label_scores(X)
+
+    weights = np.asarray(class_weights, dtype=float)
+    if len(weights) != len(RISK_LEVELS) or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError(f"class_weights needs {len(RISK_LEVELS)} non-negative values")
+    targets = np.floor(weights / weights.sum() * n_samples).astype(int)
+    targets[np.argmax(weights)] += n_samples - targets.sum()
+
+    X = np.empty((n_samples, len(feature_names)), dtype=np.float32)
+    y = np.empty(n_samples, dtype=np.int8)
+    filled = np.zeros(len(RISK_LEVELS), dtype=int)
+    offsets = np.concatenate([[0], np.cumsum(targets)[:-1]])
+
+    for _ in range(1000):
+        missing = targets - filled
+        if not missing.any():
+            break
+        batch = _draw(rng, max(int(missing.sum()) * 4, 1024), loadings)
+        labels = label_scores(batch)
+        for label in np.flatnonzero(missing):
+            rows = batch[labels == label][:missing[label]]
+            start = offsets[label] + filled[label]
+            X[start:start + len(rows)] = rows
+            y[start:start + len(rows)] = label
+            filled[label] += len(rows)
+    else:
+        raise ValueError("class_weights too extreme to satisfy by sampling")
+
+    # Interleave classes so shards and batches are not sorted by label
+    order = rng.permutation(n_samples)
+    return X[order], y[order]
+
+def generate_sequences(
+    n_users: int,
+    mean_assessments: float = 6,
+    max_assessments: int = 64,
+    persistence: float = 0.9,
+    seed: Optional[int] = None,
+    feature_names: List[str] = None
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Per-user assessment histories: lists of (n_i, n_features) answers and (n_i,) labels.
+
+    Each user's latent severity follows an AR(1) walk with the given
+    persistence, and labels come from the latent severity rather than the
+    noisy answers, so earlier assessments carry information a single
+    questionnaire does not. History lengths are geometric, so most users
+    have a few assessments and some have many.
+    """
+    feature_names = feature_names or FEATURE_NAMES
+    loadings = np.array([DEFAULT_LOADINGS.get(name, 0.6) for name in feature_names])
+    rng = np.random.default_rng(seed)
+    lengths = np.minimum(rng.geometric(1 / mean_assessments, size=n_users), max_assessments)
+
+    # All users' walks at once: steps are drawn for the longest history and cut per user
+    innovations = rng.standard_normal((n_users, int(lengths.max())))
+    severity = np.empty_like(innovations)
+    severity[:, 0] = innovations[:, 0]
+    for t in range(1, severity.shape[1]):
+        severity[:, t] = persistence * severity[:, t - 1] + np.sqrt(1 - persistence ** 2) * innovations[:, t]
+
+    X = _draw(rng, severity.size, loadings, severity.reshape(-1, 1)).reshape(n_users, -1, len(loadings))
+    # Expected mean item score at each latent severity
+    y = np.digitize(5 + 2.5 * severity * loadings.mean(), LABEL_THRESHOLDS).astype(np.int8)
+    return [X[i, :n] for i, n in enumerate(lengths)], [y[i, :n] for i, n in enumerate(lengths)]
+
+def _write_shard(args) -> Tuple[str, str, np.ndarray]:
+    # Module-level so it can be pickled to pool workers
+    directory, index, rows, seed_sequence, class_weights, fmt = args
+    X, y = generate(rows, class_weights=class_weights, rng=np.random.default_rng(seed_sequence))
+
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {name: X[:, j] for j, name in enumerate(FEATURE_NAMES)}
+        columns["label"] = y
+        path = f"part-{index:05d}.parquet"
+        pq.write_table(pa.table(columns), os.path.join(directory, path), compression="zstd")
+        return path, path, y
+
+    x_file, y_file = f"X-{index:05d}.npy", f"y-{index:05d}.npy"
+    np.save(os.path.join(directory, x_file), X)
+    np.save(os.path.join(directory, y_file), y)
+    return x_file, y_file, y
+
+def write_shards(
+    directory: str,
+    n_samples: int,
+    shard_rows: int = 1_000_000,
+    seed: int = 42,
+    class_weights: Optional[Sequence[float]] = None,
+    workers: int = None,
+    fmt: str = "npy"
+) -> ShardWriter:
+    """Generate n_samples rows as shards in parallel; returns the closed writer.
+
+    Each shard gets its own child SeedSequence, so the output depends only
+    on seed and shard_rows, not on the number of workers.
+    """
+    if fmt not in ("npy", "parquet"):
+        raise ValueError("fmt must be 'npy' or 'parquet'")
+    workers = workers or os.cpu_count() or 1
+    n_shards = max(1, -(-n_samples // shard_rows))
+    seeds = np.random.SeedSequence(seed).spawn(n_shards)
+    tasks = [
+        (directory, index, min(shard_rows, n_samples - index * shard_rows), seeds[index], class_weights, fmt)
+        for index in range(n_shards)
+    ]
+
+    writer = ShardWriter(directory, metadata={
+        "source": "synthetic",
+        "format": fmt,
+        "seed": seed,
+        "class_weights": list(class_weights) if class_weights is not None else None
+    })
+
+    if workers <= 1 or n_shards == 1:
+        for x_file, y_file, y in map(_write_shard, tasks):
+            writer.add_shard(x_file, y_file, y)
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, n_shards), mp_context=context) as executor:
+            for x_file, y_file, y in executor.map(_write_shard, tasks):
+                writer.add_shard(x_file, y_file, y)
+
+    writer.close()
+    return writer
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic assessment shards")
+    parser.add_argument("output", help="Output directory")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--shard-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per CPU)")
+    parser.add_argument("--format", choices=["npy", "parquet"], default="npy")
+    parser.add_argument("--class-weights", default=None, help="low,medium,high,critical, e.g. 0.25,0.25,0.25,0.25")
+    args = parser.parse_args()
+
+    weights = [float(w) for w in args.class_weights.split(",")] if args.class_weights else None
+    start = time.perf_counter()
+    writer = write_shards(
+        args.output, args.rows, shard_rows=args.shard_rows, seed=args.seed,
+        class_weights=weights, workers=args.workers, fmt=args.format
+    )
+    elapsed = time.perf_counter() - start
+    print(f"✓ Wrote {args.rows} rows in {len(writer.shards)} shards to {args.output} "
+          f"in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s, peak memory {peak_memory_mb():.0f} MB)")
+    print(f"  class counts: {dict(zip(RISK_LEVELS, writer.class_counts.tolist()))}")
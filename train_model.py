@@ -6,52 +6,203 @@ import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import SGDClassifier, LogisticRegression
+from sklearn.isotonic import IsotonicRegression
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
+import argparse
 import joblib
 import json
 import os
-from typing import Tuple, Dict, Any
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Tuple, Dict, Any, List, Optional
+from training_data import FEATURE_NAMES, RISK_LEVELS, DatabaseFeatureSource, ShardedDataset, peak_memory_mb
+from synthetic_data import generate
+
+# Learners that can train without holding the dataset in memory
+OUT_OF_CORE_LEARNERS = ["sgd", "hist_gb"]
+
+# Keras detectors, trained from shards through a tf.data pipeline
+KERAS_LEARNERS = ["dl", "attention"]
+
+# Gradient boosting implementations: classic (exact splits, single-threaded),
+# hist (binned features, multi-threaded) and lightgbm when it is installed
+GB_BACKENDS = ["classic", "hist", "lightgbm"]
+
+def make_rf_model(random_state: int = 42, **params) -> RandomForestClassifier:
+    """Build the random forest; params override the defaults"""
+    return RandomForestClassifier(**{"n_estimators": 100, "random_state": random_state, "n_jobs": -1, **params})
+
+def make_gb_model(backend: str = "hist", random_state: int = 42, **params):
+    """Build the gradient boosting model for a backend; params override the defaults"""
+    if backend == "classic":
+        return GradientBoostingClassifier(**{"n_estimators": 100, "random_state": random_state, **params})
+    if backend == "hist":
+        return HistGradientBoostingClassifier(
+            **{"max_iter": 100, "early_stopping": False, "random_state": random_state, **params}
+        )
+    if backend == "lightgbm":
+        try:
+            from lightgbm import LGBMClassifier
+        except ImportError:
+            raise ValueError("The lightgbm backend needs the lightgbm package")
+        return LGBMClassifier(**{"n_estimators": 100, "random_state": random_state, "verbose": -1, **params})
+    raise ValueError(f"gb backend must be one of {GB_BACKENDS}")
+
+# Optional artifacts packed into the bundle when they have been saved
+BUNDLE_EXTRAS = {
+    "feature_importance": "feature_importance.json",
+    "dl": "dl_risk_detector.h5",
+    "attention": "attention_risk_detector.keras",
+    "attention_history": "attention_history_detector.keras",
+    "scaler_dl": "scaler_dl.pkl",
+    "scaler_attention": "scaler_attention.pkl",
+    "drift_reference": "drift_reference.json"
+}
+
+def learner_scaler(model_path: str, learner: str, default: StandardScaler = None) -> Optional[StandardScaler]:
+    """The scaler a shard-trained learner saved as scaler_<learner>.pkl, else default (scaler.pkl's)"""
+    path = os.path.join(model_path, f"scaler_{learner}.pkl")
+    return joblib.load(path) if os.path.exists(path) else default
+
+def write_model_bundle(model_path: str = "./ml/models/trained_models") -> str:
+    """Pack the saved artifacts listed in manifest.json into one checksummed bundle"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    from app.services.model_bundle import pack_directory
+    
+    with open(os.path.join(model_path, "manifest.json")) as f:
+        manifest = json.load(f)
+    artifacts = dict(manifest.get("artifacts", {}))
+    for name, filename in BUNDLE_EXTRAS.items():
+        if os.path.exists(os.path.join(model_path, filename)):
+            artifacts.setdefault(name, filename)
+    artifacts["manifest"] = "manifest.json"
+    
+    return pack_directory(model_path, artifacts, metadata={
+        "version": manifest.get("data_watermark") or manifest["created_at"],
+        "feature_names": manifest["feature_names"],
+        "labels": manifest["labels"],
+        "metrics": manifest.get("metrics", {})
+    })
+
+def drift_reference(batches, feature_names: List[str] = None) -> Dict[str, Any]:
+    """Training summary the serving drift monitor compares submissions with, from (X, y) batches of raw scores"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    from app.services.drift_monitor import StreamingStats
+    
+    feature_names = feature_names or FEATURE_NAMES
+    stats = StreamingStats(len(feature_names))
+    label_counts = np.zeros(len(RISK_LEVELS), dtype=np.int64)
+    for X, y in batches:
+        stats.update_batch(X)
+        label_counts += np.bincount(np.asarray(y, dtype=np.int64), minlength=len(RISK_LEVELS))[:len(RISK_LEVELS)]
+    return stats.to_reference(feature_names, RISK_LEVELS, label_counts)
+
+def save_drift_reference(reference: Dict[str, Any], model_path: str):
+    with open(os.path.join(model_path, "drift_reference.json"), "w") as f:
+        json.dump(reference, f, indent=2)
+
+CALIBRATION_METHODS = ["isotonic", "sigmoid"]
+
+def fit_calibration(proba: np.ndarray, y: np.ndarray, method: str = "isotonic", grid_size: int = 256) -> Dict[str, Any]:
+    """One-vs-rest calibration maps for class probabilities, tabulated on a uniform grid.
+    
+    Serving looks up tables[c, round(p * (grid_size - 1))] per class and
+    renormalizes, so no sklearn object is needed at request time.
+    """
+    if method not in CALIBRATION_METHODS:
+        raise ValueError(f"method must be one of {CALIBRATION_METHODS}")
+    grid = np.linspace(0, 1, grid_size)
+    tables = np.empty((proba.shape[1], grid_size), dtype=np.float32)
+    for c in range(proba.shape[1]):
+        target = (y == c).astype(float)
+        if method == "isotonic":
+            tables[c] = IsotonicRegression(y_min=0, y_max=1, out_of_bounds="clip").fit(proba[:, c], target).predict(grid)
+        elif target.min() == target.max():
+            tables[c] = target[0]
+        else:
+            # Platt scaling on the log-odds of the raw probability
+            def logit(p):
+                p = np.clip(p, 1e-4, 1 - 1e-4)
+                return np.log(p / (1 - p)).reshape(-1, 1)
+            tables[c] = LogisticRegression(C=1e4).fit(logit(proba[:, c]), target).predict_proba(logit(grid))[:, 1]
+    return {"method": method, "grid_size": grid_size, "tables": tables}
+
+def apply_calibration(proba: np.ndarray, calibration: Dict[str, Any]) -> np.ndarray:
+    """Calibrated, renormalized class probabilities (mirrors MLService)"""
+    tables = calibration["tables"]
+    index = np.rint(np.clip(proba, 0, 1) * (tables.shape[1] - 1)).astype(np.intp)
+    calibrated = tables[np.arange(tables.shape[0]), index]
+    total = calibrated.sum(axis=1, keepdims=True)
+    return np.where(total > 0, calibrated / np.maximum(total, 1e-12), proba)
+
+def expected_calibration_error(proba: np.ndarray, y: np.ndarray, n_bins: int = 10) -> float:
+    """Gap between confidence and accuracy of the top class, averaged over confidence bins"""
+    confidence = proba.max(axis=1)
+    correct = proba.argmax(axis=1) == y
+    bins = np.minimum((confidence * n_bins).astype(int), n_bins - 1)
+    return float(sum(
+        abs(correct[bins == b].mean() - confidence[bins == b].mean()) * np.mean(bins == b)
+        for b in range(n_bins) if np.any(bins == b)
+    ))
+
+def update_calibration(model_path: str, name: str, calibration: Dict[str, Any]):
+    """Add or replace one model's maps in calibration.pkl"""
+    path = os.path.join(model_path, "calibration.pkl")
+    maps = joblib.load(path) if os.path.exists(path) else {}
+    maps[name] = calibration
+    joblib.dump(maps, path)
+
+def available_gb_backends() -> list:
+    """Backends that can be built in this environment"""
+    available = []
+    for backend in GB_BACKENDS:
+        try:
+            make_gb_model(backend)
+            available.append(backend)
+        except ValueError:
+            pass
+    return available
 
 class RiskDetectionTrainer:
     """Trainer for mental health risk detection models"""
     
-    def __init__(self):
-        self.rf_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-        self.gb_model = GradientBoostingClassifier(n_estimators=100, random_state=42)
+    def __init__(
+        self,
+        gb_backend: str = "hist",
+        rf_params: Dict[str, Any] = None,
+        gb_params: Dict[str, Any] = None,
+        calibration_method: str = "isotonic"
+    ):
+        self.rf_params = rf_params or {}
+        self.gb_params = gb_params or {}
+        self.rf_model = make_rf_model(**self.rf_params)
+        self.gb_backend = gb_backend
+        self.gb_model = make_gb_model(gb_backend, **self.gb_params)
+        self.search_results: Dict[str, Any] = {}
+        self.metrics: Dict[str, Any] = {}
+        self.calibration_method = calibration_method
+        self.calibration: Dict[str, Any] = {}
+        self.drift_reference: Optional[Dict[str, Any]] = None
         self.scaler = StandardScaler()
         self.label_encoder = LabelEncoder()
-        self.feature_names = [
-            "sleep_quality", "anxiety_level", "social_isolation",
-            "stress_level", "physical_health", "substance_use",
-            "self_harm_thoughts", "concentration", "appetite_change",
-            "energy_level", "hopelessness", "irritability"
-        ]
+        self.feature_names = list(FEATURE_NAMES)
         self.model_path = "./ml/models/trained_models"
         os.makedirs(self.model_path, exist_ok=True)
     
-    def generate_synthetic_data(self, n_samples: int = 1000) -> Tuple[np.ndarray, np.ndarray]:
-        """Generate synthetic training data"""
-        X = np.random.randint(0, 11, size=(n_samples, len(self.feature_names)))
-        
-        # Create labels based on feature combinations
-        y = []
-        for sample in X:
-            score = np.mean(sample)
-            if score < 3:
-                label = 0  # low
-            elif score < 5:
-                label = 1  # medium
-            elif score < 7:
-                label = 2  # high
-            else:
-                label = 3  # critical
-            y.append(label)
-        
-        return X.astype(float), np.array(y)
-    
-    def train(self, X: np.ndarray = None, y: np.ndarray = None):
-        """Train the models"""
+    def generate_synthetic_data(self, n_samples: int = 1000, seed: int = 42, class_weights=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Generate synthetic training data (see synthetic_data.generate)"""
+        X, y = generate(n_samples, seed=seed, class_weights=class_weights, feature_names=self.feature_names)
+        return X.astype(float), y.astype(int)
+    
+    def train(self, X: np.ndarray = None, y: np.ndarray = None, search: Dict[str, Any] = None):
+        """Train the models.
+        
+        search, if given, holds HyperparameterSearch options plus "models"
+        (e.g. ["rf", "gb"]); the search runs on the training split only.
+        """
         if X is None or y is None:
             print("Generating synthetic training data...")
             X, y = self.generate_synthetic_data(n_samples=2000)
@@ -61,6 +212,14 @@ class RiskDetectionTrainer:
             X, y, test_size=0.2, random_state=42, stratify=y
         )
         
+        if search:
+            options = dict(search)
+            for model in options.pop("models", ["rf", "gb"]):
+                self.search_hyperparameters(X_train, y_train, model=model, **options)
+        
+        # What serving-time inputs are compared with, in raw 0-10 item scores
+        self.drift_reference = drift_reference([(X_train, y_train)], self.feature_names)
+        
         # Scale features
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
@@ -72,7 +231,7 @@ class RiskDetectionTrainer:
         print(f"Random Forest Accuracy: {rf_score:.4f}")
         
         # Train Gradient Boosting
-        print("Training Gradient Boosting model...")
+        print(f"Training Gradient Boosting model ({self.gb_backend})...")
         self.gb_model.fit(X_train_scaled, y_train)
         gb_score = self.gb_model.score(X_test_scaled, y_test)
         print(f"Gradient Boosting Accuracy: {gb_score:.4f}")
@@ -81,15 +240,340 @@ class RiskDetectionTrainer:
         print("\nRandom Forest Classification Report:")
         print(classification_report(y_test, self.rf_model.predict(X_test_scaled)))
         
+        self.metrics = {"rf_accuracy": float(rf_score), "gb_accuracy": float(gb_score)}
+        self.metrics.update(self._calibrate_rf(X_test_scaled, y_test))
+        
         # Save models
         self.save_models()
         
         return {
             "rf_accuracy": float(rf_score),
             "gb_accuracy": float(gb_score),
+            "gb_backend": self.gb_backend,
+            "calibration": {key: value for key, value in self.metrics.items() if "ece" in key},
             "feature_importance": self._get_feature_importance()
         }
     
+    def _calibrate_rf(self, X_test_scaled: np.ndarray, y_test: np.ndarray) -> Dict[str, float]:
+        """Fit the forest's calibration maps on half the test split and score them on the other half"""
+        proba = self.rf_model.predict_proba(X_test_scaled)
+        fit_part = np.arange(len(y_test)) % 2 == 0
+        self.calibration = fit_calibration(proba[fit_part], y_test[fit_part], method=self.calibration_method)
+        
+        held_out, labels = proba[~fit_part], y_test[~fit_part]
+        result = {
+            "rf_ece": expected_calibration_error(held_out, labels),
+            "rf_ece_calibrated": expected_calibration_error(apply_calibration(held_out, self.calibration), labels)
+        }
+        print(f"Calibration ({self.calibration_method}): ECE {result['rf_ece']:.4f} -> {result['rf_ece_calibrated']:.4f}")
+        return result
+    
+    def search_hyperparameters(self, X: np.ndarray, y: np.ndarray, model: str = "rf", **options) -> Dict[str, Any]:
+        """Tune one model with HyperparameterSearch and rebuild it with the best parameters"""
+        from hyperparameter_search import HyperparameterSearch
+        
+        search = HyperparameterSearch(model=model, gb_backend=self.gb_backend, **options)
+        print(f"Searching {model} hyperparameters ({search.strategy})...")
+        result = search.run(X, y)
+        print(f"Best {model} {result['scoring']}: {result['best_score']:.4f} with {result['best_params']}")
+        
+        if model == "rf":
+            self.rf_params = result["best_params"]
+            self.rf_model = make_rf_model(**self.rf_params)
+        else:
+            self.gb_params = result["best_params"]
+            self.gb_model = make_gb_model(self.gb_backend, **self.gb_params)
+        
+        self.search_results[model] = {
+            key: result[key] for key in
+            ("strategy", "scoring", "n_folds", "best_params", "best_score", "cached_folds", "elapsed_seconds")
+        }
+        self.search_results[model]["trials"] = len(result["trials"])
+        return result
+    
+    def retrain_incremental(
+        self,
+        engine=None,
+        add_trees: int = 20,
+        epochs: int = 3,
+        lag_seconds: int = 60,
+        min_rows: int = 100,
+        since: datetime = None
+    ) -> Dict[str, Any]:
+        """Update the saved models with assessments completed since the last run.
+        
+        New rows are those with completed_at in [watermark, now - lag); the lag
+        keeps in-flight commits for the next run. Before the first run the
+        manifest has no watermark, and since must say where new rows start.
+        The random forest grows add_trees trees fitted on two thirds of the new
+        rows (warm_start) and its calibration is refitted on the rest; saved
+        Keras checkpoints are fine-tuned on the new rows. The scaler is left
+        as it was fitted. The compressed forest and the distilled student
+        were derived from the old models, so they are dropped from the bundle
+        (which then serves the updated forest) until forest_compression.py
+        and distillation.py are run again.
+        """
+        manifest_path = os.path.join(self.model_path, "manifest.json")
+        rf_path = os.path.join(self.model_path, "risk_predictor_rf.pkl")
+        scaler_path = os.path.join(self.model_path, "scaler.pkl")
+        if not (os.path.exists(rf_path) and os.path.exists(scaler_path)):
+            raise ValueError(f"No trained models in {self.model_path}; run a full training first")
+        
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        watermark = manifest.get("data_watermark")
+        if watermark:
+            start = datetime.fromisoformat(watermark)
+        elif since is not None:
+            start = since
+        else:
+            # Without a window start every stored assessment would count as new
+            raise ValueError(
+                f"No data_watermark in {manifest_path}; pass since (--start) to choose where the first update begins"
+            )
+        end = datetime.utcnow() - timedelta(seconds=lag_seconds)
+        
+        source = DatabaseFeatureSource(engine=engine, start=start, end=end)
+        chunks = list(source.iter_chunks())
+        X_new = np.concatenate([X for X, _ in chunks]) if chunks else np.zeros((0, len(self.feature_names)))
+        y_new = np.concatenate([y for _, y in chunks]).astype(int) if chunks else np.zeros(0, dtype=int)
+        
+        result = {"window_start": start.isoformat(), "window_end": end.isoformat(), "new_rows": int(len(y_new))}
+        if len(y_new) < min_rows:
+            # Leave the watermark alone so these rows are picked up next time
+            result["skipped"] = f"fewer than {min_rows} new rows"
+            print(f"Only {len(y_new)} new assessments; nothing to do")
+            return result
+        
+        self.rf_model = joblib.load(rf_path)
+        self.scaler = joblib.load(scaler_path)
+        
+        # Kept fixed: the trees, the boosting model, the Keras checkpoints and the
+        # calibration maps were all learned on this scale
+        X_new_scaled = self.scaler.transform(X_new)
+        
+        # Score on the new rows before learning from them
+        result["rf_accuracy_before"] = float(self.rf_model.score(X_new_scaled, y_new))
+        
+        # Every third row is held out to recalibrate the grown forest
+        held_out = np.arange(len(y_new)) % 3 == 0
+        if set(np.unique(y_new[~held_out])) == set(self.rf_model.classes_):
+            self.rf_model.set_params(warm_start=True, n_estimators=self.rf_model.n_estimators + add_trees)
+            self.rf_model.fit(X_new_scaled[~held_out], y_new[~held_out])
+            result["rf_trees"] = self.rf_model.n_estimators
+            result["calibration"] = self._calibrate_rf(X_new_scaled[held_out], y_new[held_out])
+        else:
+            # Trees fitted on a subset of classes cannot be mixed with the existing ones
+            result["rf_skipped"] = "new rows do not cover every risk level"
+        
+        result["keras_models"], tuned = self._fine_tune_keras(X_new, y_new, epochs)
+        
+        # Left in the bundle, these would keep serving the old models' predictions under the new version
+        stale = (["rf_compact"] if "rf_trees" in result else []) + (["student"] if "rf_trees" in result or tuned else [])
+        result["dropped_artifacts"] = [name for name in stale if name in manifest.get("artifacts", {})]
+        
+        # Persist only once every model has been updated, so a failed run can simply be retried
+        joblib.dump(self.rf_model, rf_path)
+        for detector, path in tuned:
+            detector.save(path)
+        calibration_path = os.path.join(self.model_path, "calibration.pkl")
+        calibration = joblib.load(calibration_path) if os.path.exists(calibration_path) else {}
+        for name in stale:
+            calibration.pop(name, None)
+        if "rf_trees" in result:
+            calibration["rf"] = self.calibration
+        joblib.dump(calibration, calibration_path)
+        
+        for name in result["dropped_artifacts"]:
+            del manifest["artifacts"][name]
+        if "rf_compact" in stale:
+            manifest.pop("rf_compression", None)
+        if "student" in stale:
+            manifest.pop("distillation", None)
+        manifest["data_watermark"] = end.isoformat()
+        if "rf_trees" in result:
+            manifest.setdefault("hyperparameters", {}).setdefault("rf", {})["n_estimators"] = result["rf_trees"]
+        manifest.setdefault("incremental_updates", []).append({
+            "at": datetime.utcnow().isoformat(),
+            **{key: value for key, value in result.items() if key != "keras_models"}
+        })
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        write_model_bundle(self.model_path)
+        
+        print(f"✓ Updated models with {len(y_new)} new assessments up to {end.isoformat()}")
+        if result["dropped_artifacts"]:
+            print(f"  Dropped {', '.join(result['dropped_artifacts'])}; re-run forest_compression.py / distillation.py to rebuild")
+        return result
+    
+    def _fine_tune_keras(self, X_new: np.ndarray, y_new: np.ndarray, epochs: int):
+        """Fine-tune whichever Keras checkpoints exist on raw scores; returns status per model and (detector, path) to save"""
+        try:
+            from deep_learning_model import DeepLearningRiskDetector, AttentionBasedRiskDetector
+        except ImportError:
+            return {"dl": "skipped: tensorflow not installed", "attention": "skipped: tensorflow not installed"}, []
+        
+        status, tuned = {}, []
+        for name, detector_class, filename in (
+            ("dl", DeepLearningRiskDetector, "dl_risk_detector.h5"),
+            ("attention", AttentionBasedRiskDetector, "attention_risk_detector.keras")
+        ):
+            path = os.path.join(self.model_path, filename)
+            if not os.path.exists(path):
+                status[name] = "skipped: no checkpoint"
+                continue
+            detector = detector_class(input_dim=len(self.feature_names))
+            detector.load(path)
+            # Checkpoints trained from shards carry their own scaler
+            scaler = learner_scaler(self.model_path, name, self.scaler)
+            detector.fine_tune(scaler.transform(X_new).astype(np.float32), y_new, epochs=epochs)
+            tuned.append((detector, path))
+            status[name] = "fine-tuned"
+        return status, tuned
+    
+    def train_out_of_core(
+        self,
+        dataset: ShardedDataset,
+        learner: str = "sgd",
+        test_fraction: float = 0.2,
+        epochs: int = 1,
+        batch_size: int = 100_000,
+        max_fit_rows: int = 2_000_000
+    ) -> Dict[str, Any]:
+        """Train on a memory-mapped dataset without loading it into RAM.
+
+        The newest test_fraction of rows is held out, so the split is
+        temporal for data exported from the database. "sgd" streams batches
+        through partial_fit and its memory stays flat. "hist_gb" is not
+        streamed: HistGradientBoostingClassifier needs its training rows in
+        memory as float64 (8 bytes per value, plus 1 byte per value once
+        binned), so it fits on a random sample of at most max_fit_rows
+        training rows gathered from the memmap.
+        """
+        if learner not in OUT_OF_CORE_LEARNERS:
+            raise ValueError(f"learner must be one of {OUT_OF_CORE_LEARNERS}")
+        
+        n_train = int(dataset.n_rows * (1 - test_fraction))
+        if n_train == 0 or n_train == dataset.n_rows:
+            raise ValueError(f"Not enough rows to train and evaluate ({dataset.n_rows})")
+        classes = np.arange(len(RISK_LEVELS))
+        start = time.perf_counter()
+        
+        # Scaler statistics and the drift reference are accumulated batch by batch. The
+        # scaler belongs to this learner; scaler.pkl stays with the models save_models writes
+        scaler = StandardScaler()
+        for X_batch, _ in dataset.iter_batches(batch_size, stop=n_train):
+            scaler.partial_fit(X_batch)
+        self.drift_reference = drift_reference(dataset.iter_batches(batch_size, stop=n_train), dataset.feature_names)
+        
+        fit_rows = n_train
+        if learner == "sgd":
+            print(f"Training {learner} on {n_train} rows out of core...")
+            model = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=42)
+            for _ in range(epochs):
+                for X_batch, y_batch in dataset.iter_batches(batch_size, stop=n_train):
+                    model.partial_fit(scaler.transform(X_batch), y_batch, classes=classes)
+        else:
+            # Trees are scale-invariant, so raw scores are used
+            X, y = dataset.memmap()
+            fit_rows = min(n_train, max_fit_rows)
+            rows = np.arange(n_train)
+            if fit_rows < n_train:
+                rows = np.sort(np.random.default_rng(42).choice(n_train, size=fit_rows, replace=False))
+            print(f"Training {learner} in memory on {fit_rows} of {n_train} rows...")
+            # Gathered straight into float64 in chunks so sklearn does not make another copy
+            X_fit = np.empty((fit_rows, X.shape[1]), dtype=np.float64)
+            for offset in range(0, fit_rows, batch_size):
+                X_fit[offset:offset + batch_size] = X[rows[offset:offset + batch_size]]
+            model = HistGradientBoostingClassifier(max_iter=200, early_stopping=False, random_state=42)
+            model.fit(X_fit, y[rows])
+            del X_fit
+        train_seconds = time.perf_counter() - start
+        
+        # Evaluate batch by batch on the held-out rows
+        matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+        for X_batch, y_batch in dataset.iter_batches(batch_size, start=n_train):
+            features = scaler.transform(X_batch) if learner == "sgd" else X_batch
+            matrix += confusion_matrix(y_batch, model.predict(features), labels=classes)
+        
+        accuracy = float(np.trace(matrix) / max(matrix.sum(), 1))
+        print(f"{learner} Accuracy: {accuracy:.4f}")
+        
+        joblib.dump(model, os.path.join(self.model_path, f"risk_predictor_{learner}.pkl"))
+        if learner == "sgd":
+            joblib.dump(scaler, os.path.join(self.model_path, f"scaler_{learner}.pkl"))
+        save_drift_reference(self.drift_reference, self.model_path)
+        print(f"✓ Model saved to {self.model_path}")
+        
+        return {
+            "learner": learner,
+            "rows": dataset.n_rows,
+            "train_rows": n_train,
+            "fit_rows": fit_rows,
+            "test_rows": dataset.n_rows - n_train,
+            "accuracy": accuracy,
+            "confusion_matrix": matrix.tolist(),
+            "train_seconds": round(train_seconds, 2),
+            "peak_memory_mb": round(peak_memory_mb(), 1)
+        }
+    
+    def train_keras_on_shards(
+        self,
+        dataset: ShardedDataset,
+        learner: str = "dl",
+        epochs: int = 10,
+        batch_size: int = 256,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0
+    ) -> Dict[str, Any]:
+        """Train a Keras detector from shards with tf.data; the last ~20% of shards validate"""
+        from deep_learning_model import DeepLearningRiskDetector, AttentionBasedRiskDetector, configure_cpu_threads
+        
+        if learner not in KERAS_LEARNERS:
+            raise ValueError(f"learner must be one of {KERAS_LEARNERS}")
+        configure_cpu_threads(intra_op_threads, inter_op_threads)
+        
+        n_shards = len(dataset.manifest["shards"])
+        n_validation = n_shards // 5
+        validation_shards = list(range(n_shards - n_validation, n_shards))
+        
+        # Scaler statistics come from the training shards only. The scaler belongs to this
+        # learner; scaler.pkl stays with the models save_models writes
+        n_train_rows = sum(shard["rows"] for shard in dataset.manifest["shards"][:n_shards - n_validation])
+        scaler = StandardScaler()
+        for X_batch, _ in dataset.iter_batches(100_000, stop=n_train_rows):
+            scaler.partial_fit(X_batch)
+        
+        if learner == "dl":
+            detector = DeepLearningRiskDetector(input_dim=len(self.feature_names))
+            path = os.path.join(self.model_path, "dl_risk_detector.h5")
+        else:
+            detector = AttentionBasedRiskDetector(input_dim=len(self.feature_names))
+            path = os.path.join(self.model_path, "attention_risk_detector.keras")
+        
+        print(f"Training {learner} on {n_shards - n_validation} shards ({n_validation} held out)...")
+        history = detector.train_on_shards(
+            dataset.directory, epochs=epochs, batch_size=batch_size,
+            validation_shards=validation_shards, scaler=scaler
+        )
+        detector.save(path)
+        joblib.dump(scaler, os.path.join(self.model_path, f"scaler_{learner}.pkl"))
+        
+        result = {
+            "learner": learner,
+            "rows": dataset.n_rows,
+            "epochs": len(history["loss"]),
+            "loss": history["loss"][-1],
+            "accuracy": history["accuracy"][-1],
+            "examples_per_second": [round(rate) for rate in history["examples_per_second"]],
+            "peak_memory_mb": round(peak_memory_mb(), 1)
+        }
+        if "val_accuracy" in history:
+            result["val_accuracy"] = history["val_accuracy"][-1]
+        return result
+    
     def _get_feature_importance(self) -> Dict[str, float]:
         """Get feature importance from Random Forest"""
         importance_dict = {}
@@ -102,15 +586,99 @@ class RiskDetectionTrainer:
         joblib.dump(self.rf_model, os.path.join(self.model_path, "risk_predictor_rf.pkl"))
         joblib.dump(self.gb_model, os.path.join(self.model_path, "risk_predictor_gb.pkl"))
         joblib.dump(self.scaler, os.path.join(self.model_path, "scaler.pkl"))
+        joblib.dump({"rf": self.calibration} if self.calibration else {}, os.path.join(self.model_path, "calibration.pkl"))
         
         # Save feature importance
         with open(os.path.join(self.model_path, "feature_importance.json"), "w") as f:
             json.dump(self._get_feature_importance(), f, indent=2)
+        if self.drift_reference is not None:
+            save_drift_reference(self.drift_reference, self.model_path)
         
-        print(f"✓ Models saved to {self.model_path}")
+        self._write_manifest()
+        bundle_path = write_model_bundle(self.model_path)
+        print(f"✓ Models saved to {self.model_path} (bundle: {bundle_path})")
+    
+    def _write_manifest(self):
+        """Record what was trained and with which settings next to the artifacts"""
+        manifest = {
+            "created_at": datetime.utcnow().isoformat(),
+            "feature_names": self.feature_names,
+            "labels": RISK_LEVELS,
+            "artifacts": {
+                "rf": "risk_predictor_rf.pkl",
+                "gb": "risk_predictor_gb.pkl",
+                "scaler": "scaler.pkl",
+                "calibration": "calibration.pkl"
+            },
+            "gb_backend": self.gb_backend,
+            "hyperparameters": {"rf": self.rf_params, "gb": self.gb_params},
+            "hyperparameter_search": self.search_results,
+            "metrics": self.metrics
+        }
+        with open(os.path.join(self.model_path, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
 
 if __name__ == "__main__":
-    trainer = RiskDetectionTrainer()
-    metrics = trainer.train()
+    parser = argparse.ArgumentParser(description="Train risk detection models")
+    parser.add_argument("--from-db", action="store_true", help="Export assessment history from DATABASE_URL to --data-dir first")
+    parser.add_argument("--data-dir", default=None, help="Directory of .npy shards to train on out of core")
+    parser.add_argument("--learner", choices=OUT_OF_CORE_LEARNERS + KERAS_LEARNERS, default="sgd")
+    parser.add_argument("--epochs", type=int, default=1, help="Passes over the data for sgd and Keras learners")
+    parser.add_argument("--max-fit-rows", type=int, default=2_000_000, help="Training rows hist_gb samples into memory")
+    parser.add_argument("--batch-size", type=int, default=256, help="Keras batch size")
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="TensorFlow intra-op threads (0 = default)")
+    parser.add_argument("--inter-op-threads", type=int, default=0, help="TensorFlow inter-op threads (0 = default)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per database fetch")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="completed_at >= START (also starts the first --incremental window)")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="completed_at < END")
+    parser.add_argument("--gb-backend", choices=GB_BACKENDS, default="hist", help="Gradient boosting implementation")
+    parser.add_argument("--calibration", choices=CALIBRATION_METHODS, default="isotonic", help="Probability calibration")
+    parser.add_argument("--search", choices=["grid", "random", "halving"], default=None, help="Tune hyperparameters first")
+    parser.add_argument("--search-models", default="rf,gb", help="Models to tune")
+    parser.add_argument("--trials", type=int, default=20, help="Candidates for random/halving search")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="Search processes (default: one per CPU)")
+    parser.add_argument("--samples", type=int, default=2000, help="Synthetic rows when no data source is given")
+    parser.add_argument("--incremental", action="store_true", help="Update saved models with assessments since the last run")
+    parser.add_argument("--add-trees", type=int, default=20, help="Trees added to the random forest per incremental run")
+    parser.add_argument("--fine-tune-epochs", type=int, default=3, help="Keras epochs per incremental run")
+    parser.add_argument("--bundle", action="store_true", help="Only pack the saved artifacts into a model bundle")
+    args = parser.parse_args()
+    
+    trainer = RiskDetectionTrainer(gb_backend=args.gb_backend, calibration_method=args.calibration)
+    if args.bundle:
+        metrics = {"bundle": write_model_bundle(trainer.model_path)}
+    elif args.incremental:
+        metrics = trainer.retrain_incremental(add_trees=args.add_trees, epochs=args.fine_tune_epochs, since=args.start)
+    elif args.data_dir:
+        if args.from_db:
+            source = DatabaseFeatureSource(chunk_size=args.chunk_size, start=args.start, end=args.end)
+            dataset = source.to_shards(args.data_dir)
+            print(f"✓ Exported {dataset.n_rows} rows to {args.data_dir} (peak memory {peak_memory_mb():.0f} MB)")
+        else:
+            dataset = ShardedDataset(args.data_dir)
+        if args.learner in KERAS_LEARNERS:
+            metrics = trainer.train_keras_on_shards(
+                dataset, learner=args.learner, epochs=args.epochs, batch_size=args.batch_size,
+                intra_op_threads=args.intra_op_threads, inter_op_threads=args.inter_op_threads
+            )
+        else:
+            metrics = trainer.train_out_of_core(
+                dataset, learner=args.learner, epochs=args.epochs, max_fit_rows=args.max_fit_rows
+            )
+    elif args.from_db:
+        parser.error("--from-db needs --data-dir to write shards to")
+    else:
+        search = None
+        if args.search:
+            search = {
+                "models": args.search_models.split(","),
+                "strategy": args.search,
+                "n_trials": args.trials,
+                "n_folds": args.folds,
+                "workers": args.workers
+            }
+        X, y = trainer.generate_synthetic_data(n_samples=args.samples)
+        metrics = trainer.train(X, y, search=search)
     print("\nTraining completed!")
     print(json.dumps(metrics, indent=2))
@@ -0,0 +1,242 @@
+"""
+Training data on disk for out-of-core model training
+Feature matrices are stored as .npy shards and read back memory-mapped, so
+datasets larger than RAM can be streamed into partial_fit learners or
+consolidated into one memmap for HistGradientBoostingClassifier
+"""
+import json
+import os
+import resource
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+FEATURE_NAMES = [
+    "sleep_quality", "anxiety_level", "social_isolation",
+    "stress_level", "physical_health", "substance_use",
+    "self_harm_thoughts", "concentration", "appetite_change",
+    "energy_level", "hopelessness", "irritability"
+]
+
+RISK_LEVELS = ["low", "medium", "high", "critical"]
+
+def split_windows(
+    sequences: List[np.ndarray], labels: List[np.ndarray], max_length: int
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Cut histories longer than max_length into consecutive windows of at most max_length steps"""
+    windows_X, windows_y = [], []
+    for X, y in zip(sequences, labels):
+        for start in range(0, len(y), max_length):
+            windows_X.append(X[start:start + max_length])
+            windows_y.append(y[start:start + max_length])
+    return windows_X, windows_y
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class ShardWriter:
+    """Writes (X, y) chunks as numbered .npy shards plus a manifest"""
+
+    def __init__(self, directory: str, feature_names: List[str] = None, metadata: Dict[str, Any] = None):
+        self.directory = directory
+        self.feature_names = feature_names or FEATURE_NAMES
+        self.metadata = metadata or {}
+        self.shards: List[Dict[str, Any]] = []
+        self.class_counts = np.zeros(len(RISK_LEVELS), dtype=np.int64)
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, X: np.ndarray, y: np.ndarray, index: Optional[int] = None):
+        """Write one shard; index lets parallel producers name shards deterministically"""
+        index = len(self.shards) if index is None else index
+        x_file, y_file = f"X-{index:05d}.npy", f"y-{index:05d}.npy"
+        np.save(os.path.join(self.directory, x_file), np.ascontiguousarray(X, dtype=np.float32))
+        np.save(os.path.join(self.directory, y_file), np.ascontiguousarray(y, dtype=np.int8))
+        self.add_shard(x_file, y_file, y)
+
+    def add_shard(self, x_file: str, y_file: str, y: np.ndarray):
+        """Register a shard already written to the directory"""
+        self.shards.append({"X": x_file, "y": y_file, "rows": int(len(y))})
+        self.class_counts += np.bincount(y, minlength=len(RISK_LEVELS))[:len(RISK_LEVELS)]
+
+    def close(self) -> "ShardedDataset":
+        """Write the manifest and return the dataset"""
+        self.shards.sort(key=lambda shard: shard["X"])
+        manifest = {
+            "feature_names": self.feature_names,
+            "labels": RISK_LEVELS,
+            "rows": sum(shard["rows"] for shard in self.shards),
+            "class_counts": self.class_counts.tolist(),
+            "shards": self.shards,
+            "created_at": datetime.utcnow().isoformat(),
+            **self.metadata
+        }
+        with open(os.path.join(self.directory, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return ShardedDataset(self.directory)
+
+class ShardedDataset:
+    """Memory-mapped view over a directory written by ShardWriter"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.feature_names = self.manifest["feature_names"]
+        self.n_rows = self.manifest["rows"]
+
+    def iter_shards(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield each shard's (X, y) as read-only memmaps (Parquet shards are read whole)"""
+        for shard in self.manifest["shards"]:
+            if shard["X"].endswith(".parquet"):
+                import pyarrow.parquet as pq
+
+                table = pq.read_table(os.path.join(self.directory, shard["X"]))
+                X = np.column_stack([table[name].to_numpy() for name in self.feature_names]).astype(np.float32)
+                yield X, table["label"].to_numpy().astype(np.int8)
+                continue
+            yield (
+                np.load(os.path.join(self.directory, shard["X"]), mmap_mode="r"),
+                np.load(os.path.join(self.directory, shard["y"]), mmap_mode="r")
+            )
+
+    def iter_batches(self, batch_size: int, start: int = 0, stop: int = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (X, y) batches for global rows [start, stop), never crossing shards"""
+        stop = self.n_rows if stop is None else stop
+        offset = 0
+        for X, y in self.iter_shards():
+            lo, hi = max(start - offset, 0), min(stop - offset, len(y))
+            for batch_start in range(lo, hi, batch_size):
+                batch_stop = min(batch_start + batch_size, hi)
+                yield X[batch_start:batch_stop], y[batch_start:batch_stop]
+            offset += len(y)
+            if offset >= stop:
+                break
+
+    def memmap(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return all rows as one (X, y) memmap, consolidating shards on first use"""
+        shards = self.manifest["shards"]
+        if len(shards) == 1:
+            return next(self.iter_shards())
+
+        x_path = os.path.join(self.directory, "X-all.npy")
+        y_path = os.path.join(self.directory, "y-all.npy")
+        if not (os.path.exists(x_path) and os.path.exists(y_path)):
+            X_all = np.lib.format.open_memmap(
+                x_path + ".tmp", mode="w+", dtype=np.float32, shape=(self.n_rows, len(self.feature_names))
+            )
+            y_all = np.lib.format.open_memmap(y_path + ".tmp", mode="w+", dtype=np.int8, shape=(self.n_rows,))
+            offset = 0
+            for X, y in self.iter_shards():
+                X_all[offset:offset + len(y)] = X
+                y_all[offset:offset + len(y)] = y
+                offset += len(y)
+            X_all.flush()
+            y_all.flush()
+            del X_all, y_all
+            os.replace(x_path + ".tmp", x_path)
+            os.replace(y_path + ".tmp", y_path)
+
+        return np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r")
+
+class DatabaseFeatureSource:
+    """Streams completed assessments and their risk levels out of the database"""
+
+    def __init__(self, engine=None, chunk_size: int = 10000, start: datetime = None, end: datetime = None):
+        # Backend imports are deferred so file-based training does not need a database
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+        from app.services.export_service import ExportService
+
+        if engine is None:
+            from app.database import engine
+        self.engine = engine
+        self.start = start
+        self.end = end
+        self.export_service = ExportService(chunk_size=chunk_size)
+
+    @staticmethod
+    def to_features(rows: List[Dict[str, Any]], feature_names: List[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Convert export rows to a float32 feature matrix and int8 labels.
+
+        Unanswered items count as 0, as in MLService.extract_features; rows
+        with an unknown risk level are dropped.
+        """
+        feature_names = feature_names or FEATURE_NAMES
+        level_index = {level: i for i, level in enumerate(RISK_LEVELS)}
+        X = np.zeros((len(rows), len(feature_names)), dtype=np.float32)
+        y = np.full(len(rows), -1, dtype=np.int8)
+
+        for i, row in enumerate(rows):
+            responses = row["responses"] or {}
+            if isinstance(responses, str):
+                responses = json.loads(responses)
+            for j, name in enumerate(feature_names):
+                try:
+                    X[i, j] = float(responses.get(name, 0))
+                except (TypeError, ValueError):
+                    pass
+            y[i] = level_index.get(row["risk_level"], -1)
+
+        keep = y >= 0
+        return np.clip(X[keep], 0, 10), y[keep]
+
+    def iter_chunks(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (X, y) per server-side cursor fetch, oldest assessments first"""
+        for rows in self.export_service.iter_chunks(self.engine, ["responses", "risk_level"], self.start, self.end):
+            yield self.to_features(rows)
+
+    def to_shards(self, directory: str, shard_rows: int = 1_000_000) -> ShardedDataset:
+        """Materialize the query as memmap-able shards of about shard_rows rows"""
+        writer = ShardWriter(directory, metadata={
+            "source": "database",
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None
+        })
+        buffered_X, buffered_y, buffered_rows = [], [], 0
+
+        for X, y in self.iter_chunks():
+            buffered_X.append(X)
+            buffered_y.append(y)
+            buffered_rows += len(y)
+            if buffered_rows >= shard_rows:
+                writer.write(np.concatenate(buffered_X), np.concatenate(buffered_y))
+                buffered_X, buffered_y, buffered_rows = [], [], 0
+
+        if buffered_rows or not writer.shards:
+            writer.write(
+                np.concatenate(buffered_X) if buffered_X else np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32),
+                np.concatenate(buffered_y) if buffered_y else np.zeros(0, dtype=np.int8)
+            )
+
+        return writer.close()
+
+class DatabaseSequenceSource:
+    """Per-user assessment histories (oldest first) out of the database, for sequence models"""
+
+    def __init__(self, engine=None, chunk_size: int = 10000, start: datetime = None, end: datetime = None):
+        self.features = DatabaseFeatureSource(engine, chunk_size=chunk_size, start=start, end=end)
+
+    def to_sequences(self, min_length: int = 1) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """(n_i, n_features) answers and (n_i,) risk levels per user with at least min_length assessments.
+
+        Rows arrive ordered by completed_at, so appending per pseudonymous
+        subject keeps every history in time order.
+        """
+        rows_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        source = self.features
+        columns = ["subject_id", "responses", "risk_level"]
+        for rows in source.export_service.iter_chunks(source.engine, columns, source.start, source.end):
+            for row in rows:
+                rows_by_user.setdefault(row["subject_id"], []).append(row)
+
+        sequences, labels = [], []
+        for rows in rows_by_user.values():
+            X, y = DatabaseFeatureSource.to_features(rows)
+            if len(y) >= min_length:
+                sequences.append(X)
+                labels.append(y)
+        return sequences, labels